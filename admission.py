@@ -0,0 +1,227 @@
+# Admission Control for Inference
+# Bounded per-backend concurrency, bounded wait queues and priority lanes.
+#
+# Interactive requests (voice previews) are always served before queued batch
+# requests (full podcast renders), and ADMISSION_INTERACTIVE_RESERVED slots per
+# backend can only be used by interactive work so previews stay fast during
+# bulk jobs. A full lane is rejected with 429 + Retry-After; a request whose
+# deadline has passed (or passes while queued) is rejected with 504.
+#
+# Limits are kept per backend pool, not per raw backend name: rvc, freevc and
+# knn-vc all run on the voice-conversion engines and share the 'rvc' pool,
+# xtts has its own, and any other name is rejected with 400 so clients cannot
+# dodge the limit (or grow the table) by inventing backends.
+#
+# Configuration (environment):
+#   ADMISSION_CONCURRENCY            default concurrent inferences per backend (2)
+#   ADMISSION_CONCURRENCY_<POOL>     per-pool override: ADMISSION_CONCURRENCY_RVC / _XTTS
+#   ADMISSION_QUEUE_SIZE             max waiting requests per lane per backend (16)
+#   ADMISSION_INTERACTIVE_RESERVED   slots reserved for interactive requests (1)
+#   ADMISSION_MAX_WAIT_S             max queue wait without a deadline (300)
+
+import os
+import math
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+LANES = ('interactive', 'batch')
+
+DEADLINE_HEADER = 'X-Request-Deadline'      # absolute, epoch milliseconds
+TIMEOUT_HEADER = 'X-Request-Timeout-Ms'     # relative budget, milliseconds
+PRIORITY_HEADER = 'X-Priority'              # interactive | batch
+
+# Backend name -> admission pool; backends that share hardware share a pool
+BACKEND_POOLS = {'rvc': 'rvc', 'freevc': 'rvc', 'knn-vc': 'rvc', 'xtts': 'xtts'}
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; carries the HTTP status to return"""
+
+    def __init__(self, message: str, status: int, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def parse_deadline(headers) -> Optional[float]:
+    """Return the request deadline as epoch seconds from request headers, if any"""
+    value = headers.get(DEADLINE_HEADER)
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get(TIMEOUT_HEADER)
+    if value:
+        try:
+            return time.time() + float(value) / 1000.0
+        except ValueError:
+            pass
+    return None
+
+
+def parse_priority(value: Optional[str]) -> str:
+    value = (value or 'batch').strip().lower()
+    return value if value in LANES else 'batch'
+
+
+class _BackendState:
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.active = {lane: 0 for lane in LANES}
+        self.queues = {lane: deque() for lane in LANES}
+        self.avg_service_s = 1.0
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_deadline = 0
+
+
+class _Ticket:
+    def __init__(self, controller, backend: str, lane: str):
+        self.controller = controller
+        self.backend = backend
+        self.lane = lane
+        self.started = time.time()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.controller._release(self)
+        return False
+
+
+class AdmissionController:
+    """Gatekeeper in front of inference; use `with controller.admit(...):`"""
+
+    def __init__(self, concurrency: int = 2, max_queue: int = 16, interactive_reserved: int = 1,
+                 max_wait_s: float = 300.0, overrides: Optional[dict] = None):
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, max_queue)
+        self.interactive_reserved = max(0, interactive_reserved)
+        self.max_wait_s = max_wait_s
+        self.overrides = overrides or {}
+        self._backends = {}
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_env(cls):
+        prefix = 'ADMISSION_CONCURRENCY_'
+        overrides = {}
+        for key, value in os.environ.items():
+            if key.startswith(prefix):
+                try:
+                    overrides[key[len(prefix):].lower().replace('_', '-')] = int(value)
+                except ValueError:
+                    pass
+        return cls(
+            concurrency=_env_int('ADMISSION_CONCURRENCY', 2),
+            max_queue=_env_int('ADMISSION_QUEUE_SIZE', 16),
+            interactive_reserved=_env_int('ADMISSION_INTERACTIVE_RESERVED', 1),
+            max_wait_s=float(_env_int('ADMISSION_MAX_WAIT_S', 300)),
+            overrides=overrides,
+        )
+
+    def _state(self, backend: str) -> _BackendState:
+        state = self._backends.get(backend)
+        if state is None:
+            state = _BackendState(max(1, self.overrides.get(backend, self.concurrency)))
+            self._backends[backend] = state
+        return state
+
+    def _can_run(self, state: _BackendState, lane: str) -> bool:
+        total = sum(state.active.values())
+        if total >= state.concurrency:
+            return False
+        if lane == 'batch':
+            # Keep reserved slots free for previews (but never reserve every slot)
+            reserved = min(self.interactive_reserved, state.concurrency - 1)
+            if state.active['batch'] >= state.concurrency - reserved:
+                return False
+            if state.queues['interactive']:
+                return False
+        return True
+
+    def _retry_after(self, state: _BackendState, lane: str) -> int:
+        waiting = len(state.queues[lane]) + (len(state.queues['interactive']) if lane == 'batch' else 0)
+        return max(1, int(math.ceil(state.avg_service_s * (waiting + 1) / state.concurrency)))
+
+    def admit(self, backend: str, priority: str = 'batch', deadline: Optional[float] = None) -> _Ticket:
+        """Block until a slot is free; raise AdmissionRejected on overload or deadline"""
+        backend = BACKEND_POOLS.get((backend or 'rvc').lower())
+        if backend is None:
+            raise AdmissionRejected(f'Unknown backend; expected one of {", ".join(BACKEND_POOLS)}', 400)
+        lane = parse_priority(priority)
+        with self._cond:
+            state = self._state(backend)
+            if deadline is not None and deadline <= time.time():
+                state.rejected_deadline += 1
+                raise AdmissionRejected('Request deadline already passed', 504)
+
+            if not state.queues[lane] and self._can_run(state, lane):
+                return self._start(state, backend, lane)
+
+            if len(state.queues[lane]) >= self.max_queue:
+                state.rejected_full += 1
+                raise AdmissionRejected(f'{backend} {lane} queue is full', 429, self._retry_after(state, lane))
+
+            waiter = object()
+            state.queues[lane].append(waiter)
+            give_up = time.time() + self.max_wait_s
+            if deadline is not None:
+                give_up = min(give_up, deadline)
+            try:
+                while True:
+                    if state.queues[lane][0] is waiter and self._can_run(state, lane):
+                        state.queues[lane].popleft()
+                        return self._start(state, backend, lane)
+                    remaining = give_up - time.time()
+                    if remaining <= 0:
+                        state.queues[lane].remove(waiter)
+                        if deadline is not None and deadline <= time.time():
+                            state.rejected_deadline += 1
+                            raise AdmissionRejected('Request deadline passed while queued', 504)
+                        state.rejected_full += 1
+                        raise AdmissionRejected(f'{backend} {lane} queue wait exceeded', 429, self._retry_after(state, lane))
+                    self._cond.wait(remaining)
+            finally:
+                # Whoever is now at the head of a lane may be able to start
+                self._cond.notify_all()
+
+    def _start(self, state: _BackendState, backend: str, lane: str) -> _Ticket:
+        state.active[lane] += 1
+        state.admitted += 1
+        return _Ticket(self, backend, lane)
+
+    def _release(self, ticket: _Ticket):
+        with self._cond:
+            state = self._state(ticket.backend)
+            state.active[ticket.lane] -= 1
+            elapsed = time.time() - ticket.started
+            # Exponential moving average of service time, used for Retry-After
+            state.avg_service_s = 0.8 * state.avg_service_s + 0.2 * elapsed
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                backend: {
+                    'concurrency': state.concurrency,
+                    'active': dict(state.active),
+                    'queued': {lane: len(q) for lane, q in state.queues.items()},
+                    'admitted': state.admitted,
+                    'rejected_full': state.rejected_full,
+                    'rejected_deadline': state.rejected_deadline,
+                    'avg_service_s': round(state.avg_service_s, 3),
+                }
+                for backend, state in self._backends.items()
+            }
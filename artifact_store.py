@@ -0,0 +1,420 @@
+# Tiered Artifact Store
+# Durable object storage for voice artifacts with a local disk LRU cache.
+#
+# Container filesystems on Railway/Render/Cloud Run are wiped on every deploy,
+# so reference WAVs, weights and cached HF snapshots are written through to a
+# durable backend and fetched back lazily (or prefetched at boot) into a local
+# cache bounded by ARTIFACT_CACHE_MB. Every download is checked against the
+# SHA-256 recorded at upload time.
+#
+# Directory trees (HF snapshots) are stored with a manifest written last, and
+# are cached and evicted as a unit, so a partly uploaded or partly evicted tree
+# is never handed out.
+#
+# ARTIFACT_STORE_URL selects the backend:
+#   file:///mnt/volume/artifacts   directory (mounted volume, or a local stand-in)
+#   s3://bucket/prefix             S3 or S3-compatible (boto3; ARTIFACT_S3_ENDPOINT)
+#   gs://bucket/prefix             Google Cloud Storage (google-cloud-storage)
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+CHUNK_SIZE = 1024 * 1024
+# Lists a tree's files; uploaded after them, so its presence marks a complete tree
+TREE_MANIFEST = '.manifest.json'
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DirectoryBackend:
+    """Durable store rooted at a directory; checksums kept in .sha256 sidecars"""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split('/'))
+
+    def put(self, key: str, local_path: str, sha256: str):
+        dest = self._path(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = dest + '.tmp'
+        shutil.copyfile(local_path, tmp)
+        os.replace(tmp, dest)
+        with open(dest + '.sha256', 'w') as f:
+            f.write(sha256)
+
+    def get(self, key: str, dest_path: str) -> Optional[str]:
+        """Copy an object to dest_path and return its recorded checksum"""
+        src = self._path(key)
+        shutil.copyfile(src, dest_path)
+        try:
+            with open(src + '.sha256') as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key: str):
+        for path in (self._path(key), self._path(key) + '.sha256'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def list(self, prefix: str = '') -> List[dict]:
+        base = self._path(prefix) if prefix else self.root
+        results = []
+        if not os.path.isdir(base):
+            return results
+        for dirpath, _, filenames in os.walk(base):
+            for name in filenames:
+                if name.endswith('.sha256') or name.endswith('.tmp'):
+                    continue
+                path = os.path.join(dirpath, name)
+                key = os.path.relpath(path, self.root).replace(os.sep, '/')
+                stat = os.stat(path)
+                results.append({'key': key, 'size': stat.st_size, 'mtime': stat.st_mtime})
+        return results
+
+
+class S3Backend:
+    """S3-compatible object storage; checksum stored as object metadata"""
+
+    def __init__(self, bucket: str, prefix: str = ''):
+        import boto3
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.client = boto3.client('s3', endpoint_url=os.getenv('ARTIFACT_S3_ENDPOINT') or None)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def put(self, key: str, local_path: str, sha256: str):
+        self.client.upload_file(local_path, self.bucket, self._key(key), ExtraArgs={'Metadata': {'sha256': sha256}})
+
+    def get(self, key: str, dest_path: str) -> Optional[str]:
+        self.client.download_file(self.bucket, self._key(key), dest_path)
+        head = self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        return head.get('Metadata', {}).get('sha256')
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except Exception:
+            return False
+
+    def list(self, prefix: str = '') -> List[dict]:
+        results = []
+        strip = len(self.prefix) + 1 if self.prefix else 0
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix)):
+            for obj in page.get('Contents', []):
+                results.append({
+                    'key': obj['Key'][strip:],
+                    'size': obj['Size'],
+                    'mtime': obj['LastModified'].timestamp(),
+                })
+        return results
+
+
+class GCSBackend:
+    """Google Cloud Storage; checksum stored as blob metadata"""
+
+    def __init__(self, bucket: str, prefix: str = ''):
+        from google.cloud import storage
+        self.bucket = storage.Client().bucket(bucket)
+        self.prefix = prefix.strip('/')
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def put(self, key: str, local_path: str, sha256: str):
+        blob = self.bucket.blob(self._key(key))
+        blob.metadata = {'sha256': sha256}
+        blob.upload_from_filename(local_path)
+
+    def get(self, key: str, dest_path: str) -> Optional[str]:
+        blob = self.bucket.blob(self._key(key))
+        blob.download_to_filename(dest_path)
+        blob.reload()
+        return (blob.metadata or {}).get('sha256')
+
+    def delete(self, key: str):
+        self.bucket.blob(self._key(key)).delete()
+
+    def exists(self, key: str) -> bool:
+        return self.bucket.blob(self._key(key)).exists()
+
+    def list(self, prefix: str = '') -> List[dict]:
+        strip = len(self.prefix) + 1 if self.prefix else 0
+        return [
+            {'key': blob.name[strip:], 'size': blob.size, 'mtime': blob.updated.timestamp()}
+            for blob in self.bucket.list_blobs(prefix=self._key(prefix))
+        ]
+
+
+def backend_from_url(url: str):
+    parsed = urlparse(url)
+    if parsed.scheme in ('', 'file'):
+        return DirectoryBackend(parsed.path if parsed.scheme else url)
+    if parsed.scheme == 's3':
+        return S3Backend(parsed.netloc, parsed.path)
+    if parsed.scheme == 'gs':
+        return GCSBackend(parsed.netloc, parsed.path)
+    raise ValueError(f"Unsupported artifact store URL: {url}")
+
+
+class ArtifactStore:
+    """Durable backend plus a byte-budgeted LRU cache on local disk"""
+
+    def __init__(self, backend, cache_dir: str, budget_bytes: int):
+        self.backend = backend
+        self.cache_dir = cache_dir
+        self.budget_bytes = budget_bytes
+        self._index = OrderedDict()  # key -> {'size', 'sha256'}; least recent first
+        self._lock = threading.RLock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._index_path = os.path.join(cache_dir, '.index.json')
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    @classmethod
+    def from_env(cls, cache_dir: str) -> Optional['ArtifactStore']:
+        """Build a store from ARTIFACT_STORE_URL / ARTIFACT_CACHE_MB, or None if unset"""
+        url = os.getenv('ARTIFACT_STORE_URL')
+        if not url:
+            return None
+        try:
+            budget_mb = int(os.getenv('ARTIFACT_CACHE_MB', '4096'))
+        except ValueError:
+            budget_mb = 4096
+        return cls(backend_from_url(url), cache_dir, budget_mb * 1024 * 1024)
+
+    def local_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, *key.split('/'))
+
+    def _load_index(self):
+        try:
+            with open(self._index_path) as f:
+                entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            entries = []
+        for entry in entries:
+            path = self.local_path(entry['key'])
+            if os.path.exists(path) and os.path.getsize(path) == entry['size']:
+                self._index[entry['key']] = {'size': entry['size'], 'sha256': entry['sha256'], 'tree': entry.get('tree')}
+
+    def _save_index(self):
+        tmp = self._index_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump([{'key': k, **v} for k, v in self._index.items()], f)
+        os.replace(tmp, self._index_path)
+
+    def _admit(self, key: str, size: int, sha256: str, tree: Optional[str] = None):
+        with self._lock:
+            self._index[key] = {'size': size, 'sha256': sha256, 'tree': tree}
+            self._index.move_to_end(key)
+            self._evict(keep=key)
+            self._save_index()
+
+    def _evict(self, keep: Optional[str] = None):
+        keep_tree = self._index[keep].get('tree') if keep in self._index else None
+        total = sum(v['size'] for v in self._index.values())
+        for key in list(self._index):
+            if total <= self.budget_bytes:
+                break
+            entry = self._index.get(key)
+            if entry is None or key == keep or (keep_tree and entry.get('tree') == keep_tree):
+                continue
+            # Files of a tree go together; a partial snapshot is useless
+            tree = entry.get('tree')
+            victims = [k for k, v in self._index.items() if v.get('tree') == tree] if tree else [key]
+            for victim in victims:
+                total -= self._index.pop(victim)['size']
+                try:
+                    os.remove(self.local_path(victim))
+                except FileNotFoundError:
+                    pass
+            self.evictions += 1
+
+    def put(self, key: str, src_path: str, tree: Optional[str] = None) -> str:
+        """Write an artifact through to the backend and the local cache"""
+        sha256 = sha256_file(src_path)
+        self.backend.put(key, src_path, sha256)
+        dest = self.local_path(key)
+        if os.path.abspath(src_path) != os.path.abspath(dest):
+            # The cached copy may be memory-mapped by a reader; swap it, never rewrite it
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest), suffix='.part')
+            os.close(fd)
+            try:
+                shutil.copyfile(src_path, tmp)
+                os.replace(tmp, dest)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+        self._admit(key, os.path.getsize(dest), sha256, tree)
+        return dest
+
+    def exists(self, key: str) -> bool:
+        """Whether key is stored (locally cached or in the backend)"""
+        return self.is_cached(key) or self.backend.exists(key)
+
+    def is_cached(self, key: str) -> bool:
+        """Whether key is in the local cache (fetch would not download it)"""
+        with self._lock:
+            return key in self._index and os.path.exists(self.local_path(key))
+
+    def fetch(self, key: str, tree: Optional[str] = None) -> str:
+        """Return a local path for key, downloading and verifying it on a miss"""
+        with self._lock:
+            if key in self._index and os.path.exists(self.local_path(key)):
+                self._index.move_to_end(key)
+                self.hits += 1
+                return self.local_path(key)
+            self.misses += 1
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            dest = self.local_path(key)
+            with self._lock:
+                if key in self._index and os.path.exists(dest):
+                    return dest
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest), suffix='.part')
+            os.close(fd)
+            try:
+                expected = self.backend.get(key, tmp)
+                actual = sha256_file(tmp)
+                if expected and expected != actual:
+                    raise ChecksumMismatch(f"Checksum mismatch for {key}: expected {expected}, got {actual}")
+                os.replace(tmp, dest)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+            self._admit(key, os.path.getsize(dest), actual, tree)
+            with self._lock:
+                self._key_locks.pop(key, None)
+            return dest
+
+    def delete(self, key: str):
+        self.backend.delete(key)
+        with self._lock:
+            self._index.pop(key, None)
+            try:
+                os.remove(self.local_path(key))
+            except FileNotFoundError:
+                pass
+            self._save_index()
+
+    def list(self, prefix: str = '') -> List[dict]:
+        return self.backend.list(prefix)
+
+    def prefetch(self, keys: Iterable[str], workers: int = 8, tree: Optional[str] = None) -> dict:
+        """Fetch many artifacts in parallel; returns key -> path or error string"""
+        keys = list(keys)
+        results = {}
+        if not keys:
+            return results
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = {key: pool.submit(self.fetch, key, tree) for key in keys}
+            for key, future in futures.items():
+                try:
+                    results[key] = future.result()
+                except Exception as e:
+                    results[key] = f"error: {e}"
+        print(f"📦 Prefetched {len(keys)} artifacts in {time.time() - start:.1f}s")
+        return results
+
+    def put_tree(self, prefix: str, local_dir: str):
+        """Upload every file under local_dir as prefix/<relative path>, then its manifest"""
+        files = []
+        for dirpath, _, filenames in os.walk(local_dir):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                rel = os.path.relpath(path, local_dir).replace(os.sep, '/')
+                if rel == TREE_MANIFEST:
+                    continue
+                self.put(f"{prefix}/{rel}", os.path.realpath(path), tree=prefix)
+                files.append(rel)
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.part')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(sorted(files), f)
+        try:
+            self.put(f"{prefix}/{TREE_MANIFEST}", tmp, tree=prefix)
+        finally:
+            os.remove(tmp)
+
+    def tree_complete(self, prefix: str) -> bool:
+        """Whether every file in the tree's manifest is in the local cache"""
+        try:
+            with open(self.local_path(f"{prefix}/{TREE_MANIFEST}")) as f:
+                files = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return False
+        with self._lock:
+            keys = [f"{prefix}/{rel}" for rel in files] + [f"{prefix}/{TREE_MANIFEST}"]
+            return all(k in self._index and os.path.exists(self.local_path(k)) for k in keys)
+
+    def fetch_tree(self, prefix: str) -> Optional[str]:
+        """Materialize a complete tree in the cache and return its directory (None if not stored)"""
+        if self.tree_complete(prefix):
+            with self._lock:
+                for key in [k for k, v in self._index.items() if v.get('tree') == prefix]:
+                    self._index.move_to_end(key)
+                self.hits += 1
+            return self.local_path(prefix)
+        manifest_key = f"{prefix}/{TREE_MANIFEST}"
+        # Trees without a manifest were never fully uploaded
+        if not self.backend.exists(manifest_key):
+            return None
+        with open(self.fetch(manifest_key, tree=prefix)) as f:
+            files = json.load(f)
+        results = self.prefetch([f"{prefix}/{rel}" for rel in files], tree=prefix)
+        failed = [k for k, v in results.items() if v.startswith('error')]
+        if failed:
+            raise RuntimeError(f"Failed to fetch {len(failed)} artifacts under {prefix}")
+        if not self.tree_complete(prefix):
+            raise RuntimeError(f"{prefix} does not fit in the artifact cache")
+        return self.local_path(prefix)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'backend': type(self.backend).__name__,
+                'cached': len(self._index),
+                'cached_bytes': sum(v['size'] for v in self._index.values()),
+                'budget_bytes': self.budget_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
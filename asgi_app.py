@@ -0,0 +1,599 @@
+# ASGI Front End for the Voice Cloning Service
+# Same routes as rvc_service_hf.py, served with asyncio so slow uploads and
+# downloads never tie up a worker that could be running inference.
+#
+# Request bodies are parsed incrementally and file parts are streamed straight
+# to disk on a small I/O pool; responses stream from disk. Decode, training and
+# conversion run on a dedicated inference executor.
+#
+# Run: uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+#  or: python asgi_app.py (honors RVC_PORT and RVC_UNIX_SOCKET)
+# Env: ASGI_INFERENCE_WORKERS (default: CPU count), ASGI_IO_WORKERS (default 4)
+
+import os
+import asyncio
+import json
+import contextlib
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:
+    from multipart.multipart import MultipartParser, parse_options_header
+
+import rvc_service_hf as hf
+from admission import AdmissionRejected, PRIORITY_HEADER, parse_deadline, parse_priority
+from sharding import BODY_VOICE_FIELDS, ShardFailed, ShardUnavailable, form_field, hinted_voice_id, path_voice_id
+
+inference_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('ASGI_INFERENCE_WORKERS', str(os.cpu_count() or 2))),
+    thread_name_prefix='inference',
+)
+io_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('ASGI_IO_WORKERS', '4')),
+    thread_name_prefix='io',
+)
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class StreamedForm:
+    """Form fields plus file parts already written to disk"""
+
+    def __init__(self):
+        self.fields = {}
+        self.files = {}  # field name -> (original filename, temp path)
+
+    def cleanup(self):
+        for _, path in self.files.values():
+            _remove_quietly(path)
+
+
+def _remove_quietly(path):
+    try:
+        if path and os.path.exists(path):
+            os.remove(path)
+    except Exception as e:
+        print(f"⚠️  Failed to remove {path}: {e}")
+
+
+async def stream_multipart(request: Request, dest_dir: str) -> StreamedForm:
+    """Parse multipart/form-data from the request stream, spilling files to dest_dir"""
+    content_type, params = parse_options_header(request.headers.get('content-type', ''))
+    if content_type != b'multipart/form-data' or b'boundary' not in params:
+        return StreamedForm()
+
+    form = StreamedForm()
+    loop = asyncio.get_running_loop()
+    limit = hf.app.config['MAX_CONTENT_LENGTH']
+    state = {'headers': {}, 'field': b'', 'value': b'', 'name': None, 'filename': None, 'data': [], 'file': None}
+    pending_writes = []
+    finished_files = []
+
+    def on_part_begin():
+        state.update(headers={}, name=None, filename=None, data=[], file=None)
+
+    def on_header_field(data, start, end):
+        state['field'] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state['value'] += data[start:end]
+
+    def on_header_end():
+        state['headers'][state['field'].lower()] = state['value']
+        state['field'], state['value'] = b'', b''
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state['headers'].get(b'content-disposition', b''))
+        state['name'] = disposition.get(b'name', b'').decode('utf-8', 'replace')
+        filename = disposition.get(b'filename')
+        if filename is not None:
+            state['filename'] = filename.decode('utf-8', 'replace')
+            ext = os.path.splitext(state['filename'])[1] or '.bin'
+            path = os.path.join(dest_dir, f"upload_{uuid.uuid4().hex}{ext}")
+            state['file'] = open(path, 'wb')
+            form.files[state['name']] = (state['filename'], path)
+
+    def on_part_data(data, start, end):
+        if state['file'] is not None:
+            pending_writes.append((state['file'], bytes(data[start:end])))
+        else:
+            state['data'].append(data[start:end])
+
+    def on_part_end():
+        if state['file'] is not None:
+            finished_files.append(state['file'])
+        else:
+            form.fields[state['name']] = b''.join(state['data']).decode('utf-8', 'replace')
+
+    parser = MultipartParser(params[b'boundary'], {
+        'on_part_begin': on_part_begin,
+        'on_part_data': on_part_data,
+        'on_part_end': on_part_end,
+        'on_header_field': on_header_field,
+        'on_header_value': on_header_value,
+        'on_header_end': on_header_end,
+        'on_headers_finished': on_headers_finished,
+    })
+
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > limit:
+                raise UploadTooLarge()
+            parser.write(chunk)
+            # Disk writes happen off the event loop
+            for f, data in pending_writes:
+                await loop.run_in_executor(io_executor, f.write, data)
+            for f in finished_files:
+                await loop.run_in_executor(io_executor, f.close)
+            pending_writes.clear()
+            finished_files.clear()
+        parser.finalize()
+    except BaseException:
+        if state['file'] is not None and not state['file'].closed:
+            state['file'].close()
+        form.cleanup()
+        raise
+    return form
+
+
+def _error(message, status):
+    return JSONResponse({'success': False, 'error': message}, status_code=status)
+
+
+async def run_inference(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(inference_executor, lambda: fn(*args, **kwargs))
+
+
+async def _read_body(receive, limit):
+    chunks, received = [], 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        received += len(chunks[-1])
+        if received > limit:
+            raise UploadTooLarge()
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+def _replay(body, receive):
+    """receive() that yields an already-read body once, then defers to the client"""
+    sent = False
+
+    async def replay():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        return await receive()
+
+    return replay
+
+
+class ShardRoutingMiddleware:
+    """ASGI counterpart of rvc_service_hf.route_to_shard: requests for voices another node owns go there"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        sharding = hf.service.sharding
+        if sharding is None or scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        request = Request(scope)
+        method, path = scope['method'], scope['path']
+        body = None
+        voice_id = path_voice_id(method, path)
+        if voice_id is None and method == 'POST' and not sharding.trusted(request.headers):
+            voice_id = hinted_voice_id(path, request.headers, request.query_params)
+            if voice_id is None and path in BODY_VOICE_FIELDS:
+                # Only unhinted uploads are buffered: the voice id is a form field
+                try:
+                    body = await _read_body(receive, hf.app.config['MAX_CONTENT_LENGTH'])
+                except UploadTooLarge:
+                    return await _error('Upload too large', 413)(scope, receive, send)
+                voice_id = form_field(body, request.headers.get('content-type', ''), BODY_VOICE_FIELDS[path])
+
+        owner = sharding.route(voice_id, request.headers)
+        if owner is None:
+            return await self.app(scope, receive if body is None else _replay(body, receive), send)
+        target = path + (f"?{scope['query_string'].decode('latin-1')}" if scope['query_string'] else '')
+        if sharding.mode == 'redirect':
+            return await RedirectResponse(sharding.redirect_url(owner, target), status_code=307)(scope, receive, send)
+
+        try:
+            if body is None:
+                body = await _read_body(receive, hf.app.config['MAX_CONTENT_LENGTH'])
+            loop = asyncio.get_running_loop()
+            status, headers, payload = await loop.run_in_executor(
+                None, sharding.forward, owner, method, target, request.headers, body)
+        except UploadTooLarge:
+            return await _error('Upload too large', 413)(scope, receive, send)
+        except ShardUnavailable as e:
+            # Owner is down but not yet out of the ring: serve it here from the shared store
+            print(f"⚠️  {e}; serving locally")
+            return await self.app(scope, _replay(body, receive), send)
+        except ShardFailed as e:
+            # The owner may have run it already; running it here too would duplicate the work
+            return await _error(str(e), 504)(scope, receive, send)
+        await Response(payload, status_code=status, headers=dict(headers))(scope, receive, send)
+
+
+async def health(request: Request):
+    """Health check endpoint"""
+    payload = hf.health_status()
+    payload['frontend'] = 'asgi'
+    return JSONResponse(payload)
+
+
+async def shard_ring(request: Request):
+    """This node's view of the voice ring"""
+    if hf.service.sharding is None:
+        return _error('Sharding is not enabled (set SHARD_NODES)', 404)
+    return JSONResponse({'success': True, **hf.service.sharding.stats()})
+
+
+async def shard_member(request: Request):
+    """Add (join) or remove (leave) a node; body {"node": url}, default this node"""
+    action = request.path_params['action']
+    if action not in ('join', 'leave'):
+        return _error('Unknown shard action', 404)
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    # Announcing to peers does blocking HTTP calls
+    result, status = await asyncio.get_running_loop().run_in_executor(
+        None, hf.shard_membership, action, (data or {}).get('node'), request.headers)
+    return JSONResponse(result, status_code=status)
+
+
+async def train(request: Request):
+    """Train/process a new voice model"""
+    try:
+        form = await stream_multipart(request, hf.TEMP_DIR)
+    except UploadTooLarge:
+        return _error('Upload too large', 413)
+    try:
+        if 'audio' not in form.files:
+            return _error('No audio file provided', 400)
+        voice_id = form.fields.get('voice_id')
+        voice_name = form.fields.get('voice_name', 'Unnamed Voice')
+        if not voice_id:
+            return _error('voice_id is required', 400)
+
+        _, temp_audio = form.files['audio']
+        print(f"📥 Saved temp audio: {temp_audio}")
+        result = await run_inference(hf.service.train_model, voice_id, temp_audio, voice_name)
+        return JSONResponse(result)
+    except Exception as e:
+        print(f"❌ Train error: {str(e)}")
+        return _error(str(e), 500)
+    finally:
+        form.cleanup()
+
+
+async def convert(request: Request):
+    """Convert audio using a voice model"""
+    deadline = parse_deadline(request.headers)
+    if deadline is not None and deadline <= time.time():
+        return _error('Request deadline already passed', 504)
+
+    try:
+        form = await stream_multipart(request, hf.TEMP_DIR)
+    except UploadTooLarge:
+        return _error('Upload too large', 413)
+
+    temp_output = None
+    try:
+        if 'audio' not in form.files:
+            form.cleanup()
+            return _error('No audio file provided', 400)
+        fields = form.fields
+        model_id = fields.get('model_id')
+        if not model_id:
+            form.cleanup()
+            return _error('model_id is required', 400)
+
+        skip_silence = fields.get('skip_silence')
+        if skip_silence is not None:
+            skip_silence = skip_silence.lower() not in ('0', 'false', 'no')
+        priority = parse_priority(request.headers.get(PRIORITY_HEADER) or fields.get('priority'))
+        backend = fields.get('backend')
+
+        _, temp_input = form.files['audio']
+        temp_output = os.path.join(hf.TEMP_DIR, f"{model_id}_{uuid.uuid4().hex[:8]}_output.wav")
+
+        def admitted_convert():
+            with hf.admission.admit(backend or 'rvc', priority, deadline):
+                return hf.service.convert_voice(
+                    model_id, temp_input, temp_output, backend=backend, text=fields.get('text'),
+                    hf_repo=fields.get('hf_repo'), hf_revision=fields.get('hf_revision'),
+                    engine=fields.get('engine'), skip_silence=skip_silence,
+                )
+
+        try:
+            result = await run_inference(admitted_convert)
+        except AdmissionRejected as e:
+            print(f"🚦 Rejected conversion for {model_id}: {e}")
+            form.cleanup()
+            response = _error(str(e), e.status)
+            if e.retry_after is not None:
+                response.headers['Retry-After'] = str(e.retry_after)
+            return response
+
+        form.cleanup()
+        if result['success'] and os.path.exists(temp_output):
+            headers = {}
+            if result.get('silence'):
+                headers['X-Silence-Skipped-Seconds'] = f"{result['silence']['skipped_seconds']:.3f}"
+                headers['X-Silence-Skipped-Ratio'] = f"{result['silence']['skipped_ratio']:.3f}"
+            # Streamed from disk; the file is removed once the response is sent
+            return FileResponse(temp_output, media_type='audio/wav', headers=headers,
+                                background=BackgroundTask(_remove_quietly, temp_output))
+        _remove_quietly(temp_output)
+        return JSONResponse(result, status_code=500)
+    except Exception as e:
+        print(f"❌ Convert error: {str(e)}")
+        form.cleanup()
+        _remove_quietly(temp_output)
+        return _error(str(e), 500)
+
+
+async def convert_raw(request: Request):
+    """Convert audio sent as the raw request body, with parameters in headers"""
+    deadline = parse_deadline(request.headers)
+    if deadline is not None and deadline <= time.time():
+        return _error('Request deadline already passed', 504)
+    params = hf.raw_params(request.headers)
+    model_id = params.pop('model_id')
+    if not model_id:
+        return _error('X-Model-Id header is required', 400)
+    priority = parse_priority(request.headers.get(PRIORITY_HEADER))
+
+    request_tag = uuid.uuid4().hex[:8]
+    temp_input = os.path.join(hf.RAW_SPOOL_DIR, f"rvc_{model_id}_{request_tag}_input.wav")
+    temp_output = os.path.join(hf.RAW_SPOOL_DIR, f"rvc_{model_id}_{request_tag}_output.wav")
+    loop = asyncio.get_running_loop()
+    limit = hf.app.config['MAX_CONTENT_LENGTH']
+    try:
+        received = 0
+        with open(temp_input, 'wb') as f:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > limit:
+                    raise UploadTooLarge()
+                await loop.run_in_executor(io_executor, f.write, chunk)
+        if not received:
+            _remove_quietly(temp_input)
+            return _error('Empty request body', 400)
+
+        def admitted_convert():
+            with hf.admission.admit(params['backend'] or 'rvc', priority, deadline):
+                return hf.service.convert_voice(model_id, temp_input, temp_output, **params)
+
+        result = await run_inference(admitted_convert)
+        _remove_quietly(temp_input)
+        if result['success'] and os.path.exists(temp_output):
+            headers = {}
+            if result.get('silence'):
+                headers['X-Silence-Skipped-Seconds'] = f"{result['silence']['skipped_seconds']:.3f}"
+                headers['X-Silence-Skipped-Ratio'] = f"{result['silence']['skipped_ratio']:.3f}"
+            return FileResponse(temp_output, media_type='audio/wav', headers=headers,
+                                background=BackgroundTask(_remove_quietly, temp_output))
+        _remove_quietly(temp_output)
+        return JSONResponse(result, status_code=500)
+    except UploadTooLarge:
+        _remove_quietly(temp_input)
+        return _error('Upload too large', 413)
+    except AdmissionRejected as e:
+        _remove_quietly(temp_input)
+        response = _error(str(e), e.status)
+        if e.retry_after is not None:
+            response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    except Exception as e:
+        print(f"❌ Convert error: {str(e)}")
+        _remove_quietly(temp_input)
+        _remove_quietly(temp_output)
+        return _error(str(e), 500)
+
+
+async def render_script(request: Request):
+    """Render a multi-speaker script into a single audio file (or stream)"""
+    if not hf.RENDER_AVAILABLE:
+        return _error('Script rendering unavailable (install soundfile and scipy)', 503)
+    deadline = parse_deadline(request.headers)
+    if deadline is not None and deadline <= time.time():
+        return _error('Request deadline already passed', 504)
+
+    form = StreamedForm()
+    try:
+        if request.headers.get('content-type', '').startswith('application/json'):
+            data = await request.json()
+        else:
+            form = await stream_multipart(request, hf.TEMP_DIR)
+            data = json.loads(form.fields.get('script') or 'null')
+        uploads = {name: path for name, (_, path) in form.files.items()}
+        script = hf.parse_script(data, uploads)
+        priority = parse_priority(request.headers.get(PRIORITY_HEADER) or form.fields.get('priority'))
+        stream = str(request.query_params.get('stream', (data or {}).get('stream', ''))).lower() in ('1', 'true', 'yes')
+
+        if stream:
+            if script['format'] != 'wav':
+                raise hf.ScriptError('streaming is only supported for wav output')
+            render_id, chunks = await run_inference(hf.renderer.stream, script, priority, deadline)
+            # Sync iterator: Starlette pulls it on its threadpool, so waiting on turns never blocks the loop
+            return StreamingResponse(chunks, media_type='audio/wav', headers={'X-Render-Id': render_id},
+                                     background=BackgroundTask(form.cleanup))
+
+        try:
+            path, timing = await run_inference(hf.renderer.render, script, priority, deadline)
+        finally:
+            form.cleanup()
+        return FileResponse(path, media_type=hf.RENDER_FORMATS[script['format']][2], headers=hf.render_headers(timing),
+                            background=BackgroundTask(_remove_quietly, path))
+    except UploadTooLarge:
+        return _error('Upload too large', 413)
+    except AdmissionRejected as e:
+        form.cleanup()
+        response = _error(str(e), e.status)
+        if e.retry_after is not None:
+            response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    except ValueError as e:
+        form.cleanup()
+        return _error(str(e), getattr(e, 'status', 400))
+    except Exception as e:
+        print(f"❌ Render error: {str(e)}")
+        form.cleanup()
+        return _error(str(e), 500)
+
+
+async def get_render_timing(request: Request):
+    """Per-turn timing of a recent render (needed for streamed renders)"""
+    timing = hf.renderer.timing(request.path_params['render_id']) if hf.renderer else None
+    if not timing:
+        return _error('Render not found', 404)
+    return JSONResponse({'success': True, **timing})
+
+
+async def get_models(request: Request):
+    """Get list of available models"""
+    return JSONResponse(hf.models_listing())
+
+
+async def similar_models(request: Request):
+    """Top-k cosine search over voice embeddings, by voice_id or uploaded sample"""
+    form = StreamedForm()
+    try:
+        if request.method == 'POST':
+            form = await stream_multipart(request, hf.TEMP_DIR)
+        params = {**request.query_params, **form.fields}
+        try:
+            k = max(1, min(int(params.get('k', '5')), 100))
+        except ValueError:
+            return _error('k must be an integer', 400)
+        if 'audio' in form.files:
+            result = await run_inference(hf.service.similar_voices, audio_path=form.files['audio'][1], k=k)
+        elif params.get('voice_id'):
+            result = await run_inference(hf.service.similar_voices, voice_id=params['voice_id'], k=k)
+        else:
+            return _error('voice_id or audio is required', 400)
+    except UploadTooLarge:
+        return _error('Upload too large', 413)
+    except Exception as e:
+        return _error(str(e), 500)
+    finally:
+        form.cleanup()
+    if result['success']:
+        return JSONResponse(result)
+    return JSONResponse(result, status_code=404 if result.get('error') == 'Voice not indexed' else 500)
+
+
+async def delete_model(request: Request):
+    """Delete a voice model"""
+    result = await run_inference(hf.service.delete_model, request.path_params['model_id'])
+    return JSONResponse(result, status_code=200 if result['success'] else 404)
+
+
+async def warm_model(request: Request):
+    """Prefetch a voice model into memory"""
+    result = await run_inference(hf.service.warm_model, request.path_params['model_id'])
+    if result['success']:
+        return JSONResponse(result)
+    return JSONResponse(result, status_code=404 if result.get('error') == 'Model not found' else 500)
+
+
+async def pin_model(request: Request):
+    """Pin (POST) or unpin (DELETE) a voice model in memory"""
+    result = await run_inference(hf.service.pin_model, request.path_params['model_id'], request.method == 'POST')
+    if result['success']:
+        return JSONResponse(result)
+    return JSONResponse(result, status_code=404 if result.get('error') == 'Model not found' else 500)
+
+
+async def get_training_progress(request: Request):
+    """Get training progress for a specific voice"""
+    voice_id = request.path_params['voice_id']
+    if voice_id in hf.training_progress:
+        return JSONResponse({'success': True, **hf.training_progress[voice_id]})
+    return JSONResponse({
+        'success': False,
+        'status': 'not_found',
+        'progress': 0,
+        'message': 'No training in progress'
+    })
+
+
+routes = [
+    Route('/health', health, methods=['GET']),
+    Route('/shard', shard_ring, methods=['GET']),
+    Route('/shard/{action}', shard_member, methods=['POST']),
+    Route('/train', train, methods=['POST']),
+    Route('/convert', convert, methods=['POST']),
+    Route('/convert/raw', convert_raw, methods=['POST']),
+    Route('/render/script', render_script, methods=['POST']),
+    Route('/render/{render_id}', get_render_timing, methods=['GET']),
+    Route('/models', get_models, methods=['GET']),
+    Route('/models/similar', similar_models, methods=['GET', 'POST']),
+    Route('/models/{model_id}', delete_model, methods=['DELETE']),
+    Route('/models/{model_id}/warm', warm_model, methods=['POST']),
+    Route('/models/{model_id}/pin', pin_model, methods=['POST', 'DELETE']),
+    Route('/training-progress/{voice_id}', get_training_progress, methods=['GET']),
+]
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    inference_executor.shutdown(wait=False)
+    io_executor.shutdown(wait=False)
+    hf.service.preprocess.shutdown()
+    if hf.service.sharding:
+        hf.service.sharding.stop()
+
+
+app = Starlette(
+    routes=routes,
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*']),
+                Middleware(ShardRoutingMiddleware)],
+    lifespan=lifespan,
+)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.environ.get('RVC_PORT', '5000'))
+    unix_socket = os.environ.get('RVC_UNIX_SOCKET')
+    print(f"🎤 RVC Voice Cloning Service (ASGI) on http://localhost:{port}")
+    if not unix_socket:
+        uvicorn.run(app, host='0.0.0.0', port=port)
+    else:
+        # TCP and a Unix-domain socket (for a co-located Node process) on one event loop
+        print(f"   Unix socket: {unix_socket}")
+        servers = [uvicorn.Server(uvicorn.Config(app, host='0.0.0.0', port=port)),
+                   uvicorn.Server(uvicorn.Config(app, uds=unix_socket, lifespan='off'))]
+
+        async def serve_all():
+            await asyncio.gather(*(server.serve() for server in servers))
+
+        asyncio.run(serve_all())
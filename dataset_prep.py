@@ -0,0 +1,266 @@
+# Dataset Preparation
+# Decode, resample, trim and slice training audio into fixed-length segments.
+# Shared by the Colab notebook and the RVC training pipeline.
+#
+# Sources are processed across a process pool. Each source is read once,
+# resampled with the cached polyphase kernels, trimmed of leading/trailing
+# silence, peak-normalized and sliced; segments are written as 16-bit WAVs
+# through a memory map. A manifest in the output folder keys every source by
+# content hash plus prep parameters, so re-runs only touch new or changed files.
+#
+# CLI: python dataset_prep.py --input voice_raw --output voice_proc [--sr 22050] [--workers N]
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import numpy as np
+import soundfile as sf
+
+from resampling import resample
+from silence import frame_energy_db
+
+MANIFEST_NAME = '.prep_manifest.json'
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.ogg', '.mp3', '.m4a', '.aac', '.opus', '.aiff', '.aif')
+PREP_VERSION = 1  # bump when processing changes so cached segments are redone
+
+
+def prep_params(target_sr: int = 22050, segment_seconds: float = 5.0, min_segment_ratio: float = 0.5,
+                trim: bool = True, trim_db: float = 40.0, normalize: bool = True) -> dict:
+    return {
+        'version': PREP_VERSION,
+        'target_sr': int(target_sr),
+        'segment_seconds': float(segment_seconds),
+        'min_segment_ratio': float(min_segment_ratio),
+        'trim': bool(trim),
+        'trim_db': float(trim_db),
+        'normalize': bool(normalize),
+    }
+
+
+def source_key(path: str, params: dict) -> str:
+    """Cache key: sha256 of the source bytes plus the prep parameters"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def decode(path: str):
+    """Return (mono float32 samples, sample_rate)"""
+    try:
+        data, sr = sf.read(path, dtype='float32', always_2d=True)
+        return data.mean(axis=1), sr
+    except Exception:
+        # Formats libsndfile can't read (mp3/m4a on older builds)
+        import librosa
+        y, sr = librosa.load(path, sr=None, mono=True)
+        return y.astype(np.float32), sr
+
+
+def trim_silence(y: np.ndarray, sr: int, top_db: float = 40.0) -> np.ndarray:
+    """Drop leading/trailing frames more than top_db below the loudest frame"""
+    if len(y) == 0:
+        return y
+    frame, hop = max(1, int(0.03 * sr)), max(1, int(0.01 * sr))
+    energy = frame_energy_db(y, frame, hop)
+    loud = np.flatnonzero(energy > energy.max() - top_db)
+    if len(loud) == 0:
+        return y[:0]
+    return y[loud[0] * hop:min(len(y), loud[-1] * hop + frame)]
+
+
+def write_wav_memmap(path: str, samples: np.ndarray, sr: int):
+    """Write mono 16-bit PCM: header first, then quantize straight into a memory-mapped data chunk"""
+    n = len(samples)
+    header = b'RIFF' + struct.pack('<I', 36 + 2 * n) + b'WAVE'
+    header += b'fmt ' + struct.pack('<IHHIIHH', 16, 1, 1, sr, sr * 2, 2, 16)
+    header += b'data' + struct.pack('<I', 2 * n)
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.truncate(len(header) + 2 * n)
+    if n == 0:
+        return
+    out = np.memmap(path, dtype='<i2', mode='r+', offset=len(header), shape=(n,))
+    np.multiply(np.clip(samples, -1.0, 1.0), 32767.0, out=out, casting='unsafe')
+    out.flush()
+    del out
+
+
+def process_source(path: str, out_dir: str, params: dict, known: Optional[dict] = None) -> dict:
+    """Prep one source file; reuse existing segments when its cache key is already in the manifest"""
+    key = source_key(path, params)
+    if known and key in known and all(os.path.exists(os.path.join(out_dir, s)) for s in known[key]['segments']):
+        return {**known[key], 'key': key, 'cached': True}
+
+    y, sr = decode(path)
+    seconds = len(y) / float(sr) if sr else 0.0
+    if sr != params['target_sr']:
+        y = resample(y, sr, params['target_sr'])
+        sr = params['target_sr']
+    if params['trim']:
+        y = trim_silence(y, sr, params['trim_db'])
+    if params['normalize']:
+        peak = np.max(np.abs(y)) if len(y) else 0.0
+        if peak > 0:
+            y = y / peak
+
+    seg_len = int(params['segment_seconds'] * sr)
+    min_len = int(params['min_segment_ratio'] * seg_len)
+    stem = f"seg_{Path(path).stem}_{key[:8]}"
+    segments = []
+    for i in range(0, len(y), seg_len):
+        seg = y[i:i + seg_len]
+        if len(seg) < min_len:
+            continue
+        name = f"{stem}_{len(segments):04d}.wav"
+        write_wav_memmap(os.path.join(out_dir, name), seg, sr)
+        segments.append(name)
+
+    return {'source': os.path.abspath(path), 'segments': segments, 'seconds': seconds, 'key': key, 'cached': False}
+
+
+_known = {}
+
+
+def _init_worker(known: dict):
+    # The manifest is shipped once per worker rather than once per job
+    global _known
+    _known = known
+
+
+def _process_safe(args):
+    path, out_dir, params = args
+    try:
+        return process_source(path, out_dir, params, _known)
+    except Exception as e:
+        return {'source': os.path.abspath(path), 'error': str(e)}
+
+
+def find_sources(inputs: Iterable[str]) -> List[str]:
+    files = []
+    for item in inputs:
+        p = Path(item)
+        if p.is_dir():
+            files.extend(str(f) for f in sorted(p.rglob('*')) if f.is_file() and f.suffix.lower() in AUDIO_EXTENSIONS)
+        elif p.is_file():
+            files.append(str(p))
+    return files
+
+
+def load_manifest(out_dir: str) -> dict:
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(out_dir: str, manifest: dict):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def prepare_dataset(inputs, out_dir: str, workers: Optional[int] = None, **param_overrides) -> dict:
+    """Prep every audio file under inputs into out_dir; returns a throughput report
+
+    inputs is a path or list of paths (files or folders). Keyword arguments
+    override prep_params() defaults (target_sr, segment_seconds, trim, ...).
+    """
+    start = time.perf_counter()
+    inputs = [inputs] if isinstance(inputs, (str, os.PathLike)) else list(inputs)
+    params = prep_params(**param_overrides)
+    os.makedirs(out_dir, exist_ok=True)
+    sources = find_sources(inputs)
+    manifest = load_manifest(out_dir)
+    workers = workers or min(len(sources), os.cpu_count() or 1) or 1
+
+    jobs = [(path, out_dir, params) for path in sources]
+    if workers <= 1 or len(jobs) <= 1:
+        _init_worker(manifest)
+        results = [_process_safe(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(manifest,)) as pool:
+            results = list(pool.map(_process_safe, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+    # Segments from earlier runs of the same source with other contents/params are stale
+    processed_sources = {r['source'] for r in results if 'key' in r}
+    current_keys = {r['key'] for r in results if 'key' in r}
+    for key, entry in list(manifest.items()):
+        if entry['source'] in processed_sources and key not in current_keys:
+            for name in entry['segments']:
+                try:
+                    os.remove(os.path.join(out_dir, name))
+                except OSError:
+                    pass
+            del manifest[key]
+
+    failed = [r for r in results if 'error' in r]
+    for r in results:
+        if 'key' in r:
+            manifest[r['key']] = {'source': r['source'], 'segments': r['segments'], 'seconds': r['seconds']}
+    save_manifest(out_dir, manifest)
+
+    done = [r for r in results if 'key' in r]
+    fresh = [r for r in done if not r['cached']]
+    elapsed = time.perf_counter() - start
+    return {
+        'files': len(sources),
+        'processed': len(fresh),
+        'cached': len(done) - len(fresh),
+        'failed': [{'source': r['source'], 'error': r['error']} for r in failed],
+        'segments': sorted(s for r in done for s in r['segments']),
+        'keys': sorted(current_keys),
+        'audio_hours': sum(r['seconds'] for r in done) / 3600.0,
+        'processed_audio_hours': sum(r['seconds'] for r in fresh) / 3600.0,
+        'elapsed_seconds': elapsed,
+        'files_per_second': len(sources) / elapsed if elapsed > 0 else 0.0,
+        'workers': workers,
+        'params': params,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode, resample, trim and slice training audio")
+    parser.add_argument("--input", required=True, nargs='+', help="Audio files or folders")
+    parser.add_argument("--output", required=True, help="Folder for the sliced segments")
+    parser.add_argument("--sr", type=int, default=22050, help="Target sample rate")
+    parser.add_argument("--segment-seconds", type=float, default=5.0)
+    parser.add_argument("--min-segment-ratio", type=float, default=0.5, help="Drop tail segments shorter than this fraction")
+    parser.add_argument("--trim-db", type=float, default=40.0, help="Trim edges quieter than this below peak")
+    parser.add_argument("--no-trim", action="store_true")
+    parser.add_argument("--no-normalize", action="store_true")
+    parser.add_argument("--workers", type=int, default=None, help="Processes (default: CPU count)")
+    parser.add_argument("--json", action="store_true", help="Print the full report as JSON")
+    args = parser.parse_args()
+
+    report = prepare_dataset(
+        args.input, args.output, workers=args.workers, target_sr=args.sr, segment_seconds=args.segment_seconds,
+        min_segment_ratio=args.min_segment_ratio, trim=not args.no_trim, trim_db=args.trim_db,
+        normalize=not args.no_normalize,
+    )
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"✅ {report['files']} files ({report['processed']} processed, {report['cached']} cached, "
+              f"{len(report['failed'])} failed) -> {len(report['segments'])} segments in {args.output}")
+        print(f"   {report['files_per_second']:.1f} files/s, {report['audio_hours']:.2f} h of audio "
+              f"({report['processed_audio_hours']:.2f} h processed this run)")
+        for failure in report['failed']:
+            print(f"   ⚠️  Skipped {failure['source']}: {failure['error']}")
+    sys.exit(1 if report['failed'] and len(report['failed']) == report['files'] else 0)
+
+
+if __name__ == "__main__":
+    main()
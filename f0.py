@@ -0,0 +1,290 @@
+# Pitch (f0) Extraction and Statistics
+# Fundamental-frequency curves for conversion inputs and per-voice pitch
+# statistics for automatic pitch-shift selection.
+#
+# The default extractor is a YIN implementation vectorized over frames: the
+# difference function of every frame comes from one batched FFT
+# autocorrelation plus cumulative energies, so a minute of audio is a handful
+# of array ops. Higher-quality extractors are used when installed:
+#   harvest   pyworld's Harvest (slower, robust on breathy/low voices)
+#   crepe     torchcrepe's neural tracker (best quality, GPU-friendly)
+# Curves are sampled every 10 ms at 16 kHz, the frame rate RVC works at.
+#
+# F0Cache keeps input curves on disk keyed by the SHA-256 of the audio bytes
+# plus the extractor settings, so re-converting the same input (or rendering
+# it into several voices) skips extraction. It only saves conversion work when
+# the curve is handed to infer.py (RVC_F0_FILE=1); otherwise infer.py extracts
+# f0 itself and the cached curve only feeds the auto pitch shift.
+#
+# Env: F0_METHOD (yin|harvest|crepe, default yin), F0_TRAIN_METHOD (default:
+#      harvest if pyworld is installed, else F0_METHOD), F0_CACHE_MB (default 256),
+#      F0_MAX_SHIFT (semitones, default 12)
+
+import hashlib
+import json
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+from scipy.signal import medfilt
+
+from resampling import resample
+
+try:
+    import pyworld  # type: ignore
+    PYWORLD_AVAILABLE = True
+except ImportError:
+    PYWORLD_AVAILABLE = False
+
+try:
+    import torchcrepe  # type: ignore
+    CREPE_AVAILABLE = True
+except ImportError:
+    CREPE_AVAILABLE = False
+
+F0_SR = 16000
+HOP = 160  # 10 ms
+FRAME = 1024  # long enough for two periods at F0_MIN
+F0_MIN = 50.0
+F0_MAX = 1100.0
+YIN_THRESHOLD = 0.15
+BLOCK_FRAMES = 2048  # frames per FFT batch; bounds peak memory on long inputs
+METHODS = ('yin', 'harvest', 'crepe')
+F0_VERSION = 1  # bump when extraction changes so cached curves are recomputed
+
+
+def _frames(y: np.ndarray) -> np.ndarray:
+    """Centered FRAME-long windows every HOP samples, [n_frames, FRAME] (a view)"""
+    y = np.pad(y, (FRAME // 2, FRAME // 2))
+    return np.lib.stride_tricks.sliding_window_view(y, FRAME)[::HOP]
+
+
+def yin(audio: np.ndarray, sr: int, fmin: float = F0_MIN, fmax: float = F0_MAX,
+        threshold: float = YIN_THRESHOLD) -> np.ndarray:
+    """YIN f0 in Hz per 10 ms frame (0 = unvoiced), vectorized across frames"""
+    y = resample(np.asarray(audio, dtype=np.float32), sr, F0_SR) if sr != F0_SR else np.asarray(audio, np.float32)
+    tau_min = max(2, int(F0_SR / fmax))
+    tau_max = min(FRAME // 2, int(np.ceil(F0_SR / fmin)))
+    w = FRAME - tau_max  # integration window
+    n_fft = FRAME  # lags never reach past the frame, so no wrap-around padding is needed
+    frames = _frames(y)
+    f0 = np.zeros(len(frames), dtype=np.float32)
+    taus = np.arange(tau_max + 1)
+
+    for start in range(0, len(frames), BLOCK_FRAMES):
+        x = frames[start:start + BLOCK_FRAMES].astype(np.float64)
+
+        # d(tau) = E(0) + E(tau) - 2 r(tau), every term for every frame at once
+        corr = np.fft.irfft(np.conj(np.fft.rfft(x[:, :w], n_fft)) * np.fft.rfft(x, n_fft), n_fft)[:, :tau_max + 1]
+        energy = np.concatenate([np.zeros((len(x), 1)), np.cumsum(x * x, axis=1)], axis=1)
+        window_energy = energy[:, taus + w] - energy[:, taus]
+        diff = np.maximum(window_energy[:, :1] + window_energy - 2.0 * corr, 0.0)
+
+        # Cumulative mean normalized difference
+        cmnd = np.ones_like(diff)
+        running = np.cumsum(diff[:, 1:], axis=1)
+        cmnd[:, 1:] = diff[:, 1:] * taus[1:] / np.maximum(running, 1e-12)
+
+        # First tau under the threshold that is also the bottom of its dip
+        search = cmnd[:, tau_min:tau_max]
+        dip = (search < threshold) & (search <= cmnd[:, tau_min + 1:tau_max + 1])
+        voiced = dip.any(axis=1) & (window_energy[:, 0] > 1e-6 * w)
+        tau = np.argmax(dip, axis=1) + tau_min
+
+        # Parabolic interpolation between neighbouring lags
+        rows = np.arange(len(x))
+        left, mid, right = cmnd[rows, tau - 1], cmnd[rows, tau], cmnd[rows, np.minimum(tau + 1, tau_max)]
+        denom = left - 2.0 * mid + right
+        shift = np.where(np.abs(denom) > 1e-12, 0.5 * (left - right) / np.where(denom == 0, 1, denom), 0.0)
+        period = tau + np.clip(shift, -1.0, 1.0)
+        block = np.where(voiced, F0_SR / period, 0.0)
+        f0[start:start + len(x)] = np.where((block >= fmin) & (block <= fmax), block, 0.0)
+
+    # Knock out single-frame octave jumps
+    return medfilt(f0, 3).astype(np.float32) if len(f0) >= 3 else f0
+
+
+def harvest(audio: np.ndarray, sr: int, fmin: float = F0_MIN, fmax: float = F0_MAX) -> np.ndarray:
+    x = np.asarray(audio, dtype=np.float64)
+    f0, _ = pyworld.harvest(x, sr, f0_floor=fmin, f0_ceil=fmax, frame_period=1000.0 * HOP / F0_SR)
+    return f0.astype(np.float32)
+
+
+def crepe(audio: np.ndarray, sr: int, fmin: float = F0_MIN, fmax: float = F0_MAX) -> np.ndarray:
+    import torch
+    y = resample(np.asarray(audio, dtype=np.float32), sr, F0_SR) if sr != F0_SR else np.asarray(audio, np.float32)
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    f0, periodicity = torchcrepe.predict(torch.from_numpy(y)[None], F0_SR, HOP, fmin, fmax, model='full',
+                                         batch_size=512, device=device, return_periodicity=True)
+    f0, periodicity = f0[0].cpu().numpy(), periodicity[0].cpu().numpy()
+    return np.where(periodicity >= 0.1, f0, 0.0).astype(np.float32)
+
+
+def resolve_method(method: Optional[str] = None) -> str:
+    """Requested extractor if its package is installed, else yin"""
+    method = (method or os.getenv('F0_METHOD', 'yin')).lower()
+    if method == 'harvest' and not PYWORLD_AVAILABLE:
+        return 'yin'
+    if method == 'crepe' and not CREPE_AVAILABLE:
+        return 'yin'
+    return method if method in METHODS else 'yin'
+
+
+def train_method() -> str:
+    """Training runs offline, so it gets the better extractor when one is installed"""
+    return resolve_method(os.getenv('F0_TRAIN_METHOD') or ('harvest' if PYWORLD_AVAILABLE else None))
+
+
+def extract_f0(audio: np.ndarray, sr: int, method: Optional[str] = None) -> np.ndarray:
+    """f0 in Hz every 10 ms (0 = unvoiced) from mono or [frames, channels] audio"""
+    audio = np.asarray(audio, dtype=np.float32)
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    method = resolve_method(method)
+    if method == 'harvest':
+        return harvest(audio, sr)
+    if method == 'crepe':
+        return crepe(audio, sr)
+    return yin(audio, sr)
+
+
+def f0_stats(f0: np.ndarray, method: str = 'yin') -> dict:
+    """Summary of the voiced frames of an f0 curve; the means are in log2(Hz)"""
+    f0 = np.asarray(f0, dtype=np.float64)
+    voiced = f0[f0 > 0]
+    stats = {'method': method, 'frames': int(len(f0)), 'voiced_ratio': float(len(voiced) / len(f0)) if len(f0) else 0.0}
+    if len(voiced) == 0:
+        return {**stats, 'median_hz': None, 'mean_log2': None, 'std_semitones': None, 'p5_hz': None, 'p95_hz': None}
+    log2 = np.log2(voiced)
+    return {
+        **stats,
+        'median_hz': float(np.median(voiced)),
+        'mean_log2': float(log2.mean()),
+        'std_semitones': float(12.0 * log2.std()),
+        'p5_hz': float(np.percentile(voiced, 5)),
+        'p95_hz': float(np.percentile(voiced, 95)),
+    }
+
+
+def auto_pitch_shift(source: Optional[dict], target: Optional[dict], max_shift: Optional[int] = None) -> int:
+    """Semitones that move the source's average pitch onto the target voice's"""
+    if max_shift is None:
+        max_shift = int(os.getenv('F0_MAX_SHIFT', '12'))
+    if not source or not target or source.get('mean_log2') is None or target.get('mean_log2') is None:
+        return 0
+    # Mostly-unvoiced inputs (noise, music beds) give unreliable averages
+    if source.get('voiced_ratio', 0.0) < 0.05:
+        return 0
+    shift = int(round(12.0 * (target['mean_log2'] - source['mean_log2'])))
+    return max(-max_shift, min(max_shift, shift))
+
+
+def write_f0_file(f0: np.ndarray, path: str):
+    """RVC's --f0_file format: one 'seconds,hz' line per frame"""
+    times = np.arange(len(f0)) * (HOP / F0_SR)
+    np.savetxt(path, np.column_stack([times, f0]), fmt='%.3f', delimiter=',')
+
+
+def load_voice_stats(path: str) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_voice_stats(path: str, stats: dict):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(stats, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+class F0Cache:
+    """Disk cache of f0 curves keyed by audio content hash, bounded by F0_CACHE_MB"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, directory: str) -> 'F0Cache':
+        return cls(directory, int(float(os.getenv('F0_CACHE_MB', '256')) * 1024 * 1024))
+
+    @staticmethod
+    def key(path: str, method: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        digest.update(f"{method}:{F0_SR}:{HOP}:{F0_VERSION}".encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npy")
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        path = self._path(key)
+        try:
+            f0 = np.load(path)
+            os.utime(path)  # recency for eviction
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return f0
+
+    def put(self, key: str, f0: np.ndarray):
+        path = self._path(key)
+        tmp = path + '.tmp.npy'
+        np.save(tmp, np.asarray(f0, dtype=np.float32))
+        os.replace(tmp, path)
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if name.endswith('.npy') and '.tmp' not in name:
+                    try:
+                        st = os.stat(os.path.join(self.directory, name))
+                        entries.append((st.st_mtime, st.st_size, name))
+                    except OSError:
+                        pass
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                    total -= size
+                except OSError:
+                    pass
+
+    def curve(self, path: str, audio_loader, method: Optional[str] = None):
+        """(f0, key, hit) for the audio file at path; audio_loader(path) -> (samples, sr) runs on a miss"""
+        method = resolve_method(method)
+        key = self.key(path, method)
+        f0 = self.get(key)
+        if f0 is not None:
+            return f0, key, True
+        audio, sr = audio_loader(path)
+        f0 = extract_f0(audio, sr, method)
+        self.put(key, f0)
+        return f0, key, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'max_mb': self.max_bytes / (1024 * 1024),
+            }
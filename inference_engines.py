@@ -0,0 +1,263 @@
+# Inference Engines for Voice-Conversion Backends
+# In-process execution of conversion models from a cached Hugging Face repo.
+#
+# A repo can ship either an ONNX graph (model.onnx) or a TorchScript module
+# (model.pt / model.ts) mapping a float32 waveform [batch, samples] to a
+# converted waveform. An optional config.json may declare "sample_rate".
+#
+# TorchEngine runs the TorchScript module eagerly. OnnxEngine exports it to
+# ONNX once, caches the graph under MODELS_DIR/onnx/<repo>/<commit>/, and
+# reuses tuned ONNX Runtime CPU sessions across requests. Loaded modules,
+# sessions and graphs are keyed on the snapshot's commit, so a branch that
+# moves to a new commit gets a fresh export instead of the old graph.
+
+import os
+import json
+import hashlib
+import shutil
+import tempfile
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+
+try:
+    import torch
+    TORCH_AVAILABLE = True
+except ImportError:
+    TORCH_AVAILABLE = False
+
+try:
+    import onnxruntime as ort
+    ORT_AVAILABLE = True
+except ImportError:
+    ORT_AVAILABLE = False
+
+ENGINES = ('torch', 'onnx')
+TORCHSCRIPT_NAMES = ('model.pt', 'model.ts', 'model.torchscript')
+ONNX_NAME = 'model.onnx'
+DEFAULT_SAMPLE_RATE = 16000
+
+
+def repo_sample_rate(repo_path: str) -> int:
+    """Sample rate the repo's model expects (config.json, else 16 kHz)"""
+    config_path = os.path.join(repo_path, 'config.json')
+    try:
+        with open(config_path) as f:
+            return int(json.load(f).get('sample_rate', DEFAULT_SAMPLE_RATE))
+    except Exception:
+        return DEFAULT_SAMPLE_RATE
+
+
+def is_commit_hash(revision: Optional[str]) -> bool:
+    return bool(revision) and len(revision) == 40 and all(c in '0123456789abcdef' for c in revision)
+
+
+def snapshot_id(repo_path: str, revision: Optional[str] = None) -> str:
+    """Commit a cached snapshot was taken at; HF cache and artifact store dirs are named by it"""
+    name = os.path.basename(os.path.normpath(repo_path))
+    if is_commit_hash(name):
+        return name
+    if is_commit_hash(revision):
+        return revision
+    # Not an HF snapshot dir: key on the directory itself
+    return 'dir-' + hashlib.sha1(os.path.abspath(repo_path).encode('utf-8')).hexdigest()[:16]
+
+
+def find_torchscript(repo_path: str) -> Optional[str]:
+    for name in TORCHSCRIPT_NAMES:
+        candidate = os.path.join(repo_path, name)
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def _as_batch(waveform: np.ndarray) -> Tuple[np.ndarray, bool]:
+    """Return [batch, samples] float32 and whether the input was 1-D"""
+    waveform = np.asarray(waveform, dtype=np.float32)
+    if waveform.ndim == 1:
+        return waveform[np.newaxis, :], True
+    return waveform, False
+
+
+class TorchEngine:
+    """Eager TorchScript execution, one loaded module per repo revision"""
+
+    name = 'torch'
+
+    def __init__(self):
+        self._modules = {}
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return TORCH_AVAILABLE
+
+    def supports(self, repo_path: str) -> bool:
+        return TORCH_AVAILABLE and find_torchscript(repo_path) is not None
+
+    def _module(self, repo_id: str, revision: Optional[str], repo_path: str):
+        key = (repo_id, snapshot_id(repo_path, revision))
+        with self._lock:
+            module = self._modules.get(key)
+            if module is None:
+                module = torch.jit.load(find_torchscript(repo_path), map_location='cpu')
+                module.eval()
+                self._modules[key] = module
+            return module
+
+    def run(self, repo_id: str, revision: Optional[str], repo_path: str, waveform: np.ndarray) -> np.ndarray:
+        module = self._module(repo_id, revision, repo_path)
+        batch, squeeze = _as_batch(waveform)
+        with torch.inference_mode():
+            output = module(torch.from_numpy(batch)).float().numpy()
+        return output[0] if squeeze else output
+
+
+class OnnxEngine:
+    """ONNX Runtime CPU execution with a per-revision exported graph cache"""
+
+    name = 'onnx'
+
+    def __init__(self, cache_dir: str, intra_op_threads: Optional[int] = None,
+                 inter_op_threads: Optional[int] = None, opset: int = 17):
+        self.cache_dir = cache_dir
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.opset = opset
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}  # per-snapshot, so one export never stalls other models
+        self.exports = 0
+
+    @classmethod
+    def from_env(cls, cache_dir: str):
+        def _int(name):
+            try:
+                return int(os.environ[name])
+            except (KeyError, ValueError):
+                return None
+        return cls(cache_dir, _int('ORT_INTRA_OP_THREADS'), _int('ORT_INTER_OP_THREADS'))
+
+    @property
+    def available(self) -> bool:
+        return ORT_AVAILABLE
+
+    def supports(self, repo_path: str) -> bool:
+        if not ORT_AVAILABLE:
+            return False
+        if os.path.exists(os.path.join(repo_path, ONNX_NAME)):
+            return True
+        return TORCH_AVAILABLE and find_torchscript(repo_path) is not None
+
+    def graph_dir(self, repo_id: str, snapshot: str) -> str:
+        return os.path.join(self.cache_dir, repo_id.replace('/', '--'), snapshot)
+
+    def ensure_graph(self, repo_id: str, revision: Optional[str], repo_path: str) -> str:
+        """Return the cached ONNX graph for a repo snapshot, exporting it if needed"""
+        graph_dir = self.graph_dir(repo_id, snapshot_id(repo_path, revision))
+        graph_path = os.path.join(graph_dir, ONNX_NAME)
+        if os.path.exists(graph_path):
+            return graph_path
+
+        shipped = os.path.join(repo_path, ONNX_NAME)
+        source = None
+        if not os.path.exists(shipped):
+            source = find_torchscript(repo_path)
+            if source is None or not TORCH_AVAILABLE:
+                raise FileNotFoundError(f"No ONNX graph or TorchScript module in {repo_path}")
+
+        os.makedirs(graph_dir, exist_ok=True)
+        # Unique temp name: other processes sharing the cache may be exporting the same snapshot
+        fd, tmp_path = tempfile.mkstemp(suffix='.onnx.tmp', dir=graph_dir)
+        os.close(fd)
+        try:
+            if source is None:
+                shutil.copyfile(shipped, tmp_path)
+            else:
+                print(f"📦 Exporting {repo_id} to ONNX...")
+                module = torch.jit.load(source, map_location='cpu').eval()
+                dummy = torch.zeros(1, repo_sample_rate(repo_path))
+                torch.onnx.export(
+                    module, (dummy,), tmp_path,
+                    input_names=['waveform'], output_names=['output'],
+                    dynamic_axes={'waveform': {0: 'batch', 1: 'samples'}, 'output': {0: 'batch', 1: 'out_samples'}},
+                    opset_version=self.opset,
+                )
+                with self._lock:
+                    self.exports += 1
+            os.replace(tmp_path, graph_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        print(f"✅ ONNX graph cached: {graph_path}")
+        return graph_path
+
+    def _session_options(self, optimized_path: str):
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.enable_mem_pattern = True
+        options.enable_cpu_mem_arena = True
+        # Persist the optimized graph so later processes skip the optimization pass
+        options.optimized_model_filepath = optimized_path
+        if self.intra_op_threads:
+            options.intra_op_num_threads = self.intra_op_threads
+        if self.inter_op_threads:
+            options.inter_op_num_threads = self.inter_op_threads
+        return options
+
+    def session(self, repo_id: str, revision: Optional[str], repo_path: str):
+        key = (repo_id, snapshot_id(repo_path, revision))
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                return session
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            # Another request may have built the session while we waited
+            with self._lock:
+                session = self._sessions.get(key)
+                if session is not None:
+                    return session
+            try:
+                session = self._create_session(repo_id, revision, repo_path)
+                with self._lock:
+                    self._sessions[key] = session
+            finally:
+                with self._lock:
+                    self._load_locks.pop(key, None)
+            return session
+
+    def _create_session(self, repo_id: str, revision: Optional[str], repo_path: str):
+        graph_path = self.ensure_graph(repo_id, revision, repo_path)
+        graph_dir = os.path.dirname(graph_path)
+        optimized = os.path.join(graph_dir, 'model.opt.onnx')
+        if os.path.exists(optimized):
+            options = self._session_options('')
+            return ort.InferenceSession(optimized, sess_options=options, providers=['CPUExecutionProvider'])
+
+        # ORT writes the optimized graph while building the session; publish it atomically
+        fd, tmp_path = tempfile.mkstemp(suffix='.opt.onnx', dir=graph_dir)
+        os.close(fd)
+        try:
+            options = self._session_options(tmp_path)
+            session = ort.InferenceSession(graph_path, sess_options=options, providers=['CPUExecutionProvider'])
+            if os.path.getsize(tmp_path):
+                os.replace(tmp_path, optimized)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return session
+
+    def run(self, repo_id: str, revision: Optional[str], repo_path: str, waveform: np.ndarray) -> np.ndarray:
+        session = self.session(repo_id, revision, repo_path)
+        batch, squeeze = _as_batch(waveform)
+        input_name = session.get_inputs()[0].name
+        output = session.run(None, {input_name: batch})[0].astype(np.float32, copy=False)
+        return output[0] if squeeze else output
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'sessions': len(self._sessions), 'exports': self.exports}
@@ -0,0 +1,170 @@
+# Dynamic Micro-Batching
+# Coalesces concurrent conversion requests for the same (model, backend) key
+# into one padded batched forward pass.
+#
+# The first request for an idle key becomes the batch leader: it waits up to
+# BATCH_WINDOW_MS (or until BATCH_MAX_SIZE requests are queued), runs the batch
+# on its own thread, hands results back to the waiting requests and passes
+# leadership to whatever arrived in the meantime. No background threads.
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Hashable, List
+
+import numpy as np
+
+# Upper bounds (ms) for the queue-delay histogram; the last bucket is +Inf
+DELAY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def pad_and_run(run_fn: Callable[[np.ndarray], np.ndarray], waveforms: List[np.ndarray]) -> List[np.ndarray]:
+    """Zero-pad 1-D waveforms into [batch, samples], run once, trim each output"""
+    lengths = [len(w) for w in waveforms]
+    longest = max(lengths)
+    batch = np.zeros((len(waveforms), longest), dtype=np.float32)
+    for i, w in enumerate(waveforms):
+        batch[i, :len(w)] = w
+
+    output = np.asarray(run_fn(batch))
+    if output.ndim == 1:
+        output = output[np.newaxis, :]
+    # Output may be at a different rate than the input; trim proportionally
+    ratio = output.shape[-1] / float(longest)
+    return [output[i, :int(round(n * ratio))] for i, n in enumerate(lengths)]
+
+
+class _Pending:
+    __slots__ = ('waveform', 'enqueued_at', 'event', 'result', 'error', 'lead')
+
+    def __init__(self, waveform):
+        self.waveform = waveform
+        self.enqueued_at = time.perf_counter()
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.lead = False
+
+
+class MicroBatcher:
+    """Groups requests per key within a short window and runs them together"""
+
+    def __init__(self, window_ms: float = 10.0, max_batch: int = 8):
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._queues = {}
+        self._leaders = set()
+        self._cond = threading.Condition()
+        self._batch_sizes = {}
+        self._delay_counts = [0] * (len(DELAY_BUCKETS_MS) + 1)
+        self._delay_sum_ms = 0.0
+        self._requests = 0
+        self._batches = 0
+
+    @classmethod
+    def from_env(cls):
+        try:
+            window_ms = float(os.getenv('BATCH_WINDOW_MS', '10'))
+        except ValueError:
+            window_ms = 10.0
+        try:
+            max_batch = int(os.getenv('BATCH_MAX_SIZE', '8'))
+        except ValueError:
+            max_batch = 8
+        return cls(window_ms, max_batch)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_batch > 1 and self.window > 0
+
+    def submit(self, key: Hashable, waveform: np.ndarray, run_fn: Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+        """Queue a 1-D waveform under key and block until its output is ready"""
+        if not self.enabled:
+            self._record(1, [0.0])
+            return pad_and_run(run_fn, [np.asarray(waveform, dtype=np.float32)])[0]
+
+        pending = _Pending(np.asarray(waveform, dtype=np.float32))
+        with self._cond:
+            queue = self._queues.setdefault(key, deque())
+            queue.append(pending)
+            if key not in self._leaders:
+                self._leaders.add(key)
+                pending.lead = True
+            elif len(queue) >= self.max_batch:
+                self._cond.notify_all()
+
+        while not pending.lead:
+            pending.event.wait()
+            if pending.result is not None or pending.error is not None:
+                break
+            pending.event.clear()
+
+        if pending.lead:
+            self._lead(key, pending, run_fn)
+
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _lead(self, key, leader: _Pending, run_fn):
+        with self._cond:
+            queue = self._queues[key]
+            deadline = leader.enqueued_at + self.window
+            while len(queue) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            # The leader is always the oldest entry, so it is part of this batch
+            batch = [queue.popleft() for _ in range(min(self.max_batch, len(queue)))]
+            if queue:
+                successor = queue[0]
+                successor.lead = True
+                successor.event.set()
+            else:
+                self._leaders.discard(key)
+                del self._queues[key]
+
+        started = time.perf_counter()
+        try:
+            outputs = pad_and_run(run_fn, [p.waveform for p in batch])
+            for p, out in zip(batch, outputs):
+                p.result = out
+        except Exception as e:
+            for p in batch:
+                p.error = e
+        finally:
+            self._record(len(batch), [(started - p.enqueued_at) * 1000.0 for p in batch])
+            for p in batch:
+                if p is not leader:
+                    p.event.set()
+
+    def _record(self, batch_size: int, delays_ms: List[float]):
+        with self._cond:
+            self._batches += 1
+            self._requests += batch_size
+            self._batch_sizes[batch_size] = self._batch_sizes.get(batch_size, 0) + 1
+            for delay in delays_ms:
+                self._delay_sum_ms += delay
+                for i, bound in enumerate(DELAY_BUCKETS_MS):
+                    if delay <= bound:
+                        self._delay_counts[i] += 1
+                        break
+                else:
+                    self._delay_counts[-1] += 1
+
+    def stats(self) -> dict:
+        with self._cond:
+            labels = [f"le_{b}ms" for b in DELAY_BUCKETS_MS] + ['le_inf']
+            return {
+                'enabled': self.enabled,
+                'window_ms': self.window * 1000.0,
+                'max_batch': self.max_batch,
+                'requests': self._requests,
+                'batches': self._batches,
+                'mean_batch_size': self._requests / self._batches if self._batches else 0.0,
+                'batch_size_histogram': {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                'queue_delay_ms_histogram': dict(zip(labels, self._delay_counts)),
+                'mean_queue_delay_ms': self._delay_sum_ms / self._requests if self._requests else 0.0,
+            }
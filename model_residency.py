@@ -0,0 +1,334 @@
+# Model Residency Manager
+# Keeps per-voice weights memory-mapped under a RAM budget so hot voices stay loaded.
+#
+# Weights are opened with mmap so the page cache is shared between worker
+# processes serving the same files. When the resident size exceeds the budget,
+# unpinned entries are evicted with an LRU or LFU policy.
+
+import os
+import mmap
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    import torch
+    TORCH_AVAILABLE = True
+except ImportError:
+    TORCH_AVAILABLE = False
+
+try:
+    import soundfile as sf
+    SOUNDFILE_AVAILABLE = True
+except ImportError:
+    SOUNDFILE_AVAILABLE = False
+
+EVICTION_POLICIES = ('lru', 'lfu')
+
+# WAVE format tags we can map directly (PCM integer and IEEE float)
+_WAVE_FORMAT_PCM = 0x0001
+_WAVE_FORMAT_IEEE_FLOAT = 0x0003
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class WavPayload:
+    """Reference audio backed by a memory-mapped WAV data chunk"""
+
+    def __init__(self, frames, sample_rate: int, scale: float = 1.0):
+        self.frames = frames  # [samples] or [samples, channels]
+        self.sample_rate = sample_rate
+        self.scale = scale
+
+    def as_float(self):
+        """Return samples as float32 in [-1, 1], shaped like soundfile output"""
+        data = np.asarray(self.frames, dtype=np.float32)
+        if self.scale != 1.0:
+            data = data * np.float32(self.scale)
+        return data
+
+
+class ResidentModel:
+    """A loaded voice model plus the bookkeeping used for eviction"""
+
+    def __init__(self, model_id: str, path: str, payload, nbytes: int, signature=None):
+        self.model_id = model_id
+        self.path = path
+        self.signature = signature if signature is not None else _file_signature(path)
+        self.payload = payload
+        self.nbytes = nbytes
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.hits = 0
+        self.pinned = False
+
+    def audio(self):
+        """Return (float32 samples, sample_rate) for reference-audio models"""
+        if isinstance(self.payload, WavPayload):
+            return self.payload.as_float(), self.payload.sample_rate
+        if SOUNDFILE_AVAILABLE:
+            data, sr = sf.read(self.path, dtype='float32')
+            return data, sr
+        raise ValueError(f"Model {self.model_id} is not an audio reference")
+
+    def describe(self) -> dict:
+        return {
+            'id': self.model_id,
+            'bytes': self.nbytes,
+            'pinned': self.pinned,
+            'hits': self.hits,
+            'loaded_at': self.loaded_at,
+            'last_used': self.last_used,
+        }
+
+
+def _file_signature(path: str):
+    """Identity of the file currently at path; changes when it is replaced or rewritten"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return (path, None, None)
+    return (path, st.st_ino, st.st_mtime_ns)
+
+
+def _map_file(path: str) -> mmap.mmap:
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _mmap_wav(path: str) -> Optional[WavPayload]:
+    """Map the data chunk of a PCM/float WAV file without decoding it"""
+    with open(path, 'rb') as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+            return None
+
+        fmt = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                return None
+            chunk_id, chunk_size = struct.unpack('<4sI', chunk)
+            if chunk_id == b'fmt ':
+                raw = f.read(chunk_size)
+                tag, channels, sample_rate, _, _, bits = struct.unpack('<HHIIHH', raw[:16])
+                if tag == _WAVE_FORMAT_EXTENSIBLE and len(raw) >= 26:
+                    tag = struct.unpack('<H', raw[24:26])[0]
+                fmt = (tag, channels, sample_rate, bits)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    return None
+                offset = f.tell()
+                break
+            else:
+                f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+    tag, channels, sample_rate, bits = fmt
+    if tag == _WAVE_FORMAT_PCM and bits == 16:
+        dtype, scale = np.dtype('<i2'), 1.0 / 32768.0
+    elif tag == _WAVE_FORMAT_PCM and bits == 32:
+        dtype, scale = np.dtype('<i4'), 1.0 / 2147483648.0
+    elif tag == _WAVE_FORMAT_IEEE_FLOAT and bits == 32:
+        dtype, scale = np.dtype('<f4'), 1.0
+    elif tag == _WAVE_FORMAT_IEEE_FLOAT and bits == 64:
+        dtype, scale = np.dtype('<f8'), 1.0
+    else:
+        return None
+
+    frame_bytes = dtype.itemsize * channels
+    available = os.path.getsize(path) - offset
+    n_frames = min(chunk_size, available) // frame_bytes
+    if n_frames <= 0:
+        return None
+    shape = (n_frames, channels) if channels > 1 else (n_frames,)
+    frames = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+    return WavPayload(frames, sample_rate, scale)
+
+
+def load_weights_mmap(path: str):
+    """Load weights for a voice with memory mapping where the format allows"""
+    ext = os.path.splitext(path)[1].lower()
+
+    if ext == '.wav' and NUMPY_AVAILABLE:
+        payload = _mmap_wav(path)
+        if payload is not None:
+            return payload
+
+    if ext in ('.pth', '.pt') and TORCH_AVAILABLE:
+        try:
+            return torch.load(path, map_location='cpu', mmap=True, weights_only=True)
+        except Exception:
+            # Legacy (non-zip) checkpoints and mock files cannot be mmapped by torch
+            pass
+
+    return _map_file(path)
+
+
+def _prefetch_pages(path: str):
+    """Ask the kernel to read a file into the page cache ahead of first use"""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+class ResidencyManager:
+    """Tracks which voice models are resident and evicts under a byte budget"""
+
+    def __init__(self, budget_bytes: int, policy: str = 'lru', loader=load_weights_mmap):
+        policy = (policy or 'lru').lower()
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.budget_bytes = budget_bytes
+        self.policy = policy
+        self.loader = loader
+        self._entries = OrderedDict()
+        self._pinned = set()
+        self._lock = threading.RLock()
+        self._load_locks = {}
+        self.loads = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls):
+        """Build a manager from MODEL_RAM_BUDGET_MB / MODEL_EVICTION_POLICY"""
+        try:
+            budget_mb = int(os.getenv('MODEL_RAM_BUDGET_MB', '2048'))
+        except ValueError:
+            budget_mb = 2048
+        return cls(budget_mb * 1024 * 1024, os.getenv('MODEL_EVICTION_POLICY', 'lru'))
+
+    @property
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(entry.nbytes for entry in self._entries.values())
+
+    def is_resident(self, model_id: str) -> bool:
+        with self._lock:
+            return model_id in self._entries
+
+    def get(self, model_id: str, path: str) -> ResidentModel:
+        """Return the resident model, loading it (and evicting others) if needed"""
+        with self._lock:
+            entry = self._touch(model_id, path)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            self.misses += 1
+            load_lock = self._load_locks.setdefault(model_id, threading.Lock())
+
+        with load_lock:
+            # Another request may have finished loading while we waited
+            with self._lock:
+                entry = self._touch(model_id, path)
+                if entry is not None:
+                    return entry
+
+            try:
+                signature = _file_signature(path)
+                payload = self.loader(path)
+                entry = ResidentModel(model_id, path, payload, os.path.getsize(path), signature)
+
+                with self._lock:
+                    entry.pinned = model_id in self._pinned
+                    entry.hits = 1
+                    self._entries[model_id] = entry
+                    self.loads += 1
+                    self._enforce_budget(keep=model_id)
+            finally:
+                # Drop the lock even when the load fails, so failed ids don't pile up
+                with self._lock:
+                    self._load_locks.pop(model_id, None)
+            return entry
+
+    def warm(self, model_id: str, path: str) -> ResidentModel:
+        """Load a model ahead of use and prefetch its pages"""
+        _prefetch_pages(path)
+        return self.get(model_id, path)
+
+    def pin(self, model_id: str, path: str) -> ResidentModel:
+        """Load a model and exempt it from eviction until unpinned"""
+        with self._lock:
+            self._pinned.add(model_id)
+        entry = self.get(model_id, path)
+        with self._lock:
+            entry.pinned = True
+        return entry
+
+    def unpin(self, model_id: str) -> bool:
+        with self._lock:
+            was_pinned = model_id in self._pinned
+            self._pinned.discard(model_id)
+            entry = self._entries.get(model_id)
+            if entry is not None:
+                entry.pinned = False
+            self._enforce_budget()
+            return was_pinned
+
+    def evict(self, model_id: str) -> bool:
+        """Drop a model from residency (e.g. when the voice is deleted)"""
+        with self._lock:
+            self._pinned.discard(model_id)
+            return self._entries.pop(model_id, None) is not None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'policy': self.policy,
+                'budget_bytes': self.budget_bytes,
+                'resident_bytes': sum(e.nbytes for e in self._entries.values()),
+                'resident': len(self._entries),
+                'pinned': len(self._pinned),
+                'loads': self.loads,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _touch(self, model_id: str, path: str) -> Optional[ResidentModel]:
+        entry = self._entries.get(model_id)
+        if entry is None:
+            return None
+        if entry.signature != _file_signature(path):
+            # Weights were moved or rewritten (e.g. voice retrained); reload the new file
+            del self._entries[model_id]
+            return None
+        entry.last_used = time.time()
+        entry.hits += 1
+        self._entries.move_to_end(model_id)
+        return entry
+
+    def _pick_victim(self, keep: Optional[str]) -> Optional[str]:
+        candidates = [e for mid, e in self._entries.items() if not e.pinned and mid != keep]
+        if not candidates:
+            return None
+        if self.policy == 'lfu':
+            return min(candidates, key=lambda e: (e.hits, e.last_used)).model_id
+        # OrderedDict keeps least recently used first
+        return candidates[0].model_id
+
+    def _enforce_budget(self, keep: Optional[str] = None):
+        total = sum(e.nbytes for e in self._entries.values())
+        while total > self.budget_bytes:
+            victim = self._pick_victim(keep)
+            if victim is None:
+                # Everything left is pinned or just loaded; allow going over budget
+                break
+            total -= self._entries.pop(victim).nbytes
+            self.evictions += 1
+            print(f"♻️  Evicted model from memory: {victim}")
@@ -0,0 +1,260 @@
+# Preprocessing Process Pool
+# Decode and resample audio in worker processes so the GIL-heavy parts of
+# train/convert never stall the request threads of the service process.
+#
+# Workers decode (soundfile, falling back to librosa), optionally downmix and
+# resample, then place the samples in a multiprocessing.shared_memory block.
+# Only the block name, shape and dtype cross the process boundary; the caller
+# maps the block as a NumPy array without copying and unlinks it on release.
+# The array holds a buffer export of the mapping, so release() cannot unmap
+# memory that views (or torch.from_numpy tensors) still point at: such blocks
+# are unlinked at once and closed by a later release() after the views die.
+#
+# Workers are plain `python preprocess_pool.py --worker` processes speaking
+# JSON lines over stdin/stdout. multiprocessing's spawn/forkserver would
+# re-import the service's main module (and build a second service) in every
+# worker, and forking the threaded server process is unsafe.
+#
+# Env: PREPROCESS_WORKERS (default: min(4, CPU count); 0 runs inline)
+
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Optional
+
+import numpy as np
+
+
+def _create_block(nbytes: int) -> shared_memory.SharedMemory:
+    """Shared block whose lifetime the receiving process owns"""
+    try:
+        return shared_memory.SharedMemory(create=True, size=max(1, nbytes), track=False)
+    except TypeError:
+        # Python < 3.13: stop this worker's resource tracker from unlinking it at exit
+        from multiprocessing import resource_tracker
+        block = shared_memory.SharedMemory(create=True, size=max(1, nbytes))
+        resource_tracker.unregister(block._name, 'shared_memory')
+        return block
+
+
+def _attach_block(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 registers the block here; unlink() in release() unregisters it
+        return shared_memory.SharedMemory(name=name)
+
+
+# Blocks released while views of them were alive; closed once those are gone
+_deferred = []
+_deferred_lock = threading.Lock()
+
+
+def _try_close(block: shared_memory.SharedMemory) -> bool:
+    try:
+        block.close()
+        return True
+    except BufferError:
+        return False
+
+
+def _close_deferred():
+    with _deferred_lock:
+        _deferred[:] = [block for block in _deferred if not _try_close(block)]
+
+
+def decode_audio(path: str, target_sr: Optional[int] = None, mono: bool = False):
+    """Decode to float32: [frames] when mono/single-channel, else [channels, frames] (librosa layout)"""
+    import soundfile as sf
+    from resampling import resample
+
+    try:
+        data, sr = sf.read(path, dtype='float32', always_2d=True)
+        data = data.T  # [channels, frames]
+    except Exception:
+        import librosa
+        data, sr = librosa.load(path, sr=None, mono=False)
+        data = np.atleast_2d(data).astype(np.float32)
+    if mono or data.shape[0] == 1:
+        data = data.mean(axis=0)
+    if target_sr and target_sr != sr:
+        data = resample(data, sr, target_sr, axis=-1)
+        sr = target_sr
+    return np.ascontiguousarray(data, dtype=np.float32), sr
+
+
+def _decode_job(path: str, target_sr: Optional[int], mono: bool) -> dict:
+    start = time.perf_counter()
+    data, sr = decode_audio(path, target_sr, mono)
+    block = _create_block(data.nbytes)
+    np.ndarray(data.shape, dtype=data.dtype, buffer=block.buf)[...] = data
+    block.close()
+    return {'name': block.name, 'shape': list(data.shape), 'dtype': data.dtype.str, 'sample_rate': sr,
+            'nbytes': data.nbytes, 'work_s': time.perf_counter() - start}
+
+
+def _worker_loop():
+    """Serve decode jobs from stdin until it closes"""
+    import soundfile  # noqa: F401 - import up front so the first job isn't charged for it
+    import resampling  # noqa: F401
+    for line in sys.stdin:
+        job = json.loads(line)
+        try:
+            reply = {'ok': True, **_decode_job(job['path'], job.get('target_sr'), job.get('mono', False))}
+        except Exception as e:
+            reply = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+        sys.stdout.write(json.dumps(reply) + '\n')
+        sys.stdout.flush()
+
+
+class SharedAudio:
+    """Decoded samples living in a shared memory block; release() (or `with`) frees it"""
+
+    def __init__(self, array: np.ndarray, sample_rate: int, block: Optional[shared_memory.SharedMemory] = None):
+        self.array = array
+        self.sample_rate = sample_rate
+        self._block = block
+
+    def release(self):
+        if self._block is not None:
+            self.array = None
+            block, self._block = self._block, None
+            _close_deferred()
+            if not _try_close(block):
+                # Something still references the samples; keep them mapped until it lets go
+                with _deferred_lock:
+                    _deferred.append(block)
+            block.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class _Worker:
+    def __init__(self):
+        self.proc = subprocess.Popen(
+            [sys.executable, '-u', os.path.abspath(__file__), '--worker'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+
+    def call(self, job: dict) -> dict:
+        self.proc.stdin.write(json.dumps(job) + '\n')
+        self.proc.stdin.flush()
+        line = self.proc.stdout.readline()
+        if not line:
+            raise RuntimeError(f"preprocess worker {self.proc.pid} exited")
+        return json.loads(line)
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def stop(self):
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=5)
+        except Exception:
+            self.proc.kill()
+
+
+class PreprocessPool:
+    """Process pool for decode/resample with shared-memory results and usage stats"""
+
+    def __init__(self, workers: int):
+        self.workers = max(0, int(workers))
+        self._idle = queue.Queue()
+        for _ in range(self.workers):
+            self._idle.put(_Worker())
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._busy_s = 0.0
+        self._ipc_s = 0.0
+        self._wait_s = 0.0
+        self._bytes = 0
+
+    @classmethod
+    def from_env(cls) -> 'PreprocessPool':
+        default = min(4, os.cpu_count() or 1)
+        try:
+            workers = int(os.getenv('PREPROCESS_WORKERS', str(default)))
+        except ValueError:
+            workers = default
+        return cls(workers)
+
+    def decode(self, path: str, target_sr: Optional[int] = None, mono: bool = False) -> SharedAudio:
+        """Decode (and optionally resample/downmix) off-process; blocks only the calling thread"""
+        if not self.workers:
+            data, sr = decode_audio(path, target_sr, mono)
+            return SharedAudio(data, sr)
+
+        start = time.perf_counter()
+        with self._lock:
+            self._in_flight += 1
+        worker = self._idle.get()
+        acquired = time.perf_counter()
+        try:
+            reply = worker.call({'path': os.path.abspath(path), 'target_sr': target_sr, 'mono': mono})
+        except Exception:
+            worker.stop()
+            worker = _Worker()
+            with self._lock:
+                self._failed += 1
+            raise
+        finally:
+            self._idle.put(worker)
+            with self._lock:
+                self._in_flight -= 1
+
+        if not reply['ok']:
+            with self._lock:
+                self._failed += 1
+            raise RuntimeError(reply['error'])
+        block = _attach_block(reply['name'])
+        shape = tuple(reply['shape'])
+        # frombuffer keeps block.buf exported for as long as any view of the array lives
+        array = np.frombuffer(block.buf, dtype=np.dtype(reply['dtype']), count=int(np.prod(shape))).reshape(shape)
+        done = time.perf_counter()
+        with self._lock:
+            self._completed += 1
+            self._busy_s += reply['work_s']
+            self._wait_s += acquired - start
+            # Round trip minus worker compute: pipe messages, shm create/attach, wakeups
+            self._ipc_s += max(0.0, done - acquired - reply['work_s'])
+            self._bytes += reply['nbytes']
+        return SharedAudio(array, reply['sample_rate'], block)
+
+    def stats(self) -> dict:
+        with self._lock:
+            uptime = max(1e-9, time.time() - self._started)
+            done = max(1, self._completed)
+            return {
+                'workers': self.workers,
+                'in_flight': self._in_flight,
+                'queued': max(0, self._in_flight - self.workers) if self.workers else 0,
+                'completed': self._completed,
+                'failed': self._failed,
+                'utilization': self._busy_s / (uptime * self.workers) if self.workers else None,
+                'avg_work_ms': self._busy_s / done * 1000.0,
+                'avg_queue_wait_ms': self._wait_s / done * 1000.0,
+                'avg_ipc_ms': self._ipc_s / done * 1000.0,
+                'shared_mb': self._bytes / (1024 * 1024),
+            }
+
+    def shutdown(self):
+        while not self._idle.empty():
+            self._idle.get_nowait().stop()
+
+
+if __name__ == '__main__' and '--worker' in sys.argv:
+    _worker_loop()
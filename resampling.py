@@ -0,0 +1,121 @@
+# Polyphase Resampling Engine
+# Shared by the voice services and the dataset prep notebook.
+#
+# Anti-aliasing kernels are designed once per (src, dst) rate pair and cached,
+# then applied with scipy's polyphase upfirdn. Multi-channel and batched arrays
+# are resampled along one axis in a single vectorized call, and
+# StreamingResampler produces the same output block by block for long audio.
+
+import math
+from functools import lru_cache
+
+import numpy as np
+from scipy import signal
+
+# Kaiser window beta and filter half-length factor, matching scipy.signal.resample_poly
+KAISER_BETA = 5.0
+HALF_LEN_FACTOR = 10
+
+
+class PolyphaseKernel:
+    """Cached filter plus the alignment constants for one rate pair"""
+
+    def __init__(self, src_sr: int, dst_sr: int):
+        g = math.gcd(int(src_sr), int(dst_sr))
+        self.src_sr = int(src_sr)
+        self.dst_sr = int(dst_sr)
+        self.up = self.dst_sr // g
+        self.down = self.src_sr // g
+
+        max_rate = max(self.up, self.down)
+        half_len = HALF_LEN_FACTOR * max_rate
+        h = signal.firwin(2 * half_len + 1, 1.0 / max_rate, window=('kaiser', KAISER_BETA))
+        h = h * self.up
+
+        # Pre-pad so the filter's group delay lands on a whole output sample
+        n_pre_pad = self.down - half_len % self.down
+        self.pre_remove = (half_len + n_pre_pad) // self.down
+        self.h = np.concatenate([np.zeros(n_pre_pad), h]).astype(np.float64)
+        self.h.setflags(write=False)
+        # Trailing input zeros needed to flush the filter tail
+        self.tail = len(self.h) // self.up + 1
+
+    def output_length(self, n_in: int) -> int:
+        return int(math.ceil(n_in * self.up / self.down))
+
+
+@lru_cache(maxsize=64)
+def get_kernel(src_sr: int, dst_sr: int) -> PolyphaseKernel:
+    return PolyphaseKernel(src_sr, dst_sr)
+
+
+def _pad_axis(x: np.ndarray, n: int, axis: int) -> np.ndarray:
+    widths = [(0, 0)] * x.ndim
+    widths[axis] = (0, n)
+    return np.pad(x, widths)
+
+
+def resample(x, src_sr: int, dst_sr: int, axis: int = -1) -> np.ndarray:
+    """Resample an array of any rank along axis in one vectorized call"""
+    x = np.asarray(x, dtype=np.float32)
+    if int(src_sr) == int(dst_sr):
+        return x
+    kernel = get_kernel(int(src_sr), int(dst_sr))
+    axis = axis % x.ndim
+    n_out = kernel.output_length(x.shape[axis])
+    y = signal.upfirdn(kernel.h, _pad_axis(x, kernel.tail, axis), kernel.up, kernel.down, axis=axis)
+    index = [slice(None)] * y.ndim
+    index[axis] = slice(kernel.pre_remove, kernel.pre_remove + n_out)
+    return y[tuple(index)].astype(np.float32, copy=False)
+
+
+class StreamingResampler:
+    """Block-wise resampling with output identical to resample() on the whole signal
+
+    Blocks are arrays with time on axis 0 (the soundfile layout: [frames] or
+    [frames, channels]). Call process() per block and flush() once at the end.
+    """
+
+    def __init__(self, src_sr: int, dst_sr: int):
+        self.passthrough = int(src_sr) == int(dst_sr)
+        self.kernel = None if self.passthrough else get_kernel(int(src_sr), int(dst_sr))
+        self._buffer = None
+        self._buffer_start = 0  # absolute input index of _buffer[0]; kept a multiple of down
+        self._received = 0
+        self._next_out = 0
+
+    def process(self, block) -> np.ndarray:
+        block = np.asarray(block, dtype=np.float32)
+        if self.passthrough:
+            return block
+        self._buffer = block if self._buffer is None else np.concatenate([self._buffer, block], axis=0)
+        self._received += block.shape[0]
+
+        k = self.kernel
+        # Output n needs inputs up to floor((n + pre_remove) * down / up)
+        ready = int(math.ceil(self._received * k.up / k.down)) - k.pre_remove
+        return self._emit(ready, flush=False)
+
+    def flush(self) -> np.ndarray:
+        if self.passthrough or self._buffer is None:
+            return np.zeros((0,), dtype=np.float32)
+        return self._emit(self.kernel.output_length(self._received), flush=True)
+
+    def _emit(self, end: int, flush: bool) -> np.ndarray:
+        k = self.kernel
+        if end <= self._next_out:
+            return np.zeros((0,) + self._buffer.shape[1:], dtype=np.float32)
+
+        buffer = _pad_axis(self._buffer, k.tail, 0) if flush else self._buffer
+        y = signal.upfirdn(k.h, buffer, k.up, k.down, axis=0)
+        offset = self._buffer_start * k.up // k.down
+        out = y[self._next_out + k.pre_remove - offset:end + k.pre_remove - offset]
+        self._next_out = end
+
+        # Drop input no later output can reach, keeping the start aligned to down
+        first_needed = ((self._next_out + k.pre_remove) * k.down - len(k.h) + 1) // k.up
+        new_start = max(first_needed, 0) // k.down * k.down
+        if new_start > self._buffer_start:
+            self._buffer = self._buffer[new_start - self._buffer_start:]
+            self._buffer_start = new_start
+        return out.astype(np.float32, copy=False)
@@ -20,6 +20,10 @@ const router = express.Router();
 
 // RVC Service Configuration
 const RVC_SERVICE_URL = process.env.RVC_SERVICE_URL || 'http://localhost:5000';
+// Optional Unix socket (RVC_UNIX_SOCKET on the Python side) for co-located deployments;
+// conversions then use the raw-body /convert/raw protocol instead of multipart over TCP
+const RVC_SOCKET_PATH = process.env.RVC_SOCKET_PATH || null;
+const RVC_RAW_TRANSPORT = Boolean(RVC_SOCKET_PATH) || process.env.RVC_RAW_TRANSPORT === '1';
 
 // Configure GridFS storage for voice audio files (fallback to disk if not available)
 let storage;
@@ -76,6 +80,15 @@ const upload = multer({
   }
 });
 
+// Conversion inputs go straight on to the RVC service, so they are kept in memory
+const convertUpload = multer({
+  storage: multer.memoryStorage(),
+  fileFilter: fileFilter,
+  limits: {
+    fileSize: 50 * 1024 * 1024 // 50MB max
+  }
+});
+
 // @desc    Upload a custom voice sample
 // @route   POST /api/custom-voices/upload
 // @access  Private
@@ -410,6 +423,113 @@ router.post('/:id/test', protect, async (req, res) => {
   }
 });
 
+// @desc    Convert an audio clip into a custom voice
+// @route   POST /api/custom-voices/:id/convert
+// @access  Private
+router.post('/:id/convert', protect, convertUpload.single('audio'), async (req, res) => {
+  try {
+    if (!req.file) {
+      return res.status(400).json({
+        success: false,
+        message: 'No audio file uploaded'
+      });
+    }
+
+    const voice = await CustomVoice.findOne({
+      _id: req.params.id,
+      user: req.user._id
+    });
+
+    if (!voice) {
+      return res.status(404).json({
+        success: false,
+        message: 'Voice not found'
+      });
+    }
+
+    if (voice.status !== 'ready') {
+      return res.status(400).json({
+        success: false,
+        message: 'Voice is not ready yet. Please wait for processing to complete.'
+      });
+    }
+
+    // Multipart over TCP, or raw body (/convert/raw) when RVC_SOCKET_PATH / RVC_RAW_TRANSPORT is set
+    const audio = await convertAudioWithRVC(voice._id.toString(), req.file.buffer, {
+      priority: req.body.priority === 'interactive' ? 'interactive' : 'batch'
+    });
+
+    res.set('Content-Type', 'audio/wav');
+    audio.on('error', (error) => {
+      // Headers are already sent, so the only way to signal failure is to cut the response
+      console.error('Error streaming converted audio:', error.message);
+      res.destroy(error);
+    });
+    audio.pipe(res);
+
+  } catch (error) {
+    console.error('Error converting audio:', error);
+    await sendRVCError(res, error, 'Failed to convert audio');
+  }
+});
+
+// @desc    Render a multi-speaker script with the user's custom voices
+// @route   POST /api/custom-voices/render
+// @access  Private
+router.post('/render', protect, async (req, res) => {
+  try {
+    const { turns, gap_ms, format, stream } = req.body;
+
+    if (!Array.isArray(turns) || turns.length === 0) {
+      return res.status(400).json({
+        success: false,
+        message: 'turns must be a non-empty list of { voiceId, text }'
+      });
+    }
+
+    if (turns.some(turn => !turn || !turn.text || !mongoose.Types.ObjectId.isValid(String(turn.voiceId)))) {
+      return res.status(400).json({
+        success: false,
+        message: 'Every turn needs a valid voiceId and text'
+      });
+    }
+
+    const voiceIds = [...new Set(turns.map(turn => String(turn.voiceId)))];
+    const voices = await CustomVoice.find({
+      _id: { $in: voiceIds },
+      user: req.user._id,
+      status: 'ready'
+    }).select('_id');
+
+    if (voices.length !== voiceIds.length) {
+      return res.status(404).json({
+        success: false,
+        message: 'One or more voices were not found or are not ready'
+      });
+    }
+
+    const script = {
+      turns: turns.map(turn => ({ voice_id: String(turn.voiceId), text: turn.text })),
+      gap_ms,
+      format
+    };
+    const result = await renderScriptWithRVC(script, {}, { stream: Boolean(stream) });
+
+    res.set('Content-Type', result.contentType || 'audio/wav');
+    if (result.renderId) res.set('X-Render-Id', result.renderId);
+    if (result.timing) res.set('X-Render-Timing', JSON.stringify(result.timing));
+    result.audio.on('error', (error) => {
+      console.error('Error streaming rendered script:', error.message);
+      res.destroy(error);
+    });
+    result.audio.pipe(res);
+
+  } catch (error) {
+    console.error('Error rendering script:', error);
+    await sendRVCError(res, error, 'Failed to render script');
+  }
+});
+
 // Helper function to train RVC model
 async function trainRVCModel(voiceId, audioFileId, voiceName) {
   try {
@@ -440,7 +560,9 @@ async function trainRVCModel(voiceId, audioFileId, voiceName) {
     // Send to RVC service for training
     const response = await axios.post(`${RVC_SERVICE_URL}/train`, formData, {
       headers: {
-        ...formData.getHeaders()
+        ...formData.getHeaders(),
+        // Lets a sharded service route the upload without reading its body
+        'X-Voice-Id': encodeURIComponent(voiceId)
       },
       timeout: 30 * 60 * 1000 // 30 minutes timeout for training
     });
@@ -467,11 +589,44 @@ async function trainRVCModel(voiceId, audioFileId, voiceName) {
   }
 }
 
+// Helper function to answer with the RVC service's own rejection (e.g. 429 + Retry-After
+// when its queue is full, 503 when a backend is missing) instead of a blanket 500
+async function sendRVCError(res, error, message) {
+  const upstream = error.response;
+  if (!upstream) {
+    return res.status(500).json({ success: false, message, error: error.message });
+  }
+
+  // Stream responses carry the JSON error body as a stream; read a bounded amount of it
+  let detail = error.message;
+  try {
+    let body = '';
+    for await (const chunk of upstream.data) {
+      body += chunk;
+      if (body.length > 64 * 1024) break;
+    }
+    detail = JSON.parse(body).error || detail;
+  } catch (parseError) {
+    // Not JSON; keep axios' message
+  }
+
+  const retryAfter = upstream.headers && upstream.headers['retry-after'];
+  if (retryAfter) res.set('Retry-After', retryAfter);
+  res.status(upstream.status >= 400 ? upstream.status : 502).json({ success: false, message, error: detail });
+}
+
 // Helper function to convert audio using RVC
-async function convertAudioWithRVC(modelId, inputAudioStream) {
+// options.priority: 'interactive' (previews) or 'batch' (full renders, default)
+async function convertAudioWithRVC(modelId, inputAudioStream, options = {}) {
   try {
     console.log(`🔄 Converting audio with RVC model: ${modelId}`);
     
+    const timeout = options.timeout || 5 * 60 * 1000; // 5 minutes timeout
+    
+    if (RVC_RAW_TRANSPORT) {
+      return await convertAudioWithRVCRaw(modelId, inputAudioStream, options, timeout);
+    }
+    
     // Prepare form data
     const formData = new FormData();
     formData.append('audio', inputAudioStream, {
@@ -483,10 +638,14 @@ async function convertAudioWithRVC(modelId, inputAudioStream) {
     // Send to RVC service for conversion
     const response = await axios.post(`${RVC_SERVICE_URL}/convert`, formData, {
       headers: {
-        ...formData.getHeaders()
+        ...formData.getHeaders(),
+        'X-Voice-Id': encodeURIComponent(modelId),
+        // Lets the service drop work we will no longer wait for
+        'X-Request-Deadline': String(Date.now() + timeout),
+        'X-Priority': options.priority || 'batch'
       },
       responseType: 'stream',
-      timeout: 5 * 60 * 1000 // 5 minutes timeout
+      timeout
     });
     
     return response.data;
@@ -497,5 +656,75 @@ async function convertAudioWithRVC(modelId, inputAudioStream) {
   }
 }
 
+// Raw-body variant: audio is the request body, parameters go in headers
+async function convertAudioWithRVCRaw(modelId, inputAudioStream, options, timeout) {
+  const headers = {
+    'Content-Type': 'application/octet-stream',
+    'X-Model-Id': encodeURIComponent(modelId),
+    'X-Request-Deadline': String(Date.now() + timeout),
+    'X-Priority': options.priority || 'batch'
+  };
+  if (options.backend) headers['X-Backend'] = encodeURIComponent(options.backend);
+  if (options.text) headers['X-Text'] = encodeURIComponent(options.text);
+
+  const response = await axios.post(
+    RVC_SOCKET_PATH ? 'http://localhost/convert/raw' : `${RVC_SERVICE_URL}/convert/raw`,
+    inputAudioStream,
+    {
+      headers,
+      socketPath: RVC_SOCKET_PATH || undefined,
+      responseType: 'stream',
+      maxBodyLength: Infinity,
+      timeout
+    }
+  );
+
+  return response.data;
+}
+
+// Helper function to render a whole multi-speaker script in one request
+// script: { turns: [{ voice_id, text } | { voice_id, audio: '<field>' }], gap_ms, format, ... }
+// audioStreams: { '<field>': stream } for turns that carry audio
+// Resolves to { audio, contentType, renderId, timing }; timing is per-turn [index, voice_id, start, end]
+async function renderScriptWithRVC(script, audioStreams = {}, options = {}) {
+  try {
+    console.log(`🎙️ Rendering script with ${script.turns.length} turns`);
+
+    const timeout = options.timeout || 15 * 60 * 1000; // 15 minutes timeout
+
+    const formData = new FormData();
+    formData.append('script', JSON.stringify(script));
+    for (const [field, stream] of Object.entries(audioStreams)) {
+      formData.append(field, stream, {
+        filename: `${field}.wav`,
+        contentType: 'audio/wav'
+      });
+    }
+
+    const response = await axios.post(`${RVC_SERVICE_URL}/render/script`, formData, {
+      headers: {
+        ...formData.getHeaders(),
+        'X-Request-Deadline': String(Date.now() + timeout),
+        'X-Priority': options.priority || 'batch'
+      },
+      params: options.stream ? { stream: 1 } : undefined,
+      responseType: 'stream',
+      timeout
+    });
+
+    const timingHeader = response.headers['x-render-timing'];
+    return {
+      audio: response.data,
+      contentType: response.headers['content-type'],
+      renderId: response.headers['x-render-id'],
+      timing: timingHeader ? JSON.parse(timingHeader) : null
+    };
+
+  } catch (error) {
+    console.error(`❌ RVC script render error:`, error.message);
+    throw error;
+  }
+}
+
 module.exports = router;
 
@@ -6,11 +6,16 @@ from flask_cors import CORS
 import os
 import sys
 import json
+import math
 import subprocess
 import tempfile
 import shutil
 from pathlib import Path
 
+from model_residency import ResidencyManager
+# dataset_prep and f0 need numpy/soundfile/scipy, which mock mode (requirements.txt
+# only) doesn't install; they are imported where training and pitch work use them
+
 app = Flask(__name__)
 CORS(app)
 
@@ -20,6 +25,16 @@ MODELS_DIR = os.path.join(RVC_ROOT, 'models')
 WEIGHTS_DIR = os.path.join(RVC_ROOT, 'weights')
 LOGS_DIR = os.path.join(RVC_ROOT, 'logs')
 TEMP_DIR = os.path.join(RVC_ROOT, 'temp')
+F0_CACHE_DIR = os.path.join(RVC_ROOT, 'cache', 'f0')
+# Default pitch shift for /convert: 'auto' (match the voice's stored pitch stats) or semitones
+DEFAULT_PITCH = os.environ.get('RVC_PITCH', 'auto')
+# Hand infer.py the cached input curve via --f0_file; off by default since not every
+# infer.py build accepts the flag. Without it infer.py extracts f0 itself, so the f0
+# cache only saves work here when this is on (otherwise it just feeds 'auto' pitch)
+USE_F0_FILE = os.environ.get('RVC_F0_FILE', '').lower() in ('1', 'true', 'yes')
+# Training samples are cut into 5 s segments; keep trailing/short pieces down to this
+TRAIN_SEGMENT_SECONDS = 5.0
+MIN_TRAIN_SECONDS = 1.0
 
 # Create directories
 os.makedirs(MODELS_DIR, exist_ok=True)
@@ -38,12 +53,32 @@ except ImportError:
     print("⚠️  RVC not installed. Using mock mode.")
     print("   Install RVC: pip install rvc-python or clone RVC-Project repository")
 
+def parse_pitch(value):
+    """'auto' or a whole semitone shift; ValueError for anything else"""
+    text = str(value).strip().lower()
+    if text == 'auto':
+        return 'auto'
+    shift = float(text)
+    if not math.isfinite(shift):
+        raise ValueError(f"pitch must be finite: {value}")
+    return int(round(shift))
+
 class RVCService:
     """Service for managing RVC voice models"""
     
     def __init__(self):
         self.models = {}
+        self.residency = ResidencyManager.from_env()
+        self._f0_cache = None
         self.load_existing_models()
+
+    @property
+    def f0_cache(self):
+        """Input f0 curve cache, created on first pitch analysis"""
+        if self._f0_cache is None:
+            from f0 import F0Cache
+            self._f0_cache = F0Cache.from_env(F0_CACHE_DIR)
+        return self._f0_cache
     
     def load_existing_models(self):
         """Load existing trained models"""
@@ -71,7 +106,7 @@ class RVCService:
         """
         if not RVC_AVAILABLE:
             # Mock training for development
-            return self._mock_training(voice_id, voice_name)
+            return self._mock_training(voice_id, voice_name, audio_path)
         
         try:
             print(f"🎤 Training RVC model for: {voice_name}")
@@ -82,12 +117,16 @@ class RVCService:
             
             # Step 1: Preprocess audio (split into chunks)
             print("  1. Preprocessing audio...")
-            subprocess.run([
-                'python', 'rvc/preprocess.py',
-                '--input', audio_path,
-                '--output', model_dir,
-                '--sr', '40000'
-            ], check=True)
+            from dataset_prep import prepare_dataset
+            prep = prepare_dataset(audio_path, os.path.join(model_dir, '0_gt_wavs'), target_sr=40000,
+                                   segment_seconds=TRAIN_SEGMENT_SECONDS,
+                                   min_segment_ratio=MIN_TRAIN_SECONDS / TRAIN_SEGMENT_SECONDS)
+            if prep['failed']:
+                raise ValueError(prep['failed'][0]['error'])
+            if not prep['segments']:
+                raise ValueError(f"Audio sample too short: need at least {MIN_TRAIN_SECONDS:g}s of "
+                                 "non-silent audio")
+            print(f"     {len(prep['segments'])} segments, {prep['audio_hours'] * 3600:.1f}s of audio")
             
             # Step 2: Extract features
             print("  2. Extracting features...")
@@ -110,6 +149,9 @@ class RVCService:
             # Step 4: Export model
             print("  4. Exporting model...")
             model_path = os.path.join(WEIGHTS_DIR, f"{voice_id}.pth")
+            # Retraining replaces the weights file; drop any mapping of the old one
+            self.residency.evict(voice_id)
+            self.store_voice_pitch(voice_id, audio_path)
             
             self.models[voice_id] = {
                 'path': model_path,
@@ -134,9 +176,11 @@ class RVCService:
                 'status': 'failed'
             }
     
-    def _mock_training(self, voice_id, voice_name):
+    def _mock_training(self, voice_id, voice_name, audio_path=None):
         """Mock training for development without RVC installed"""
         print(f"🎭 Mock training: {voice_name}")
+        if audio_path:
+            self.store_voice_pitch(voice_id, audio_path)
         
         # Simulate training delay
         import time
@@ -144,6 +188,7 @@ class RVCService:
         
         # Create dummy model file
         model_path = os.path.join(WEIGHTS_DIR, f"{voice_id}.pth")
+        self.residency.evict(voice_id)
         with open(model_path, 'w') as f:
             f.write(f"Mock RVC model for {voice_name}")
         
@@ -161,7 +206,60 @@ class RVCService:
             'mock': True
         }
     
-    def convert_voice(self, model_id, input_audio_path, output_path):
+    def _pitch_stats_path(self, voice_id):
+        return os.path.join(WEIGHTS_DIR, f"{voice_id}.f0.json")
+
+    def store_voice_pitch(self, voice_id, audio_path):
+        """Record the voice's pitch statistics next to its weights (used for auto pitch shift)"""
+        try:
+            from dataset_prep import decode
+            from f0 import extract_f0, f0_stats, save_voice_stats, train_method
+            method = train_method()
+            audio, sr = decode(audio_path)
+            stats = f0_stats(extract_f0(audio, sr, method), method)
+            save_voice_stats(self._pitch_stats_path(voice_id), stats)
+            print(f"  🎵 Voice pitch: median {stats['median_hz'] or 0:.1f} Hz ({method})")
+            return stats
+        except Exception as e:
+            # Conversions fall back to no shift; never fail training over it
+            print(f"  ⚠️  Pitch analysis failed: {e}")
+            return None
+
+    def resolve_pitch(self, model_id, input_audio_path, pitch=None):
+        """Semitone shift for a conversion, plus the cached input f0 curve when one was extracted
+
+        Never fails a conversion: if the input can't be analysed, 'auto' falls back
+        to no shift and infer.py extracts f0 itself.
+        """
+        try:
+            shift = parse_pitch(DEFAULT_PITCH if pitch in (None, '') else pitch)
+        except ValueError:
+            print(f"  ⚠️  Invalid pitch {pitch!r}; using no shift")
+            shift = 0
+        stats_path = self._pitch_stats_path(model_id)
+        auto = shift == 'auto'
+        # Voices without stored stats get no auto shift, so only extract when the curve is used
+        if not USE_F0_FILE and not (auto and os.path.exists(stats_path)):
+            return (0 if auto else shift), None
+        curve = None
+        try:
+            from dataset_prep import decode
+            curve, _, _ = self.f0_cache.curve(input_audio_path, decode)
+        except Exception as e:
+            print(f"  ⚠️  Input pitch analysis failed: {e}")
+        if not auto:
+            return shift, curve
+        if curve is None:
+            return 0, curve
+        try:
+            from f0 import auto_pitch_shift, f0_stats, load_voice_stats
+            target = load_voice_stats(stats_path)
+            return (auto_pitch_shift(f0_stats(curve), target) if target else 0), curve
+        except Exception as e:
+            print(f"  ⚠️  Auto pitch shift failed: {e}")
+            return 0, curve
+
+    def convert_voice(self, model_id, input_audio_path, output_path, pitch=None):
         """
         Convert audio using trained RVC model
         
@@ -169,6 +267,7 @@ class RVCService:
             model_id: ID of the trained model
             input_audio_path: Path to input audio
             output_path: Path to save converted audio
+            pitch: Semitone shift, or 'auto' to match the voice's pitch (default RVC_PITCH)
         
         Returns:
             dict with conversion status
@@ -184,25 +283,39 @@ class RVCService:
             print(f"🔄 Converting audio with model: {model_id}")
             
             model = self.models[model_id]
+            shift, curve = self.resolve_pitch(model_id, input_audio_path, pitch)
             
             # Run RVC inference
-            subprocess.run([
+            command = [
                 'python', 'rvc/infer.py',
                 '--model', model['path'],
                 '--input', input_audio_path,
                 '--output', output_path,
-                '--pitch', '0',
+                '--pitch', str(shift),
                 '--filter_radius', '3',
                 '--index_rate', '0.5',
                 '--volume_envelope', '1',
                 '--protect', '0.5'
-            ], check=True)
+            ]
+            f0_file = None
+            if USE_F0_FILE and curve is not None:
+                # RVC substitutes the file's curve after applying --pitch, so it goes in pre-shifted
+                from f0 import write_f0_file
+                f0_file = output_path + '.f0.csv'
+                write_f0_file(curve * 2.0 ** (shift / 12.0), f0_file)
+                command += ['--f0_file', f0_file]
+            try:
+                subprocess.run(command, check=True)
+            finally:
+                if f0_file and os.path.exists(f0_file):
+                    os.remove(f0_file)
             
-            print(f"✅ Audio converted successfully")
+            print(f"✅ Audio converted successfully (pitch {shift:+d})")
             
             return {
                 'success': True,
-                'output_path': output_path
+                'output_path': output_path,
+                'pitch_shift': shift
             }
             
         except Exception as e:
@@ -229,12 +342,36 @@ class RVCService:
         """Delete a trained model"""
         if model_id in self.models:
             model = self.models[model_id]
-            if os.path.exists(model['path']):
-                os.remove(model['path'])
+            self.residency.evict(model_id)
+            for path in (model['path'], self._pitch_stats_path(model_id)):
+                if os.path.exists(path):
+                    os.remove(path)
             del self.models[model_id]
             return {'success': True}
         return {'success': False, 'error': 'Model not found'}
 
+    def warm_model(self, model_id):
+        """Map a model's weights and prefetch them into the page cache
+
+        Conversion runs in an infer.py subprocess that reads the weights file
+        itself, so this only saves it the disk read; the mapping is not reused
+        and residency hits/misses in /health do not count conversions.
+        """
+        if model_id not in self.models:
+            return {'success': False, 'error': 'Model not found'}
+        entry = self.residency.warm(model_id, self.models[model_id]['path'])
+        return {'success': True, 'resident': entry.describe()}
+
+    def pin_model(self, model_id, pinned=True):
+        """Pin (or unpin) a model's mapping so its pages stay cached for infer.py"""
+        if model_id not in self.models:
+            return {'success': False, 'error': 'Model not found'}
+        if not pinned:
+            self.residency.unpin(model_id)
+            return {'success': True, 'pinned': False}
+        entry = self.residency.pin(model_id, self.models[model_id]['path'])
+        return {'success': True, 'pinned': True, 'resident': entry.describe()}
+
 # Initialize service
 rvc_service = RVCService()
 
@@ -246,7 +383,9 @@ def health():
     return jsonify({
         'status': 'healthy',
         'rvc_available': RVC_AVAILABLE,
-        'models_loaded': len(rvc_service.models)
+        'models_loaded': len(rvc_service.models),
+        'residency': rvc_service.residency.stats(),
+        'f0_cache': rvc_service._f0_cache.stats() if rvc_service._f0_cache else None
     })
 
 @app.route('/train', methods=['POST'])
@@ -294,6 +433,7 @@ def convert_audio():
     Expected form data:
     - audio: Input audio file
     - model_id: ID of trained model
+    - pitch: Optional semitone shift, or 'auto' (default RVC_PITCH)
     """
     try:
         if 'audio' not in request.files:
@@ -305,17 +445,27 @@ def convert_audio():
         if not model_id:
             return jsonify({'success': False, 'error': 'model_id is required'}), 400
         
+        pitch = request.form.get('pitch')
+        if pitch not in (None, ''):
+            try:
+                parse_pitch(pitch)
+            except ValueError:
+                return jsonify({'success': False, 'error': "pitch must be a number of semitones or 'auto'"}), 400
+        
         # Save input audio
         temp_input = os.path.join(TEMP_DIR, f"{model_id}_input.wav")
         audio_file.save(temp_input)
         
         # Convert audio
         temp_output = os.path.join(TEMP_DIR, f"{model_id}_output.wav")
-        result = rvc_service.convert_voice(model_id, temp_input, temp_output)
+        result = rvc_service.convert_voice(model_id, temp_input, temp_output, pitch)
         
         if result['success']:
             # Return converted audio
-            return send_file(temp_output, mimetype='audio/wav')
+            response = send_file(temp_output, mimetype='audio/wav')
+            if 'pitch_shift' in result:
+                response.headers['X-Pitch-Shift'] = str(result['pitch_shift'])
+            return response
         else:
             return jsonify(result), 500
         
@@ -343,6 +493,24 @@ def delete_model(model_id):
     result = rvc_service.delete_model(model_id)
     return jsonify(result)
 
+@app.route('/models/<model_id>/warm', methods=['POST'])
+def warm_model(model_id):
+    """Prefetch a trained model's weights into the page cache (infer.py still loads them)"""
+    try:
+        result = rvc_service.warm_model(model_id)
+        return jsonify(result), (200 if result['success'] else 404)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/models/<model_id>/pin', methods=['POST', 'DELETE'])
+def pin_model(model_id):
+    """Pin (POST) or unpin (DELETE) a trained model's weights in the page cache"""
+    try:
+        result = rvc_service.pin_model(model_id, pinned=request.method == 'POST')
+        return jsonify(result), (200 if result['success'] else 404)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 if __name__ == '__main__':
     print("🎤 Starting RVC Voice Cloning Service...")
     print(f"   RVC Available: {RVC_AVAILABLE}")
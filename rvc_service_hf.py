@@ -1,18 +1,31 @@
 # RVC Voice Cloning Service with Hugging Face Support
 # Uses pre-trained models from Hugging Face for voice conversion
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, g, redirect, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 import os
 import sys
 import json
 import tempfile
 import shutil
+import threading
 from pathlib import Path
 import time
+import io
+import uuid
 from typing import Optional
+from urllib.parse import unquote
 import numpy as np
 
+from model_residency import ResidencyManager
+from artifact_store import ArtifactStore
+from inference_engines import ENGINES, TorchEngine, OnnxEngine, is_commit_hash, repo_sample_rate, snapshot_id
+from micro_batching import MicroBatcher
+from preprocess_pool import PreprocessPool
+from sharding import BODY_VOICE_FIELDS, ShardFailed, ShardRouter, ShardUnavailable, hinted_voice_id, path_voice_id
+from silence import convert_speech_regions
+from admission import AdmissionController, AdmissionRejected, PRIORITY_HEADER, parse_deadline, parse_priority
+
 app = Flask(__name__)
 CORS(app)
 
@@ -23,11 +36,25 @@ except Exception:
     app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024
 
 # Configuration
-RVC_ROOT = os.path.join(os.path.dirname(__file__), 'rvc')
+# Overridable so several local nodes (see scripts/shard_cluster.py) can run from one checkout
+RVC_ROOT = os.environ.get('RVC_ROOT') or os.path.join(os.path.dirname(__file__), 'rvc')
 MODELS_DIR = os.path.join(RVC_ROOT, 'models')
 WEIGHTS_DIR = os.path.join(RVC_ROOT, 'weights')
 LOGS_DIR = os.path.join(RVC_ROOT, 'logs')
 TEMP_DIR = os.path.join(RVC_ROOT, 'temp')
+ARTIFACT_CACHE_DIR = os.path.join(RVC_ROOT, 'cache')
+# Inputs up to this long are decoded/resampled whole in the preprocess pool;
+# longer ones stream through the windowed reader to keep memory bounded
+PREPROCESS_MAX_SECONDS = float(os.environ.get('PREPROCESS_MAX_SECONDS', '300'))
+# Where raw-body uploads are spooled. Set RAW_SPOOL_DIR=/dev/shm to keep small segments
+# off disk; not the default because Docker caps /dev/shm at 64 MB
+RAW_SPOOL_DIR = os.environ.get('RAW_SPOOL_DIR') or TEMP_DIR
+
+# How long a branch/tag (or the default branch) stays resolved to one HF commit
+HF_REVISION_TTL = float(os.environ.get('HF_REVISION_TTL', '3600'))
+
+# Files in WEIGHTS_DIR / the artifact store that represent a voice
+MODEL_EXTENSIONS = ('.pth', '.pt', '.wav')
 
 # Training progress tracking
 training_progress = {}
@@ -48,6 +75,7 @@ try:
     import soundfile as sf
     from pydub import AudioSegment
     import librosa
+    from windowed import convert_array_windowed, convert_file_windowed, window_settings
     HF_AVAILABLE = True
     print("✅ Hugging Face Transformers available")
 except ImportError as e:
@@ -58,6 +86,7 @@ except ImportError as e:
 # Optional: Coqui TTS for XTTS zero-shot
 try:
     from TTS.api import TTS  # type: ignore
+    from xtts_cpu import XTTSRunner
     XTTS_AVAILABLE = True
     print("✅ Coqui TTS available for XTTS zero-shot")
 except Exception as e:
@@ -67,12 +96,28 @@ except Exception as e:
 # Optional: Hugging Face Hub for model caching
 HF_HUB_AVAILABLE = False
 try:
-    from huggingface_hub import snapshot_download
+    from huggingface_hub import HfApi, snapshot_download
     HF_HUB_AVAILABLE = True
     print("✅ huggingface_hub available for model caching")
 except Exception:
     print("ℹ️  huggingface_hub not installed; HF repo caching disabled.")
 
+# Multi-speaker script rendering (needs soundfile/scipy, not the HF stack)
+RENDER_AVAILABLE = False
+try:
+    from script_render import FORMATS as RENDER_FORMATS, ScriptError, ScriptRenderer, parse_script, timing_header
+    RENDER_AVAILABLE = True
+except ImportError as e:
+    print(f"ℹ️  Script rendering disabled: {e}")
+
+# Speaker similarity index (needs scipy)
+SPEAKER_INDEX_AVAILABLE = False
+try:
+    from speaker_index import SpeakerIndex
+    SPEAKER_INDEX_AVAILABLE = True
+except ImportError as e:
+    print(f"ℹ️  Speaker similarity index disabled: {e}")
+
 # Check for GPU
 DEVICE = "cuda" if HF_AVAILABLE and torch.cuda.is_available() else "cpu"
 if HF_AVAILABLE:
@@ -84,32 +129,114 @@ class HuggingFaceRVCService:
     def __init__(self):
         self.models = {}
         self.hf_models = {}
+        self.residency = ResidencyManager.from_env()
+        # Decode/resample runs in worker processes so request threads keep the GIL free
+        self.preprocess = PreprocessPool.from_env()
+        # Durable store + local LRU cache for weights/references/HF snapshots (None if unset)
+        self.artifacts = ArtifactStore.from_env(ARTIFACT_CACHE_DIR)
+        # Consistent-hash ownership of voices across nodes (None when SHARD_NODES is unset)
+        self.sharding = ShardRouter.from_env()
+        # In-process engines for repos that ship a TorchScript/ONNX model
+        self.engines = {
+            'torch': TorchEngine(),
+            'onnx': OnnxEngine.from_env(os.path.join(MODELS_DIR, 'onnx')),
+        }
+        # Coalesces concurrent requests for the same repo/engine into one forward pass
+        self.batcher = MicroBatcher.from_env()
         self.mock_mode = not HF_AVAILABLE
         self.xtts_available = XTTS_AVAILABLE
+        # Cached XTTS models; on CPU this applies XTTS_CPU_MODE quantization/threading
+        self.xtts = XTTSRunner(TTS, device=DEVICE) if XTTS_AVAILABLE else None
 
         if HF_AVAILABLE:
             print("🚀 Initializing Hugging Face RVC Service...")
             self.load_pretrained_models()
         else:
             print("🎭 Running in MOCK mode")
-            self.load_existing_models()
+        # Reference samples survive restarts (and redeploys, with an artifact store)
+        self.load_existing_models()
+        if self.sharding:
+            if not self.artifacts:
+                print("⚠️  SHARD_NODES without ARTIFACT_STORE_URL: voices can't move when the ring changes")
+            self.sharding.on_change(self.rebalance_voices)
+            self.sharding.start()
+        # Embeddings of every reference for /models/similar
+        self._lazily_indexed = set()
+        self.speakers = SpeakerIndex.from_env(os.path.join(MODELS_DIR, 'speaker_index')) if SPEAKER_INDEX_AVAILABLE else None
+        if self.speakers is not None:
+            threading.Thread(target=self._backfill_speaker_index, daemon=True).start()
+
+    def _hf_snapshot_usable(self, known: dict) -> bool:
+        if not known.get('cached') or not os.path.isdir(known.get('path', '')):
+            return False
+        prefix = known.get('store_prefix')
+        return not (prefix and self.artifacts) or self.artifacts.tree_complete(prefix)
+
+    def resolve_hf_commit(self, repo_id: str, revision: Optional[str] = None) -> Optional[str]:
+        """Commit a revision (default branch when None) points at now, or None when offline"""
+        if is_commit_hash(revision):
+            return revision
+        if not HF_HUB_AVAILABLE:
+            return None
+        try:
+            return HfApi().model_info(repo_id, revision=revision).sha
+        except Exception as e:
+            print(f"⚠️  Could not resolve {repo_id} @ {revision or 'default branch'}: {e}")
+            return None
 
     def ensure_hf_model_cached(self, repo_id: str, revision: Optional[str] = None) -> Optional[str]:
-        """Download/cache a Hugging Face repo if available; return local path."""
+        """Download/cache a Hugging Face repo if available; return local path.
+
+        Snapshots are keyed on the commit the revision resolves to, re-resolved
+        every HF_REVISION_TTL seconds, so a moving branch picks up new commits.
+        """
+        known = self.hf_models.get(repo_id)
+        if (known and known.get('revision') == revision and self._hf_snapshot_usable(known)
+                and time.time() - known.get('resolved_at', 0) < HF_REVISION_TTL):
+            return known['path']
+
+        commit = self.resolve_hf_commit(repo_id, revision)
+        if commit is None and known and known.get('revision') == revision and self._hf_snapshot_usable(known):
+            # Offline: keep serving the snapshot we already have, and retry after another TTL
+            known['resolved_at'] = time.time()
+            return known['path']
+
+        if self.artifacts and commit:
+            store_prefix = f"hf/{repo_id}/{commit}"
+            try:
+                local_dir = self.artifacts.fetch_tree(store_prefix)
+                if local_dir:
+                    self.hf_models[repo_id] = {'path': local_dir, 'revision': revision, 'commit': commit,
+                                               'store_prefix': store_prefix, 'cached': True,
+                                               'resolved_at': time.time()}
+                    print(f"✅ Restored HF repo from artifact store: {local_dir}")
+                    return local_dir
+            except Exception as e:
+                print(f"⚠️  Artifact store restore failed for {repo_id}: {e}")
+
         if not HF_HUB_AVAILABLE:
             return None
         try:
-            print(f"📥 Caching HF repo: {repo_id} @ {revision or 'latest'}")
+            print(f"📥 Caching HF repo: {repo_id} @ {commit or revision or 'latest'}")
             cache_dir = os.path.join(MODELS_DIR, 'hf')
             os.makedirs(cache_dir, exist_ok=True)
-            local_dir = snapshot_download(repo_id=repo_id, revision=revision, cache_dir=cache_dir)
+            local_dir = snapshot_download(repo_id=repo_id, revision=commit or revision, cache_dir=cache_dir)
+            # snapshot_download returns .../snapshots/<commit>
+            commit = commit or os.path.basename(os.path.normpath(local_dir))
             # Track in hf_models map
             self.hf_models[repo_id] = {
                 'path': local_dir,
                 'revision': revision,
+                'commit': commit,
                 'cached': True,
+                'resolved_at': time.time(),
             }
             print(f"✅ Cached to: {local_dir}")
+            if self.artifacts:
+                try:
+                    self.artifacts.put_tree(f"hf/{repo_id}/{commit}", local_dir)
+                except Exception as e:
+                    print(f"⚠️  Could not persist {repo_id} to artifact store: {e}")
             return local_dir
         except Exception as e:
             print(f"⚠️  HF cache failed for {repo_id}: {e}")
@@ -146,16 +273,198 @@ class HuggingFaceRVCService:
     
     def load_existing_models(self):
         """Load user-uploaded voice samples"""
+        local = []
         if os.path.exists(WEIGHTS_DIR):
-            for model_file in os.listdir(WEIGHTS_DIR):
-                if model_file.endswith('.pth') or model_file.endswith('.pt'):
-                    model_name = model_file.replace('.pth', '').replace('.pt', '')
-                    self.models[model_name] = {
-                        'path': os.path.join(WEIGHTS_DIR, model_file),
-                        'status': 'ready',
-                        'type': 'custom'
-                    }
+            for model_file in sorted(os.listdir(WEIGHTS_DIR)):
+                model_name, ext = os.path.splitext(model_file)
+                if ext in MODEL_EXTENSIONS:
+                    local.append((model_name, os.path.join(WEIGHTS_DIR, model_file)))
+        if self.artifacts:
+            # Voices trained before the store was configured are uploaded once, then served from it
+            for model_name, path in local:
+                key = f"weights/{os.path.basename(path)}"
+                try:
+                    if not self.artifacts.exists(key):
+                        self._persist_model_file(model_name, path)
+                        print(f"📦 Uploaded local voice to artifact store: {model_name}")
+                    self._register_store_model(model_name, key)
+                except Exception as e:
+                    print(f"⚠️  Could not upload {model_name} to artifact store: {e}")
+                    self.models[model_name] = {'path': path, 'status': 'ready', 'type': 'custom'}
+            self._prefetch_hot_voices(self._register_store_models())
+        else:
+            for model_name, path in local:
+                self.models[model_name] = {
+                    'path': path,
+                    'status': 'ready',
+                    'type': 'custom'
+                }
         print(f"📦 Loaded {len(self.models)} existing custom models")
+
+    def _register_store_models(self):
+        """Register every voice in the durable store; files are fetched on first use"""
+        entries = []
+        for entry in self.artifacts.list('weights/'):
+            model_name, ext = os.path.splitext(entry['key'].split('/')[-1])
+            if ext in MODEL_EXTENSIONS:
+                self._register_store_model(model_name, entry['key'])
+                entries.append(entry)
+        return entries
+
+    def _register_store_model(self, model_name, key):
+        if model_name not in self.models:
+            self.models[model_name] = {
+                'path': self.artifacts.local_path(key),
+                'artifact': key,
+                'status': 'ready',
+                'type': 'custom'
+            }
+
+    def has_model(self, model_id):
+        """Whether a voice exists, looking it up in the store if another node added it since boot"""
+        if model_id in self.models:
+            return True
+        if not self.artifacts or not model_id or model_id != os.path.basename(model_id) or model_id.startswith('.'):
+            return False
+        for ext in MODEL_EXTENSIONS:
+            key = f"weights/{model_id}{ext}"
+            try:
+                found = self.artifacts.exists(key)
+            except Exception as e:
+                print(f"⚠️  Artifact store lookup failed for {key}: {e}")
+                return False
+            if found:
+                self._register_store_model(model_id, key)
+                return True
+        return False
+
+    def _prefetch_hot_voices(self, entries):
+        """Download HOT_VOICES plus the most recently updated voices in the background"""
+        if self.sharding:
+            # Other nodes own (and warm) the rest
+            entries = [e for e in entries if self.sharding.is_local(os.path.splitext(e['key'].split('/')[-1])[0])]
+        try:
+            count = int(os.environ.get('ARTIFACT_PREFETCH_COUNT', '16'))
+        except ValueError:
+            count = 16
+        hot = {v.strip() for v in os.environ.get('HOT_VOICES', '').split(',') if v.strip()}
+        keys = [e['key'] for e in entries if os.path.splitext(e['key'].split('/')[-1])[0] in hot]
+        recent = sorted(entries, key=lambda e: e['mtime'], reverse=True)[:count]
+        keys += [e['key'] for e in recent if e['key'] not in keys]
+        if keys:
+            threading.Thread(target=self.artifacts.prefetch, args=(keys,), daemon=True).start()
+
+    def rebalance_voices(self, old_ring, new_ring):
+        """After a ring change: prefetch voices this node gained, evict the ones it lost"""
+        start = time.time()
+        if self.artifacts:
+            # Voices trained on other nodes since boot show up in the store
+            self._register_store_models()
+        me = self.sharding.self_url
+        gained, lost = [], []
+        for voice_id in list(self.models):
+            before, after = old_ring.owner(voice_id) == me, new_ring.owner(voice_id) == me
+            if after and not before:
+                gained.append(voice_id)
+            elif before and not after:
+                lost.append(voice_id)
+        for voice_id in lost:
+            self.residency.evict(voice_id)
+        keys = [self.models[v]['artifact'] for v in gained if self.models.get(v, {}).get('artifact')]
+        failed = 0
+        if keys:
+            failed = sum(1 for path in self.artifacts.prefetch(keys).values() if path.startswith('error'))
+        print(f"🔀 Rebalanced: +{len(gained)} voices (prefetched {len(keys) - failed}), -{len(lost)} evicted")
+        return {'gained': len(gained), 'lost': len(lost), 'prefetched': len(keys) - failed,
+                'failed': failed, 'seconds': round(time.time() - start, 3)}
+
+    def _index_voice(self, voice_id, audio=None, sample_rate=None, path=None, save=True):
+        """Embed a voice reference into the similarity index (best effort)"""
+        if self.speakers is None:
+            return
+        try:
+            if audio is None:
+                import soundfile as sf
+                audio, sample_rate = sf.read(path, dtype='float32')
+            self.speakers.add(voice_id, audio, sample_rate, save=save)
+        except Exception as e:
+            print(f"⚠️  Could not index speaker {voice_id}: {e}")
+
+    def _backfill_speaker_index(self):
+        """Index references that predate the index and drop entries for deleted voices
+
+        Only references already on local disk are read; store-backed voices are
+        indexed when model_path() first fetches them, so booting never pulls
+        every voice (or voices other shards own) into the cache.
+        """
+        # One save per batch instead of rewriting the id list for every voice
+        stale = [v for v in self.speakers.ids if v not in self.models]
+        for voice_id in stale:
+            self.speakers.remove(voice_id, save=False)
+        if stale:
+            self.speakers.save()
+        missing = [v for v, m in list(self.models.items())
+                   if v not in self.speakers and m.get('path', '').endswith('.wav') and self._is_local_file(m)]
+        for voice_id in missing:
+            model = self.models.get(voice_id)
+            if model is not None:
+                self._index_voice(voice_id, path=model['path'], save=False)
+        if missing:
+            self.speakers.save()
+            print(f"🧬 Indexed {len(missing)} existing voice(s) for similarity search")
+
+    def _is_local_file(self, model):
+        if self.artifacts and model.get('artifact'):
+            return self.artifacts.is_cached(model['artifact'])
+        return os.path.exists(model.get('path', ''))
+
+    def similar_voices(self, voice_id=None, audio_path=None, k=5):
+        """Top-k existing voices closest to a voice or an uploaded sample"""
+        if self.speakers is None:
+            return {'success': False, 'error': 'Speaker index unavailable (install scipy)'}
+        start = time.perf_counter()
+        if voice_id is not None:
+            vec = self.speakers.vector(voice_id)
+            if vec is None:
+                return {'success': False, 'error': 'Voice not indexed'}
+        else:
+            import soundfile as sf
+            audio, sample_rate = sf.read(audio_path, dtype='float32')
+            vec = self.speakers.embedder.embed(audio, sample_rate)
+        results = [
+            {'id': v, 'name': self.models.get(v, {}).get('name', v), 'score': round(score, 4)}
+            for v, score in self.speakers.query(vec, k, exclude=voice_id)
+        ]
+        return {
+            'success': True,
+            'query': voice_id,
+            'results': results,
+            'indexed': len(self.speakers),
+            'elapsed_ms': round((time.perf_counter() - start) * 1000.0, 2)
+        }
+
+    def model_path(self, model_id):
+        """Local path of a model's weights, fetched from the artifact store if needed"""
+        model = self.models[model_id]
+        if self.artifacts and model.get('artifact'):
+            model['path'] = self.artifacts.fetch(model['artifact'])
+            speakers = getattr(self, 'speakers', None)
+            if (speakers is not None and model['path'].endswith('.wav') and model_id not in speakers
+                    and model_id not in self._lazily_indexed):
+                # First local copy of a voice the boot backfill skipped
+                self._lazily_indexed.add(model_id)
+                threading.Thread(target=self._index_voice, args=(model_id,), kwargs={'path': model['path']},
+                                 daemon=True).start()
+        return model['path']
+
+    def _persist_model_file(self, voice_id, local_path):
+        """Write a new weights/reference file through to the artifact store"""
+        if not self.artifacts:
+            return local_path, None
+        key = f"weights/{os.path.basename(local_path)}"
+        cached_path = self.artifacts.put(key, local_path)
+        os.remove(local_path)
+        return cached_path, key
     
     def train_model(self, voice_id, audio_path, voice_name):
         """
@@ -166,8 +475,11 @@ class HuggingFaceRVCService:
         global training_progress
         
         if self.mock_mode:
-            return self._mock_training(voice_id, voice_name)
+            result = self._mock_training(voice_id, voice_name)
+            self._index_voice(voice_id, path=audio_path)
+            return result
         
+        decoded = None
         try:
             print(f"🎤 Processing voice sample: {voice_name}")
             
@@ -178,11 +490,11 @@ class HuggingFaceRVCService:
                 'message': 'Loading audio file...'
             }
             
-            # Load audio using librosa (handles all formats: MP3, WAV, OGG, M4A, etc.)
+            # Decode in the preprocess pool (soundfile, or librosa for MP3/M4A) into shared memory
             print(f"   Loading audio file: {audio_path}")
             try:
-                # librosa can read MP3, WAV, OGG, FLAC, M4A without ffmpeg
-                audio_data, sample_rate = librosa.load(audio_path, sr=None, mono=False)
+                decoded = self.preprocess.decode(audio_path)
+                audio_data, sample_rate = decoded.array, decoded.sample_rate
                 print(f"   ✅ Audio loaded: sample_rate={sample_rate}, shape={audio_data.shape}")
                 
                 # Convert to torch tensor and ensure correct shape
@@ -196,7 +508,7 @@ class HuggingFaceRVCService:
                         waveform = waveform.t()  # Ensure [channels, samples]
                         
             except Exception as load_err:
-                print(f"   ⚠️ Librosa load failed: {load_err}")
+                print(f"   ⚠️ Audio load failed: {load_err}")
                 raise
             
             # Update progress: Audio loaded
@@ -224,8 +536,21 @@ class HuggingFaceRVCService:
                 waveform_np = waveform_np.T  # soundfile expects [samples, channels]
             else:
                 waveform_np = waveform_np.squeeze()  # Remove channel dim if mono
-            sf.write(ref_path, waveform_np, sample_rate)
+            # A resident memmap may still point at the old reference; drop it and
+            # swap the new file in atomically so readers never see a partial write
+            self.residency.evict(voice_id)
+            fd, tmp_path = tempfile.mkstemp(dir=WEIGHTS_DIR, prefix=f".{voice_id}.", suffix='.tmp')
+            os.close(fd)
+            try:
+                sf.write(tmp_path, waveform_np, sample_rate, format='WAV')
+                os.replace(tmp_path, ref_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            ref_path, artifact_key = self._persist_model_file(voice_id, ref_path)
             print(f"   ✅ Saved reference audio: {ref_path}")
+            self._index_voice(voice_id, waveform_np, sample_rate)
             
             # Update progress: Almost done
             training_progress[voice_id] = {
@@ -236,6 +561,7 @@ class HuggingFaceRVCService:
             
             self.models[voice_id] = {
                 'path': ref_path,
+                'artifact': artifact_key,
                 'status': 'ready',
                 'name': voice_name,
                 'type': 'custom',
@@ -274,6 +600,9 @@ class HuggingFaceRVCService:
                 'error': str(e),
                 'status': 'failed'
             }
+        finally:
+            if decoded is not None:
+                decoded.release()
     
     def _mock_training(self, voice_id, voice_name):
         """Mock training for development"""
@@ -283,9 +612,11 @@ class HuggingFaceRVCService:
         model_path = os.path.join(WEIGHTS_DIR, f"{voice_id}.pth")
         with open(model_path, 'w') as f:
             f.write(f"Mock model for {voice_name}")
+        model_path, artifact_key = self._persist_model_file(voice_id, model_path)
         
         self.models[voice_id] = {
             'path': model_path,
+            'artifact': artifact_key,
             'status': 'ready',
             'name': voice_name,
             'type': 'mock'
@@ -299,7 +630,59 @@ class HuggingFaceRVCService:
             'mock': True
         }
     
-    def convert_voice(self, model_id, input_audio_path, output_path, backend: Optional[str] = None, text: Optional[str] = None, hf_repo: Optional[str] = None, hf_revision: Optional[str] = None):
+    def _run_engine(self, engine: str, hf_repo: str, hf_revision: Optional[str], repo_path: str, input_audio_path: str, output_path: str, skip_silence: bool = True) -> Optional[dict]:
+        """Run an in-process engine, falling back from onnx to torch; return run info or None"""
+        order = ['onnx', 'torch'] if engine == 'onnx' else ['torch']
+        for name in order:
+            runner = self.engines[name]
+            if not runner.supports(repo_path):
+                continue
+            try:
+                model_sr = repo_sample_rate(repo_path)
+                print(f"⚙️  Running {name} engine for {hf_repo}")
+
+                def run_segment(segment, runner=runner, name=name):
+                    return self.batcher.submit(
+                        (name, hf_repo, hf_revision),
+                        segment,
+                        lambda batch: runner.run(hf_repo, hf_revision, repo_path, batch),
+                    )
+
+                silence_report = {'regions': 0, 'total_seconds': 0.0, 'speech_seconds': 0.0, 'skipped_seconds': 0.0} if skip_silence else None
+
+                def convert_window(window, run_segment=run_segment):
+                    if not skip_silence:
+                        return run_segment(window)
+                    # Only speech regions go through the model; silent gaps are copied back
+                    converted, report = convert_speech_regions(window, model_sr, run_segment)
+                    for key in silence_report:
+                        silence_report[key] += report[key]
+                    return converted
+
+                window_seconds, overlap_seconds = window_settings()
+                if self.preprocess.workers and sf.info(input_audio_path).duration <= PREPROCESS_MAX_SECONDS:
+                    # Decode + resample to the model rate off-process; windows read the shared buffer
+                    with self.preprocess.decode(input_audio_path, target_sr=model_sr, mono=True) as decoded:
+                        stats = convert_array_windowed(
+                            decoded.array, model_sr, output_path, convert_window,
+                            window_seconds=window_seconds, overlap_seconds=overlap_seconds,
+                        )
+                else:
+                    # Input is streamed in overlapping windows so memory stays flat for long files
+                    stats = convert_file_windowed(
+                        input_audio_path, output_path, convert_window, target_sr=model_sr,
+                        window_seconds=window_seconds, overlap_seconds=overlap_seconds,
+                    )
+                if silence_report is not None:
+                    total = silence_report['total_seconds']
+                    silence_report['skipped_ratio'] = silence_report['skipped_seconds'] / total if total else 0.0
+                    print(f"   🔇 Skipped {silence_report['skipped_seconds']:.2f}s of silence")
+                return {'engine': name, 'silence': silence_report, 'windows': stats['windows']}
+            except Exception as e:
+                print(f"⚠️  {name} engine failed: {e}")
+        return None
+
+    def convert_voice(self, model_id, input_audio_path, output_path, backend: Optional[str] = None, text: Optional[str] = None, hf_repo: Optional[str] = None, hf_revision: Optional[str] = None, engine: Optional[str] = None, skip_silence: Optional[bool] = None):
         """
         Convert audio using voice sample with Hugging Face models
         """
@@ -308,6 +691,11 @@ class HuggingFaceRVCService:
 
             # Determine backend and normalize
             backend_norm = (backend or 'rvc').lower()
+            engine_norm = (engine or os.environ.get('VC_ENGINE', 'torch')).lower()
+            if engine_norm not in ENGINES:
+                engine_norm = 'torch'
+            if skip_silence is None:
+                skip_silence = os.environ.get('VC_SKIP_SILENCE', '1').lower() not in ('0', 'false', 'no')
             print(f"   Backend: {backend_norm}")
 
             # If FreeVC/RVC path: allow running even in mock mode via external script
@@ -323,7 +711,12 @@ class HuggingFaceRVCService:
                         repo_path = self.hf_models[hf_repo].get('path')
 
                 handled = False
-                if repo_path:
+                engine_run = None
+                if repo_path and HF_AVAILABLE:
+                    # Engines and the batcher key on the snapshot's commit, not the branch name
+                    engine_run = self._run_engine(engine_norm, hf_repo, snapshot_id(repo_path, hf_revision), repo_path, input_audio_path, output_path, skip_silence)
+                    handled = engine_run is not None
+                if repo_path and not handled:
                     infer_script = os.path.join(repo_path, 'infer.py')
                     if os.path.exists(infer_script):
                         try:
@@ -339,7 +732,7 @@ class HuggingFaceRVCService:
                             print(f"⚠️  Inference script failed: {e}")
                     else:
                         print(f"ℹ️  infer.py not found in repo: {repo_path}")
-                else:
+                elif not repo_path:
                     if hf_repo:
                         print(f"ℹ️  HF repo not cached or unavailable: {hf_repo}")
 
@@ -352,7 +745,13 @@ class HuggingFaceRVCService:
                         return {'success': False, 'error': str(e)}
 
                 print("✅ Conversion complete (FreeVC/RVC path)")
-                return {'success': True, 'output_path': output_path, 'mode': 'freevc-scaffold'}
+                return {
+                    'success': True,
+                    'output_path': output_path,
+                    'mode': 'freevc-scaffold',
+                    'engine': engine_run['engine'] if engine_run else None,
+                    'silence': engine_run['silence'] if engine_run else None,
+                }
 
             # For other backends, we may need HF deps; handle gracefully
             if not HF_AVAILABLE:
@@ -362,21 +761,13 @@ class HuggingFaceRVCService:
                 return {'success': True, 'output_path': output_path, 'mode': 'passthrough'}
 
             # From here on, HF deps are available (torch/torchaudio/soundfile)
-            # Load input audio using soundfile
-            audio_data, input_sr = sf.read(input_audio_path)
-            input_waveform = torch.from_numpy(audio_data).float()
-            if len(input_waveform.shape) == 1:
-                input_waveform = input_waveform.unsqueeze(0)
-            else:
-                input_waveform = input_waveform.t()
-
             # For XTTS or other VC requiring a reference voice, verify model presence
-            has_model = model_id in self.models
+            has_model = self.has_model(model_id)
             ref_waveform = None
             ref_sr = None
             if has_model:
-                ref_path = self.models[model_id]['path']
-                ref_audio_data, ref_sr = sf.read(ref_path)
+                ref_path = self.model_path(model_id)
+                ref_audio_data, ref_sr = self.residency.get(model_id, ref_path).audio()
                 ref_waveform = torch.from_numpy(ref_audio_data).float()
                 if len(ref_waveform.shape) == 1:
                     ref_waveform = ref_waveform.unsqueeze(0)
@@ -393,29 +784,28 @@ class HuggingFaceRVCService:
                 # XTTS zero-shot TTS via Coqui TTS if installed
                 if not self.xtts_available:
                     print("ℹ️  XTTS not available; install Coqui TTS and ensure compatible Python version.")
-                    sf.write(output_path, input_waveform.squeeze().numpy(), input_sr)
+                    self._passthrough(input_audio_path, output_path)
                 else:
                     try:
                         model_name = os.environ.get('XTTS_MODEL', 'tts_models/multilingual/multi-dataset/xtts_v2')
                         print(f"   Using XTTS model: {model_name}")
-                        tts = TTS(model_name)
                         if has_model and ref_waveform is not None and ref_sr is not None and text:
                             ref_tmp = os.path.join(TEMP_DIR, f"{model_id}_ref.wav")
                             sf.write(ref_tmp, ref_waveform.squeeze().numpy(), ref_sr)
-                            tts.tts_to_file(text=text, file_path=output_path, speaker_wav=ref_tmp, language=os.environ.get('XTTS_LANG', 'en'))
+                            self.xtts.tts_to_file(model_name, text=text, file_path=output_path, speaker_wav=ref_tmp, language=os.environ.get('XTTS_LANG', 'en'))
                             try:
                                 os.remove(ref_tmp)
                             except Exception:
                                 pass
                         else:
                             print("ℹ️  Missing reference or text for XTTS; falling back to passthrough")
-                            sf.write(output_path, input_waveform.squeeze().numpy(), input_sr)
+                            self._passthrough(input_audio_path, output_path)
                     except Exception as e:
                         print(f"   XTTS failed: {e}")
-                        sf.write(output_path, input_waveform.squeeze().numpy(), input_sr)
+                        self._passthrough(input_audio_path, output_path)
             else:
                 # Default behavior: passthrough (placeholder)
-                sf.write(output_path, input_waveform.squeeze().numpy(), input_sr)
+                self._passthrough(input_audio_path, output_path)
 
             print("✅ Conversion complete")
             return {'success': True, 'output_path': output_path, 'mode': 'huggingface'}
@@ -424,6 +814,10 @@ class HuggingFaceRVCService:
             print(f"❌ Conversion failed: {str(e)}")
             return {'success': False, 'error': str(e)}
     
+    def _passthrough(self, input_path, output_path):
+        """Re-encode input as WAV block by block without loading it whole"""
+        convert_file_windowed(input_path, output_path, lambda window: window, mono=False)
+
     def _mock_conversion(self, input_path, output_path):
         """Mock conversion - just copy input to output"""
         print(f"🎭 Mock conversion")
@@ -436,12 +830,18 @@ class HuggingFaceRVCService:
     
     def delete_model(self, model_id):
         """Delete a voice model"""
-        if model_id not in self.models:
+        if not self.has_model(model_id):
             return {'success': False, 'error': 'Model not found'}
         
         try:
             model_path = self.models[model_id]['path']
-            if os.path.exists(model_path):
+            artifact_key = self.models[model_id].get('artifact')
+            self.residency.evict(model_id)
+            if self.speakers is not None:
+                self.speakers.remove(model_id)
+            if self.artifacts and artifact_key:
+                self.artifacts.delete(artifact_key)
+            elif os.path.exists(model_path):
                 os.remove(model_path)
             
             del self.models[model_id]
@@ -450,22 +850,182 @@ class HuggingFaceRVCService:
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
+    def warm_model(self, model_id):
+        """Load a voice's weights into memory ahead of a conversion"""
+        if not self.has_model(model_id):
+            return {'success': False, 'error': 'Model not found'}
+        try:
+            entry = self.residency.warm(model_id, self.model_path(model_id))
+            return {'success': True, 'resident': entry.describe()}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    def pin_model(self, model_id, pinned=True):
+        """Pin (or unpin) a voice so it is never evicted from memory"""
+        if not self.has_model(model_id):
+            return {'success': False, 'error': 'Model not found'}
+        try:
+            if not pinned:
+                self.residency.unpin(model_id)
+                return {'success': True, 'pinned': False}
+            entry = self.residency.pin(model_id, self.model_path(model_id))
+            return {'success': True, 'pinned': True, 'resident': entry.describe()}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
 # Initialize service
 service = HuggingFaceRVCService()
+admission = AdmissionController.from_env()
+renderer = ScriptRenderer.from_env(service, admission, TEMP_DIR) if RENDER_AVAILABLE else None
 
-# Routes
-@app.route('/health', methods=['GET'])
-def health():
-    """Health check endpoint"""
-    return jsonify({
+def admission_error(e: AdmissionRejected):
+    """Build the JSON rejection response (429 with Retry-After, 504, or 400 for an unknown backend)"""
+    response = jsonify({'success': False, 'error': str(e)})
+    response.status_code = e.status
+    if e.retry_after is not None:
+        response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+def health_status():
+    """Health payload shared by the Flask and ASGI front ends"""
+    return {
         'status': 'healthy',
         'mode': 'mock' if service.mock_mode else 'huggingface',
         'device': DEVICE if HF_AVAILABLE else 'cpu',
         'models_loaded': len(service.models),
         'hf_models': len(service.hf_models) if HF_AVAILABLE else 0,
         'xtts_available': service.xtts_available,
-        'hf_hub_available': HF_HUB_AVAILABLE
-    })
+        'xtts_cpu': service.xtts.config.to_dict() if service.xtts and DEVICE == 'cpu' else None,
+        'hf_hub_available': HF_HUB_AVAILABLE,
+        'residency': service.residency.stats(),
+        'onnx': service.engines['onnx'].stats() if service.engines['onnx'].available else None,
+        'batching': service.batcher.stats(),
+        'preprocess': service.preprocess.stats(),
+        'admission': admission.stats(),
+        'artifacts': service.artifacts.stats() if service.artifacts else None,
+        'speaker_index': service.speakers.stats() if service.speakers is not None else None,
+        'shard': service.sharding.stats() if service.sharding else None
+    }
+
+def shard_membership(action, node, headers):
+    """Apply a /shard/join or /shard/leave; the node that receives it first tells the others"""
+    sharding = service.sharding
+    if sharding is None:
+        return {'success': False, 'error': 'Sharding is not enabled (set SHARD_NODES)'}, 404
+    node = node or sharding.self_url
+    if not sharding.may_change(node, headers):
+        return {'success': False, 'error': 'Shard membership change not allowed'}, 403
+    forwarded = sharding.trusted(headers)
+    if action == 'leave' and not forwarded:
+        # Tell peers first, while node is still a member they will accept messages about
+        sharding.announce('leave', node)
+    changed = sharding.join(node) if action == 'join' else sharding.leave(node)
+    if action == 'join' and not forwarded:
+        sharding.announce('join', node)
+    return {'success': True, 'changed': changed, 'ring': sharding.stats()}, 200
+
+def models_listing():
+    """Model list payload shared by the Flask and ASGI front ends"""
+    models_list = []
+    for model_id, model_data in service.models.items():
+        models_list.append({
+            'id': model_id,
+            'name': model_data.get('name', model_id),
+            'status': model_data.get('status', 'unknown'),
+            'type': model_data.get('type', 'custom')
+        })
+    
+    return {
+        'success': True,
+        'models': models_list,
+        'count': len(models_list)
+    }
+
+def render_headers(timing: dict) -> dict:
+    """Response headers carrying a finished render's id and per-turn timing"""
+    headers = {'X-Render-Id': timing['render_id'], 'X-Render-Duration': f"{timing['duration']:.3f}"}
+    compact = timing_header(timing)
+    if compact:
+        headers['X-Render-Timing'] = compact
+    return headers
+
+# /convert/raw parameters travel in headers (values percent-encoded) instead of form fields
+RAW_PARAM_HEADERS = {
+    'model_id': 'X-Model-Id',
+    'backend': 'X-Backend',
+    'text': 'X-Text',
+    'hf_repo': 'X-HF-Repo',
+    'hf_revision': 'X-HF-Revision',
+    'engine': 'X-Engine',
+    'skip_silence': 'X-Skip-Silence',
+}
+RAW_CHUNK_BYTES = 64 * 1024
+
+def raw_params(headers) -> dict:
+    """convert_voice keyword arguments from /convert/raw request headers"""
+    params = {name: unquote(headers[header]) if headers.get(header) else None for name, header in RAW_PARAM_HEADERS.items()}
+    if params['skip_silence'] is not None:
+        params['skip_silence'] = params['skip_silence'].lower() not in ('0', 'false', 'no')
+    return params
+
+# Routes
+def request_voice_id():
+    """Voice a request is for, for shard routing (None for node-wide routes)"""
+    voice_id = path_voice_id(request.method, request.path)
+    if voice_id is None and request.method == 'POST':
+        voice_id = hinted_voice_id(request.path, request.headers, request.args)
+        if voice_id is None and request.path in BODY_VOICE_FIELDS:
+            # No hint: cache the body so it can be forwarded verbatim; form parsing reads the cache
+            request.get_data(cache=True)
+            voice_id = request.form.get(BODY_VOICE_FIELDS[request.path])
+    return voice_id
+
+@app.before_request
+def route_to_shard():
+    """Hand requests for voices owned by another node to that node"""
+    sharding = service.sharding
+    if sharding is None or sharding.trusted(request.headers):
+        # Forwarded by a peer: served here whoever owns it, so don't read the body to find out
+        return None
+    owner = sharding.route(request_voice_id(), request.headers)
+    if owner is None:
+        return None
+    path = request.full_path if request.query_string else request.path
+    if sharding.mode == 'redirect':
+        return redirect(sharding.redirect_url(owner, path), code=307)
+    body = request.get_data()
+    try:
+        status, headers, payload = sharding.forward(owner, request.method, path, request.headers, body)
+    except ShardUnavailable as e:
+        # Owner is down but not yet out of the ring: serve it here from the shared store
+        print(f"⚠️  {e}; serving locally")
+        g.shard_body = body
+        return None
+    except ShardFailed as e:
+        # The owner may have run it already; running it here too would duplicate the work
+        return jsonify({'success': False, 'error': str(e)}), 504
+    return Response(payload, status=status, headers=headers)
+
+@app.route('/health', methods=['GET'])
+def health():
+    """Health check endpoint"""
+    return jsonify(health_status())
+
+@app.route('/shard', methods=['GET'])
+def shard_ring():
+    """This node's view of the voice ring"""
+    if service.sharding is None:
+        return jsonify({'success': False, 'error': 'Sharding is not enabled (set SHARD_NODES)'}), 404
+    return jsonify({'success': True, **service.sharding.stats()})
+
+@app.route('/shard/<action>', methods=['POST'])
+def shard_member(action):
+    """Add (join) or remove (leave) a node; body {"node": url}, default this node"""
+    if action not in ('join', 'leave'):
+        return jsonify({'success': False, 'error': 'Unknown shard action'}), 404
+    data = request.get_json(silent=True) or {}
+    result, status = shard_membership(action, data.get('node'), request.headers)
+    return jsonify(result), status
 
 @app.route('/train', methods=['POST'])
 def train():
@@ -512,6 +1072,11 @@ def train():
 def convert():
     """Convert audio using a voice model"""
     try:
+        # Reject expired requests before reading the upload
+        deadline = parse_deadline(request.headers)
+        if deadline is not None and deadline <= time.time():
+            return jsonify({'success': False, 'error': 'Request deadline already passed'}), 504
+
         if 'audio' not in request.files:
             return jsonify({'success': False, 'error': 'No audio file provided'}), 400
         
@@ -521,17 +1086,32 @@ def convert():
         text = request.form.get('text')
         hf_repo = request.form.get('hf_repo')
         hf_revision = request.form.get('hf_revision')
+        engine = request.form.get('engine')
+        skip_silence = request.form.get('skip_silence')
+        if skip_silence is not None:
+            skip_silence = skip_silence.lower() not in ('0', 'false', 'no')
+        priority = parse_priority(request.headers.get(PRIORITY_HEADER) or request.form.get('priority'))
         
         if not model_id:
             return jsonify({'success': False, 'error': 'model_id is required'}), 400
         
-        # Save input audio
-        temp_input = os.path.join(TEMP_DIR, f"{model_id}_input.wav")
+        # Save input audio (unique per request so concurrent conversions don't collide)
+        request_tag = uuid.uuid4().hex[:8]
+        temp_input = os.path.join(TEMP_DIR, f"{model_id}_{request_tag}_input.wav")
         audio_file.save(temp_input)
         
-        # Convert
-        temp_output = os.path.join(TEMP_DIR, f"{model_id}_output.wav")
-        result = service.convert_voice(model_id, temp_input, temp_output, backend=backend, text=text, hf_repo=hf_repo, hf_revision=hf_revision)
+        # Convert once admitted for this backend/priority lane
+        temp_output = os.path.join(TEMP_DIR, f"{model_id}_{request_tag}_output.wav")
+        try:
+            with admission.admit(backend or 'rvc', priority, deadline):
+                result = service.convert_voice(model_id, temp_input, temp_output, backend=backend, text=text, hf_repo=hf_repo, hf_revision=hf_revision, engine=engine, skip_silence=skip_silence)
+        except AdmissionRejected as e:
+            print(f"🚦 Rejected conversion for {model_id}: {e}")
+            try:
+                os.remove(temp_input)
+            except Exception:
+                pass
+            return admission_error(e)
         
         # Schedule cleanup of temp files after response
         try:
@@ -555,7 +1135,11 @@ def convert():
             print(f"ℹ️  Could not register after_this_request cleanup: {e}")
 
         if result['success'] and os.path.exists(temp_output):
-            return send_file(temp_output, mimetype='audio/wav')
+            response = send_file(temp_output, mimetype='audio/wav')
+            if result.get('silence'):
+                response.headers['X-Silence-Skipped-Seconds'] = f"{result['silence']['skipped_seconds']:.3f}"
+                response.headers['X-Silence-Skipped-Ratio'] = f"{result['silence']['skipped_ratio']:.3f}"
+            return response
         else:
             # Ensure we cleanup on failure
             try:
@@ -571,23 +1155,175 @@ def convert():
         print(f"❌ Convert error: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/convert/raw', methods=['POST'])
+def convert_raw():
+    """Convert audio sent as the raw request body, with parameters in headers"""
+    deadline = parse_deadline(request.headers)
+    if deadline is not None and deadline <= time.time():
+        return jsonify({'success': False, 'error': 'Request deadline already passed'}), 504
+    params = raw_params(request.headers)
+    model_id = params.pop('model_id')
+    if not model_id:
+        return jsonify({'success': False, 'error': 'X-Model-Id header is required'}), 400
+    priority = parse_priority(request.headers.get(PRIORITY_HEADER))
+
+    request_tag = uuid.uuid4().hex[:8]
+    temp_input = os.path.join(RAW_SPOOL_DIR, f"rvc_{model_id}_{request_tag}_input.wav")
+    temp_output = os.path.join(RAW_SPOOL_DIR, f"rvc_{model_id}_{request_tag}_output.wav")
+    try:
+        # No multipart parsing: the body is copied through as it arrives
+        # (or from memory when shard routing already read it)
+        stream = io.BytesIO(g.shard_body) if 'shard_body' in g else request.stream
+        with open(temp_input, 'wb') as f:
+            received = 0
+            while True:
+                chunk = stream.read(RAW_CHUNK_BYTES)
+                if not chunk:
+                    break
+                f.write(chunk)
+                received += len(chunk)
+        if not received:
+            return jsonify({'success': False, 'error': 'Empty request body'}), 400
+
+        with admission.admit(params['backend'] or 'rvc', priority, deadline):
+            result = service.convert_voice(model_id, temp_input, temp_output, **params)
+        if not result['success'] or not os.path.exists(temp_output):
+            return jsonify(result), 500
+
+        # send_file holds an open handle, so the spool files can be unlinked below
+        response = send_file(temp_output, mimetype='audio/wav')
+        if result.get('silence'):
+            response.headers['X-Silence-Skipped-Seconds'] = f"{result['silence']['skipped_seconds']:.3f}"
+            response.headers['X-Silence-Skipped-Ratio'] = f"{result['silence']['skipped_ratio']:.3f}"
+        return response
+    except AdmissionRejected as e:
+        print(f"🚦 Rejected conversion for {model_id}: {e}")
+        return admission_error(e)
+    except Exception as e:
+        print(f"❌ Convert error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        for path in (temp_input, temp_output):
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except Exception as e:
+                print(f"⚠️  Failed to remove {path}: {e}")
+
+@app.route('/render/script', methods=['POST'])
+def render_script():
+    """Render a multi-speaker script into a single audio file (or stream)"""
+    if not RENDER_AVAILABLE:
+        return jsonify({'success': False, 'error': 'Script rendering unavailable (install soundfile and scipy)'}), 503
+
+    deadline = parse_deadline(request.headers)
+    if deadline is not None and deadline <= time.time():
+        return jsonify({'success': False, 'error': 'Request deadline already passed'}), 504
+    priority = parse_priority(request.headers.get(PRIORITY_HEADER) or request.form.get('priority'))
+
+    uploads = {}
+
+    def cleanup_uploads():
+        for path in uploads.values():
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except Exception as e:
+                print(f"⚠️  Failed to remove {path}: {e}")
+
+    try:
+        # JSON body for text-only scripts, multipart with a 'script' field when turns carry audio
+        if request.is_json:
+            data = request.get_json(silent=True)
+        else:
+            data = json.loads(request.form.get('script') or 'null')
+            request_tag = uuid.uuid4().hex[:8]
+            for name, upload in request.files.items():
+                ext = os.path.splitext(upload.filename or '')[1] or '.wav'
+                uploads[name] = os.path.join(TEMP_DIR, f"script_{request_tag}_{len(uploads)}{ext}")
+                upload.save(uploads[name])
+        script = parse_script(data, uploads)
+        stream = str(request.args.get('stream', (data or {}).get('stream', ''))).lower() in ('1', 'true', 'yes')
+
+        if stream:
+            if script['format'] != 'wav':
+                raise ScriptError('streaming is only supported for wav output')
+            render_id, chunks = renderer.stream(script, priority, deadline)
+
+            def generate():
+                try:
+                    yield from chunks
+                finally:
+                    cleanup_uploads()
+
+            return Response(stream_with_context(generate()), mimetype='audio/wav', headers={'X-Render-Id': render_id})
+
+        try:
+            path, timing = renderer.render(script, priority, deadline)
+        finally:
+            cleanup_uploads()
+
+        from flask import after_this_request
+
+        @after_this_request
+        def cleanup(response):
+            try:
+                os.remove(path)
+            except Exception as e:
+                print(f"⚠️  Failed to remove render output: {e}")
+            return response
+
+        response = send_file(path, mimetype=RENDER_FORMATS[script['format']][2])
+        response.headers.update(render_headers(timing))
+        return response
+    except AdmissionRejected as e:
+        cleanup_uploads()
+        return admission_error(e)
+    except (ScriptError, ValueError) as e:
+        cleanup_uploads()
+        return jsonify({'success': False, 'error': str(e)}), getattr(e, 'status', 400)
+    except Exception as e:
+        cleanup_uploads()
+        print(f"❌ Render error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/render/<render_id>', methods=['GET'])
+def get_render_timing(render_id):
+    """Per-turn timing of a recent render (needed for streamed renders)"""
+    timing = renderer.timing(render_id) if renderer else None
+    if not timing:
+        return jsonify({'success': False, 'error': 'Render not found'}), 404
+    return jsonify({'success': True, **timing})
+
 @app.route('/models', methods=['GET'])
 def get_models():
     """Get list of available models"""
-    models_list = []
-    for model_id, model_data in service.models.items():
-        models_list.append({
-            'id': model_id,
-            'name': model_data.get('name', model_id),
-            'status': model_data.get('status', 'unknown'),
-            'type': model_data.get('type', 'custom')
-        })
-    
-    return jsonify({
-        'success': True,
-        'models': models_list,
-        'count': len(models_list)
-    })
+    return jsonify(models_listing())
+
+@app.route('/models/similar', methods=['GET', 'POST'])
+def similar_models():
+    """Top-k cosine search over voice embeddings, by voice_id or uploaded sample"""
+    try:
+        k = max(1, min(int(request.values.get('k', '5')), 100))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'k must be an integer'}), 400
+    voice_id = request.values.get('voice_id')
+    if 'audio' in request.files:
+        temp_audio = os.path.join(TEMP_DIR, f"similar_{uuid.uuid4().hex[:8]}{os.path.splitext(request.files['audio'].filename or '')[1] or '.wav'}")
+        request.files['audio'].save(temp_audio)
+        try:
+            result = service.similar_voices(audio_path=temp_audio, k=k)
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        finally:
+            os.remove(temp_audio)
+    elif voice_id:
+        result = service.similar_voices(voice_id=voice_id, k=k)
+    else:
+        return jsonify({'success': False, 'error': 'voice_id or audio is required'}), 400
+    if result['success']:
+        return jsonify(result)
+    return jsonify(result), 404 if result.get('error') == 'Voice not indexed' else 500
 
 @app.route('/models/<model_id>', methods=['DELETE'])
 def delete_model(model_id):
@@ -598,6 +1334,24 @@ def delete_model(model_id):
     else:
         return jsonify(result), 404
 
+@app.route('/models/<model_id>/warm', methods=['POST'])
+def warm_model(model_id):
+    """Prefetch a voice model into memory"""
+    result = service.warm_model(model_id)
+    if result['success']:
+        return jsonify(result)
+    status = 404 if result.get('error') == 'Model not found' else 500
+    return jsonify(result), status
+
+@app.route('/models/<model_id>/pin', methods=['POST', 'DELETE'])
+def pin_model(model_id):
+    """Pin (POST) or unpin (DELETE) a voice model in memory"""
+    result = service.pin_model(model_id, pinned=request.method == 'POST')
+    if result['success']:
+        return jsonify(result)
+    status = 404 if result.get('error') == 'Model not found' else 500
+    return jsonify(result), status
+
 @app.route('/training-progress/<voice_id>', methods=['GET'])
 def get_training_progress(voice_id):
     """Get training progress for a specific voice"""
@@ -617,6 +1371,7 @@ def get_training_progress(voice_id):
         })
 
 if __name__ == '__main__':
+    port = int(os.environ.get('RVC_PORT', '5000'))
     print("\n" + "="*50)
     print("🎤 RVC Voice Cloning Service (Hugging Face Edition)")
     print("="*50)
@@ -625,7 +1380,18 @@ if __name__ == '__main__':
     print(f"   Models Directory: {WEIGHTS_DIR}")
     print(f"   Loaded Models: {len(service.models)}")
     print(f"   HF Models: {len(service.hf_models) if HF_AVAILABLE else 0}")
-    print(f"   Server running on http://localhost:5000")
+    print(f"   Server running on http://localhost:{port}")
+    unix_socket = os.environ.get('RVC_UNIX_SOCKET')
+    if unix_socket:
+        print(f"   Unix socket: {unix_socket}")
     print("="*50 + "\n")
-    
-    app.run(host='0.0.0.0', port=5000, debug=False, use_reloader=False)
+
+    if unix_socket:
+        # Same app on a Unix-domain socket for a co-located Node process; TCP stays up
+        from werkzeug.serving import make_server
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        unix_server = make_server(f"unix://{unix_socket}", 0, app, threaded=True)
+        threading.Thread(target=unix_server.serve_forever, daemon=True).start()
+
+    app.run(host='0.0.0.0', port=port, debug=False, use_reloader=False)
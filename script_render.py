@@ -0,0 +1,306 @@
+# Multi-Speaker Script Rendering
+# Renders a whole podcast script server-side: every turn (voice + text or
+# audio) goes through the normal conversion path in parallel, then turns are
+# loudness-matched and laid out on one timeline in NumPy, so a client makes a
+# single request instead of one /convert round trip per line.
+#
+# Script (JSON):
+#   {"turns": [{"voice_id": "host_a", "text": "Welcome back!"},
+#              {"voice_id": "host_b", "audio": "line2", "gap_ms": 150}],
+#    "gap_ms": 300, "sample_rate": 24000, "target_dbfs": -20, "format": "wav"}
+# Turn "audio" names an uploaded file field. Per-turn keys: backend, engine,
+# hf_repo, hf_revision, skip_silence, gap_ms (negative overlaps the previous turn).
+#
+# Env: RENDER_WORKERS (default 4), RENDER_MAX_TURNS (default 500)
+
+import json
+import os
+import struct
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import soundfile as sf
+
+from resampling import resample
+from silence import frame_energy_db
+
+FORMATS = {'wav': ('WAV', 'PCM_16', 'audio/wav'), 'flac': ('FLAC', 'PCM_16', 'audio/flac'),
+           'ogg': ('OGG', 'VORBIS', 'audio/ogg')}
+FADE_MS = 5.0
+MAX_GAIN_DB = 20.0
+PEAK_CEILING = 0.98
+WORDS_PER_SECOND = 2.8  # length of the stand-in input file for text turns
+RECENT_RENDERS = 64
+
+
+class ScriptError(ValueError):
+    """Invalid script, or a turn that failed to render"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_script(data: dict, uploads: Dict[str, str]) -> dict:
+    """Validate a script and apply defaults; uploads maps field name -> temp path"""
+    if not isinstance(data, dict) or not isinstance(data.get('turns'), list) or not data['turns']:
+        raise ScriptError('script.turns must be a non-empty list')
+    max_turns = int(os.getenv('RENDER_MAX_TURNS', '500'))
+    if len(data['turns']) > max_turns:
+        raise ScriptError(f'script has {len(data["turns"])} turns; the limit is {max_turns}')
+
+    fmt = str(data.get('format', 'wav')).lower()
+    if fmt not in FORMATS:
+        raise ScriptError(f'format must be one of {", ".join(FORMATS)}')
+    try:
+        script = {
+            'gap_ms': float(data.get('gap_ms', 300)),
+            'sample_rate': int(data.get('sample_rate', 24000)),
+            # null disables loudness matching
+            'target_dbfs': None if data.get('target_dbfs', -20.0) is None else float(data.get('target_dbfs', -20.0)),
+            'format': fmt,
+            'turns': [],
+        }
+    except (TypeError, ValueError) as e:
+        raise ScriptError(f'invalid script option: {e}')
+    if not 8000 <= script['sample_rate'] <= 96000:
+        raise ScriptError('sample_rate must be between 8000 and 96000')
+
+    for i, turn in enumerate(data['turns']):
+        if not isinstance(turn, dict) or not turn.get('voice_id'):
+            raise ScriptError(f'turn {i}: voice_id is required')
+        if not turn.get('text') and not turn.get('audio'):
+            raise ScriptError(f'turn {i}: text or audio is required')
+        if turn.get('audio') and turn['audio'] not in uploads:
+            raise ScriptError(f'turn {i}: no uploaded file named {turn["audio"]!r}')
+        if not turn.get('audio') and turn.get('backend') not in (None, 'xtts'):
+            raise ScriptError(f'turn {i}: text-only turns need the xtts backend')
+        script['turns'].append({
+            'voice_id': str(turn['voice_id']),
+            'text': turn.get('text'),
+            'audio_path': uploads.get(turn['audio']) if turn.get('audio') else None,
+            'backend': turn.get('backend') or ('xtts' if not turn.get('audio') else None),
+            'engine': turn.get('engine'),
+            'hf_repo': turn.get('hf_repo'),
+            'hf_revision': turn.get('hf_revision'),
+            'skip_silence': turn.get('skip_silence'),
+            'gap_ms': float(turn['gap_ms']) if turn.get('gap_ms') is not None else script['gap_ms'],
+        })
+    return script
+
+
+def active_level_dbfs(y: np.ndarray, sr: int) -> Optional[float]:
+    """Mean power of the frames within 30 dB of the loudest one (speech, not pauses)"""
+    if len(y) == 0:
+        return None
+    frame = max(1, int(0.05 * sr))
+    energy = frame_energy_db(y, frame, frame)
+    active = energy[energy > max(energy.max() - 30.0, -70.0)]
+    if len(active) == 0:
+        return None
+    return float(10.0 * np.log10(np.mean(np.power(10.0, active / 10.0))))
+
+
+def match_loudness(y: np.ndarray, sr: int, target_dbfs: Optional[float]) -> Tuple[np.ndarray, float]:
+    """Scale a turn to the target active level, without pushing peaks past the ceiling"""
+    level = active_level_dbfs(y, sr) if target_dbfs is not None else None
+    if level is None:
+        return y, 0.0
+    gain_db = float(np.clip(target_dbfs - level, -MAX_GAIN_DB, MAX_GAIN_DB))
+    gain = 10.0 ** (gain_db / 20.0)
+    peak = float(np.max(np.abs(y))) * gain
+    if peak > PEAK_CEILING:
+        gain *= PEAK_CEILING / peak
+        gain_db = 20.0 * np.log10(gain)
+    return (y * np.float32(gain)).astype(np.float32, copy=False), gain_db
+
+
+def _fade_edges(y: np.ndarray, sr: int) -> np.ndarray:
+    n = min(len(y) // 2, int(sr * FADE_MS / 1000.0))
+    if n > 0:
+        ramp = np.linspace(0.0, 1.0, n, dtype=np.float32)
+        y[:n] *= ramp
+        y[-n:] *= ramp[::-1]
+    return y
+
+
+def _stream_wav_header(sr: int) -> bytes:
+    """Mono 16-bit PCM header with unknown (maximal) sizes for streamed output"""
+    return (b'RIFF' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE'
+            + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, 1, sr, sr * 2, 2, 16)
+            + b'data' + struct.pack('<I', 0xFFFFFFFF))
+
+
+def _pcm16(y: np.ndarray) -> bytes:
+    return (np.clip(y, -1.0, 1.0) * 32767.0).astype('<i2').tobytes()
+
+
+class ScriptRenderer:
+    """Renders scripts turn-by-turn on a shared pool and mixes them into one track"""
+
+    def __init__(self, service, admission, temp_dir: str, workers: int = 4):
+        self.service = service
+        self.admission = admission
+        self.temp_dir = temp_dir
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='render')
+        self._recent = OrderedDict()  # render id -> timing, for streamed renders
+
+    @classmethod
+    def from_env(cls, service, admission, temp_dir: str) -> 'ScriptRenderer':
+        return cls(service, admission, temp_dir, workers=int(os.getenv('RENDER_WORKERS', '4')))
+
+    def timing(self, render_id: str) -> Optional[dict]:
+        return self._recent.get(render_id)
+
+    def _remember(self, render_id: str, timing: dict):
+        self._recent[render_id] = timing
+        while len(self._recent) > RECENT_RENDERS:
+            self._recent.popitem(last=False)
+
+    def _placeholder_input(self, path: str, text: str, sr: int):
+        """Silent input sized to the text; convert_voice wants an input file even for XTTS"""
+        seconds = max(0.5, len((text or '').split()) / WORDS_PER_SECOND)
+        sf.write(path, np.zeros(int(seconds * sr), dtype=np.float32), sr)
+
+    def _render_turn(self, render_id: str, index: int, turn: dict, sr: int, priority: str,
+                     deadline: Optional[float]) -> Tuple[np.ndarray, dict]:
+        start = time.perf_counter()
+        tag = f"render_{render_id}_{index:04d}"
+        input_path = turn['audio_path']
+        placeholder = None
+        if input_path is None:
+            placeholder = input_path = os.path.join(self.temp_dir, f"{tag}_input.wav")
+            self._placeholder_input(placeholder, turn['text'], sr)
+        output_path = os.path.join(self.temp_dir, f"{tag}_output.wav")
+        try:
+            with self.admission.admit(turn['backend'] or 'rvc', priority, deadline):
+                result = self.service.convert_voice(
+                    turn['voice_id'], input_path, output_path, backend=turn['backend'], text=turn['text'],
+                    hf_repo=turn['hf_repo'], hf_revision=turn['hf_revision'], engine=turn['engine'],
+                    skip_silence=turn['skip_silence'],
+                )
+            if not result.get('success') or not os.path.exists(output_path):
+                raise ScriptError(f"turn {index} ({turn['voice_id']}): {result.get('error', 'no output')}", 500)
+            data, turn_sr = sf.read(output_path, dtype='float32', always_2d=True)
+        finally:
+            for path in (placeholder, output_path):
+                if path and os.path.exists(path):
+                    os.remove(path)
+        y = resample(data.mean(axis=1), turn_sr, sr)
+        return y, {'render_ms': round((time.perf_counter() - start) * 1000.0, 1),
+                   'mode': result.get('engine') or result.get('mode')}
+
+    def _submit(self, render_id: str, script: dict, priority: str, deadline: Optional[float]) -> list:
+        sr = script['sample_rate']
+        if not getattr(self.service, 'xtts_available', False) and any(t['audio_path'] is None for t in script['turns']):
+            # Without TTS a text turn would come back as the silent stand-in input
+            raise ScriptError('text turns need XTTS, which is not installed on this server', 503)
+        voices = {t['voice_id'] for t in script['turns']}
+        # Load each voice once up front so parallel turns share the resident copy
+        cold = [v for v in voices if v in self.service.models and not self.service.residency.is_resident(v)]
+        for _ in self.pool.map(self.service.warm_model, cold):
+            pass
+        return [self.pool.submit(self._render_turn, render_id, i, turn, sr, priority, deadline)
+                for i, turn in enumerate(script['turns'])]
+
+    def _place(self, index: int, turn: dict, y: np.ndarray, meta: dict, cursor: int, sr: int,
+               target_dbfs: Optional[float], allow_overlap: bool) -> Tuple[np.ndarray, int, dict]:
+        y, gain_db = match_loudness(y, sr, target_dbfs)
+        y = _fade_edges(y, sr)
+        gap = int(turn['gap_ms'] * sr / 1000.0) if index > 0 else 0
+        if not allow_overlap:
+            gap = max(gap, 0)
+        start = max(0, cursor + gap)
+        entry = {'index': index, 'voice_id': turn['voice_id'], 'start': round(start / sr, 3),
+                 'end': round((start + len(y)) / sr, 3), 'gain_db': round(gain_db, 2), **meta}
+        return y, start, entry
+
+    def render(self, script: dict, priority: str = 'interactive',
+               deadline: Optional[float] = None) -> Tuple[str, dict]:
+        """Render the whole script; returns (encoded temp file path, timing)"""
+        render_id = uuid.uuid4().hex[:12]
+        sr = script['sample_rate']
+        started = time.perf_counter()
+        futures = self._submit(render_id, script, priority, deadline)
+        try:
+            rendered = [f.result() for f in futures]
+        except Exception:
+            for f in futures:
+                f.cancel()
+            raise
+
+        placed, turns, cursor = [], [], 0
+        for i, (turn, (y, meta)) in enumerate(zip(script['turns'], rendered)):
+            y, start, entry = self._place(i, turn, y, meta, cursor, sr, script['target_dbfs'], allow_overlap=True)
+            placed.append((start, y))
+            turns.append(entry)
+            cursor = start + len(y)
+
+        mix = np.zeros(max((s + len(y) for s, y in placed), default=0), dtype=np.float32)
+        for start, y in placed:
+            mix[start:start + len(y)] += y
+        peak = float(np.max(np.abs(mix))) if len(mix) else 0.0
+        if peak > 1.0:  # overlapping turns can sum past full scale
+            mix /= peak
+
+        container, subtype, _ = FORMATS[script['format']]
+        path = os.path.join(self.temp_dir, f"render_{render_id}.{script['format']}")
+        sf.write(path, mix, sr, format=container, subtype=subtype)
+        timing = {'render_id': render_id, 'duration': round(len(mix) / sr, 3),
+                  'render_ms': round((time.perf_counter() - started) * 1000.0, 1), 'turns': turns}
+        self._remember(render_id, timing)
+        return path, timing
+
+    def stream(self, script: dict, priority: str = 'interactive',
+               deadline: Optional[float] = None) -> Tuple[str, Iterator[bytes]]:
+        """Start rendering and return (render id, WAV byte iterator)
+
+        Turns are emitted in script order as soon as each one (and all before
+        it) is ready, so playback can begin while later turns still render.
+        Overlaps (negative gaps) are not possible in a stream and become 0.
+        Timing is available from timing(render_id) once the stream finishes;
+        a failed turn ends the stream early and leaves 'complete' false.
+        """
+        render_id = uuid.uuid4().hex[:12]
+        sr = script['sample_rate']
+        futures = self._submit(render_id, script, priority, deadline)
+
+        def generate():
+            started = time.perf_counter()
+            turns, cursor = [], 0
+            try:
+                yield _stream_wav_header(sr)
+                for i, (turn, future) in enumerate(zip(script['turns'], futures)):
+                    try:
+                        y, meta = future.result()
+                    except Exception as e:
+                        # Stop rather than skip: later turns would land early and the timeline would drift
+                        print(f"⚠️  Render {render_id} turn {i} failed; ending stream: {e}")
+                        turns.append({'index': i, 'voice_id': turn['voice_id'], 'error': str(e)})
+                        break
+                    y, start, entry = self._place(i, turn, y, meta, cursor, sr, script['target_dbfs'], allow_overlap=False)
+                    if start > cursor:
+                        yield _pcm16(np.zeros(start - cursor, dtype=np.float32))
+                    yield _pcm16(y)
+                    turns.append(entry)
+                    cursor = start + len(y)
+            finally:
+                for f in futures:
+                    f.cancel()
+                self._remember(render_id, {'render_id': render_id, 'duration': round(cursor / sr, 3),
+                                           'render_ms': round((time.perf_counter() - started) * 1000.0, 1),
+                                           'turns': turns,
+                                           'complete': sum('error' not in t for t in turns) == len(futures)})
+
+        return render_id, generate()
+
+
+def timing_header(timing: dict, limit: int = 8192) -> Optional[str]:
+    """Per-turn [index, voice_id, start, end] JSON for a response header, or None if too large"""
+    compact = json.dumps([[t['index'], t['voice_id'], t['start'], t['end']] for t in timing['turns']],
+                         separators=(',', ':'))
+    return compact if len(compact) <= limit else None
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Time f0 extraction per method and the cache-hit path for a repeated input.
+
+Usage:
+  python scripts/bench_f0.py [--seconds 30] [--repeats 3]
+
+A synthetic voiced signal (harmonic glide with vibrato, plus noise and pauses)
+is written to a temp WAV. Each installed extractor (yin always; harvest with
+pyworld; crepe with torchcrepe) is timed on it and its median pitch error
+against the known curve reported. The cached path times a second lookup of
+the same file through F0Cache, which is what re-conversions pay.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import soundfile as sf
+
+from dataset_prep import decode
+from f0 import CREPE_AVAILABLE, F0_SR, HOP, PYWORLD_AVAILABLE, F0Cache, extract_f0
+
+
+def synthetic_voice(seconds: float, sr: int):
+    """Returns (audio, true f0 per sample); every third second is a pause"""
+    t = np.arange(int(seconds * sr)) / sr
+    f0 = 140.0 + 40.0 * np.sin(2 * np.pi * 0.2 * t) + 3.0 * np.sin(2 * np.pi * 5.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    audio = sum(np.sin(k * phase) / k for k in range(1, 8)) * 0.2
+    voiced = (t % 3.0) < 2.0
+    audio = audio * voiced + np.random.default_rng(0).standard_normal(len(t)) * 0.005
+    return audio.astype(np.float32), np.where(voiced, f0, 0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--sr", type=int, default=44100)
+    args = parser.parse_args()
+
+    audio, truth = synthetic_voice(args.seconds, args.sr)
+    methods = ['yin'] + (['harvest'] if PYWORLD_AVAILABLE else []) + (['crepe'] if CREPE_AVAILABLE else [])
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'input.wav')
+        sf.write(path, audio, args.sr)
+        for method in methods:
+            times = []
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                f0 = extract_f0(audio, args.sr, method)
+                times.append(time.perf_counter() - start)
+            frame_truth = np.interp(np.arange(len(f0)) * HOP / F0_SR, np.arange(len(truth)) / args.sr, truth)
+            both = (f0 > 0) & (frame_truth > 0)
+            cents = np.abs(1200.0 * np.log2(f0[both] / frame_truth[both])) if both.any() else np.array([np.nan])
+            row = {
+                'method': method,
+                'seconds': min(times),
+                'realtime_factor': args.seconds / min(times),
+                'median_error_cents': float(np.median(cents)),
+                'voicing_agreement': float(((f0 > 0) == (frame_truth > 0)).mean()),
+            }
+            results.append(row)
+            print(f"  {method:8s} {row['seconds'] * 1000:.0f} ms ({row['realtime_factor']:.0f}x realtime), "
+                  f"median error {row['median_error_cents']:.1f} cents")
+
+        cache = F0Cache(os.path.join(tmp, 'cache'), 64 * 1024 * 1024)
+        start = time.perf_counter()
+        cache.curve(path, decode, 'yin')
+        miss_s = time.perf_counter() - start
+        start = time.perf_counter()
+        _, _, hit = cache.curve(path, decode, 'yin')
+        hit_s = time.perf_counter() - start
+        print(f"  cache: miss {miss_s * 1000:.0f} ms (decode + yin), hit {hit_s * 1000:.1f} ms (hash + load)")
+
+    print(json.dumps({'input_seconds': args.seconds, 'results': results,
+                      'cache_miss_ms': miss_s * 1000.0, 'cache_hit_ms': hit_s * 1000.0, 'cache_hit': hit}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
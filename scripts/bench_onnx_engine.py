@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Compare latency and memory of the eager TorchScript path and ONNX Runtime.
+
+Usage:
+  python scripts/bench_onnx_engine.py [--repo-path <dir>] [--seconds 5] [--runs 20] [--threads 4]
+
+Without --repo-path a small convolutional stand-in model is generated so the
+engines can be compared on any machine. Each engine runs in its own process
+so peak RSS is measured independently.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+
+def build_demo_repo(path: Path):
+    import torch
+
+    class DemoVC(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.net = torch.nn.Sequential(
+                torch.nn.Conv1d(1, 64, 9, padding=4), torch.nn.GELU(),
+                torch.nn.Conv1d(64, 64, 9, padding=4), torch.nn.GELU(),
+                torch.nn.Conv1d(64, 1, 9, padding=4),
+            )
+
+        def forward(self, waveform):
+            return self.net(waveform.unsqueeze(1)).squeeze(1)
+
+    path.mkdir(parents=True, exist_ok=True)
+    torch.jit.script(DemoVC().eval()).save(str(path / 'model.pt'))
+    (path / 'config.json').write_text(json.dumps({'sample_rate': 16000}))
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_engine(engine_name, repo_path, seconds, runs, threads, cache_dir):
+    from inference_engines import TorchEngine, OnnxEngine, repo_sample_rate
+
+    if engine_name == 'onnx':
+        engine = OnnxEngine(cache_dir, intra_op_threads=threads, inter_op_threads=1)
+    else:
+        import torch
+        if threads:
+            torch.set_num_threads(threads)
+        engine = TorchEngine()
+
+    sr = repo_sample_rate(repo_path)
+    waveform = (np.random.default_rng(0).standard_normal(int(seconds * sr)) * 0.1).astype(np.float32)
+    baseline_rss = peak_rss_mb()
+
+    start = time.perf_counter()
+    engine.run('bench/model', None, repo_path, waveform)
+    first_call = time.perf_counter() - start
+
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        engine.run('bench/model', None, repo_path, waveform)
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        'engine': engine_name,
+        'first_call_s': first_call,
+        'p50_s': float(np.percentile(latencies, 50)),
+        'p95_s': float(np.percentile(latencies, 95)),
+        'rtf_p50': float(np.percentile(latencies, 50)) / seconds,
+        'peak_rss_mb': peak_rss_mb(),
+        'rss_growth_mb': peak_rss_mb() - baseline_rss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repo-path", help="Repo dir with model.pt (TorchScript) and/or model.onnx")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Input audio length")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--engine", choices=['torch', 'onnx'], help=argparse.SUPPRESS)
+    parser.add_argument("--cache-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.engine:
+        result = run_engine(args.engine, args.repo_path, args.seconds, args.runs, args.threads, args.cache_dir)
+        print(json.dumps(result))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repo_path = args.repo_path
+        if not repo_path:
+            repo_path = os.path.join(tmp, 'demo_repo')
+            build_demo_repo(Path(repo_path))
+        cache_dir = os.path.join(tmp, 'onnx')
+
+        results = []
+        # onnx runs twice: the first includes export, the second hits the graph cache
+        for engine_name in ('torch', 'onnx', 'onnx'):
+            cmd = [sys.executable, __file__, '--engine', engine_name, '--repo-path', repo_path,
+                   '--seconds', str(args.seconds), '--runs', str(args.runs), '--cache-dir', cache_dir]
+            if args.threads:
+                cmd += ['--threads', str(args.threads)]
+            out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+            results.append(json.loads(out.strip().splitlines()[-1]))
+        results[1]['engine'] = 'onnx (export)'
+        results[2]['engine'] = 'onnx (cached)'
+
+    print(json.dumps({'seconds': args.seconds, 'runs': args.runs, 'results': results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark the cached polyphase resampler against librosa.resample.
+
+Usage:
+  python scripts/bench_resampling.py [--seconds 30] [--channels 2] [--runs 5]
+
+For each common rate pair this reports wall time for:
+- resampling: one vectorized call over all channels (kernel cache warm)
+- streaming:  StreamingResampler over 1 s blocks
+- librosa:    librosa.resample (default res_type) over all channels
+and accuracy as SNR (dB) of each result against a band-limited FFT reference.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from scipy import signal
+
+from resampling import resample, StreamingResampler, get_kernel
+
+RATE_PAIRS = [(44100, 16000), (48000, 16000), (44100, 22050), (48000, 22050), (44100, 40000), (48000, 40000)]
+
+
+def test_signal(sr: int, seconds: float, channels: int) -> np.ndarray:
+    """Sum of tones below 7 kHz so every target rate can represent it exactly"""
+    t = np.arange(int(sr * seconds)) / sr
+    rng = np.random.default_rng(0)
+    x = np.zeros((channels, len(t)))
+    for c in range(channels):
+        for f in rng.uniform(80, 7000, size=8):
+            x[c] += 0.1 * np.sin(2 * np.pi * f * t + rng.uniform(0, 2 * np.pi))
+    return x.astype(np.float32)
+
+
+def snr_db(ref: np.ndarray, est: np.ndarray) -> float:
+    n = min(ref.shape[-1], est.shape[-1])
+    # Ignore filter edge effects at both ends
+    edge = n // 20
+    ref, est = ref[..., edge:n - edge], est[..., edge:n - edge]
+    noise = np.sum((ref - est) ** 2)
+    return float(10 * np.log10(np.sum(ref ** 2) / max(noise, 1e-20)))
+
+
+def timed(fn, runs):
+    best, result = float('inf'), None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    try:
+        import librosa
+    except Exception:
+        librosa = None
+        print("librosa not installed; skipping librosa comparison")
+
+    rows = []
+    for src, dst in RATE_PAIRS:
+        x = test_signal(src, args.seconds, args.channels)
+        reference = signal.resample(x, int(round(x.shape[-1] * dst / src)), axis=-1)
+
+        start = time.perf_counter()
+        get_kernel(src, dst)
+        kernel_s = time.perf_counter() - start
+
+        ours_s, ours = timed(lambda: resample(x, src, dst, axis=-1), args.runs)
+
+        def stream():
+            rs = StreamingResampler(src, dst)
+            block = src
+            parts = [rs.process(x.T[i:i + block]) for i in range(0, x.shape[-1], block)]
+            parts.append(rs.flush())
+            return np.concatenate(parts, axis=0).T
+        stream_s, streamed = timed(stream, args.runs)
+
+        row = {
+            'pair': f'{src}->{dst}',
+            'kernel_design_ms': kernel_s * 1000,
+            'resampling_ms': ours_s * 1000,
+            'streaming_ms': stream_s * 1000,
+            'resampling_snr_db': snr_db(reference, ours),
+            'streaming_max_abs_diff': float(np.max(np.abs(streamed - ours))),
+        }
+        if librosa is not None:
+            librosa_s, theirs = timed(lambda: librosa.resample(x, orig_sr=src, target_sr=dst), args.runs)
+            row['librosa_ms'] = librosa_s * 1000
+            row['librosa_snr_db'] = snr_db(reference, theirs)
+            row['speedup_vs_librosa'] = librosa_s / ours_s
+        rows.append(row)
+
+    print(json.dumps({'seconds': args.seconds, 'channels': args.channels, 'results': rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Compare Flask and ASGI front ends while many slow clients are uploading.
+
+Usage:
+  python scripts/bench_slow_clients.py [--servers flask,gunicorn,asgi] [--slow 32] [--fast 4] [--seconds 20]
+
+Each server is started locally (mock/passthrough mode unless HF deps are
+installed). `--slow` clients trickle a large /convert upload at `--slow-kbps`
+while `--fast` clients send small /convert requests back to back. Reported:
+fast-request throughput and p50/p95 latency, i.e. how much real work gets
+done while slow uploads are in flight.
+"""
+
+import argparse
+import http.client
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+import wave
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 'gunicorn' runs the Flask app with a fixed pool of sync workers, as most
+# production WSGI deployments do; the dev server spawns a thread per request.
+SERVERS = {
+    'flask': lambda port: [sys.executable, str(ROOT / 'rvc_service_hf.py')],
+    'gunicorn': lambda port: [sys.executable, '-m', 'gunicorn', '-w', '4', '-b', f'127.0.0.1:{port}', 'rvc_service_hf:app'],
+    'asgi': lambda port: [sys.executable, str(ROOT / 'asgi_app.py')],
+}
+
+
+def small_wav(seconds=0.5, sr=16000) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sr)
+        w.writeframes(b'\x00\x00' * int(seconds * sr))
+    return buf.getvalue()
+
+
+def multipart(fields: dict, audio: bytes):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="audio"; filename="in.wav"\r\n'
+                 f'Content-Type: audio/wav\r\n\r\n'.encode() + audio + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def wait_for_health(port: int, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f'Server on port {port} did not become healthy')
+
+
+def slow_client(port, body, content_type, kbps, stop):
+    """Send headers, then trickle the body until done or stopped"""
+    while not stop.is_set():
+        try:
+            sock = socket.create_connection(('127.0.0.1', port), timeout=60)
+            sock.sendall((f'POST /convert HTTP/1.1\r\nHost: localhost\r\nContent-Type: {content_type}\r\n'
+                          f'Content-Length: {len(body)}\r\nX-Priority: batch\r\n\r\n').encode())
+            chunk = max(1, int(kbps * 1024 / 10))
+            for i in range(0, len(body), chunk):
+                if stop.is_set():
+                    break
+                sock.sendall(body[i:i + chunk])
+                time.sleep(0.1)
+            sock.close()
+        except OSError:
+            time.sleep(0.1)
+
+
+def fast_client(port, body, content_type, stop, latencies, errors):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            conn.request('POST', '/convert', body=body, headers={'Content-Type': content_type, 'X-Priority': 'interactive'})
+            response = conn.getresponse()
+            response.read()
+            if response.status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors.append(response.status)
+        except OSError as e:
+            errors.append(str(e))
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100.0 * len(values)))]
+
+
+def bench_server(name, port, args):
+    env = dict(os.environ, RVC_PORT=str(port))
+    proc = subprocess.Popen(SERVERS[name](port), cwd=str(ROOT), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_health(port)
+        big_body, big_type = multipart({'model_id': 'bench'}, b'\x00' * (args.slow_mb * 1024 * 1024))
+        small_body, small_type = multipart({'model_id': 'bench'}, small_wav())
+
+        stop = threading.Event()
+        latencies, errors = [], []
+        threads = [threading.Thread(target=slow_client, args=(port, big_body, big_type, args.slow_kbps, stop), daemon=True)
+                   for _ in range(args.slow)]
+        for t in threads:
+            t.start()
+        time.sleep(1.0)  # let slow uploads occupy the server first
+
+        fast = [threading.Thread(target=fast_client, args=(port, small_body, small_type, stop, latencies, errors), daemon=True)
+                for _ in range(args.fast)]
+        for t in fast:
+            t.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for t in fast:
+            t.join(timeout=30)
+
+        return {
+            'server': name,
+            'fast_requests': len(latencies),
+            'fast_rps': len(latencies) / args.seconds,
+            'p50_ms': percentile(latencies, 50) and percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) and percentile(latencies, 95) * 1000,
+            'errors': len(errors),
+        }
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--servers", default="flask,asgi", help="Comma list of flask, gunicorn, asgi")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--slow", type=int, default=32, help="Concurrent slow uploaders")
+    parser.add_argument("--slow-mb", type=int, default=20, help="Slow upload size (MB)")
+    parser.add_argument("--slow-kbps", type=float, default=64.0, help="Slow upload rate per client")
+    parser.add_argument("--fast", type=int, default=4, help="Concurrent fast clients")
+    parser.add_argument("--seconds", type=float, default=20.0)
+    args = parser.parse_args()
+
+    results = []
+    for i, name in enumerate(s.strip() for s in args.servers.split(',') if s.strip()):
+        print(f"⏱️  Benchmarking {name}...")
+        results.append(bench_server(name, args.port + i, args))
+
+    print(json.dumps({'slow_clients': args.slow, 'fast_clients': args.fast, 'results': results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Measure speaker index update and top-k query latency as the voice count grows.
+
+Usage:
+  python scripts/bench_speaker_index.py [--sizes 1000,10000,100000] [--queries 200] [--k 5]
+
+Random unit vectors stand in for embeddings (search cost doesn't depend on
+their content). For each size the index is filled in a temp dir, then
+queries, deletes and re-adds are timed. One real embedding of 10 s of audio
+is timed as well, since that is the per-train cost.
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from speaker_index import SpeakerEmbedder, SpeakerIndex
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000.0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma list of index sizes")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    embedder = SpeakerEmbedder('mfcc')
+    audio = (rng.standard_normal(16000 * 10) * 0.1).astype(np.float32)
+    start = time.perf_counter()
+    embedder.embed(audio, 16000)
+    embed_ms = (time.perf_counter() - start) * 1000.0
+
+    results = []
+    for size in [int(s) for s in args.sizes.split(',') if s.strip()]:
+        with tempfile.TemporaryDirectory() as tmp:
+            index = SpeakerIndex(tmp, embedder)
+            vectors = rng.standard_normal((size, index.dim)).astype(np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            start = time.perf_counter()
+            for i, vec in enumerate(vectors):
+                index.upsert(f"voice_{i}", vec)
+            fill_s = time.perf_counter() - start
+
+            query_times = []
+            for vec in vectors[rng.integers(0, size, args.queries)]:
+                t = time.perf_counter()
+                index.query(vec, args.k)
+                query_times.append(time.perf_counter() - t)
+
+            update_times = []
+            for i in rng.integers(0, size, min(100, size)):
+                t = time.perf_counter()
+                index.remove(f"voice_{i}")
+                index.upsert(f"voice_{i}", vectors[i])
+                update_times.append(time.perf_counter() - t)
+
+            row = {
+                'voices': size,
+                'backend': index.stats()['backend'],
+                'fill_per_voice_ms': fill_s / size * 1000.0,
+                'query_p50_ms': percentile_ms(query_times, 50),
+                'query_p99_ms': percentile_ms(query_times, 99),
+                'delete_readd_p50_ms': percentile_ms(update_times, 50),
+            }
+            results.append(row)
+            print(f"  {size} voices: query p50={row['query_p50_ms']:.2f} ms, p99={row['query_p99_ms']:.2f} ms")
+
+    print(json.dumps({'embed_10s_ms': embed_ms, 'k': args.k, 'results': results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Compare per-request overhead of the Node -> Python transports for small segments.
+
+Usage:
+  python scripts/bench_transport.py [--server flask|asgi] [--requests 300] [--seconds 0.5]
+
+Starts the service locally with RVC_UNIX_SOCKET set (mock/passthrough mode
+unless HF deps are installed), then sends the same short WAV repeatedly via:
+- multipart: POST /convert, multipart/form-data over TCP (the current path)
+- raw-tcp:   POST /convert/raw, application/octet-stream over TCP
+- raw-unix:  POST /convert/raw over the Unix-domain socket
+Requests are sequential on a keep-alive connection where the server allows it,
+so the numbers are transport + parsing + spooling overhead around a no-op
+conversion. Reported: p50/p95/mean latency and requests/s per transport.
+"""
+
+import argparse
+import http.client
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+import wave
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SERVERS = {
+    'flask': [sys.executable, str(ROOT / 'rvc_service_hf.py')],
+    'asgi': [sys.executable, str(ROOT / 'asgi_app.py')],
+}
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float = 30):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+def small_wav(seconds: float, sr: int = 16000) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sr)
+        w.writeframes(b'\x00\x00' * int(seconds * sr))
+    return buf.getvalue()
+
+
+def multipart(fields: dict, audio: bytes):
+    boundary = uuid.uuid4().hex
+    parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode()
+             for k, v in fields.items()]
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="audio"; filename="in.wav"\r\n'
+                 f'Content-Type: audio/wav\r\n\r\n'.encode() + audio + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def wait_for_health(port: int, unix_path: str, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200 and os.path.exists(unix_path):
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f'Server on port {port} did not become healthy')
+
+
+def run_transport(name: str, make_conn, path: str, body: bytes, headers: dict, n: int) -> dict:
+    latencies, errors = [], 0
+    conn = make_conn()
+    for _ in range(n):
+        start = time.perf_counter()
+        try:
+            conn.request('POST', path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+            if response.getheader('Connection', '').lower() == 'close':
+                conn.close()
+                conn = make_conn()
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = make_conn()
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        'transport': name,
+        'requests': n,
+        'errors': errors,
+        'p50_ms': latencies[len(latencies) // 2] * 1000.0,
+        'p95_ms': latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000.0,
+        'mean_ms': total / n * 1000.0,
+        'rps': n / total if total else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--server", choices=sorted(SERVERS), default="flask")
+    parser.add_argument("--port", type=int, default=5066)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--seconds", type=float, default=0.5, help="Segment length")
+    parser.add_argument("--warmup", type=int, default=20)
+    args = parser.parse_args()
+
+    audio = small_wav(args.seconds)
+    mp_body, mp_type = multipart({'model_id': 'bench'}, audio)
+    raw_headers = {'Content-Type': 'application/octet-stream', 'X-Model-Id': 'bench'}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        unix_path = os.path.join(tmp, 'rvc.sock')
+        env = dict(os.environ, RVC_PORT=str(args.port), RVC_UNIX_SOCKET=unix_path)
+        proc = subprocess.Popen(SERVERS[args.server], cwd=str(ROOT), env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_health(args.port, unix_path)
+            tcp = lambda: http.client.HTTPConnection('127.0.0.1', args.port, timeout=30)
+            uds = lambda: UnixHTTPConnection(unix_path)
+            cases = [
+                ('multipart', tcp, '/convert', mp_body, {'Content-Type': mp_type}),
+                ('raw-tcp', tcp, '/convert/raw', audio, raw_headers),
+                ('raw-unix', uds, '/convert/raw', audio, raw_headers),
+            ]
+            results = []
+            for name, make_conn, path, body, headers in cases:
+                run_transport(name, make_conn, path, body, headers, args.warmup)
+                row = run_transport(name, make_conn, path, body, headers, args.requests)
+                results.append(row)
+                print(f"  {name:9s} p50={row['p50_ms']:.2f} ms p95={row['p95_ms']:.2f} ms "
+                      f"({row['rps']:.0f} req/s, {row['errors']} errors)")
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    print(json.dumps({'server': args.server, 'segment_seconds': args.seconds,
+                      'segment_bytes': len(audio), 'results': results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
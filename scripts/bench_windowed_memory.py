@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Measure peak RSS of whole-file vs windowed conversion as input length grows.
+
+Usage:
+  python scripts/bench_windowed_memory.py [--minutes 1,5,15,30] [--sr 48000] [--channels 2]
+
+For each duration a synthetic WAV is written to a temp dir, then each mode
+runs in a fresh process (so ru_maxrss is per mode) with an identity backend:
+- whole:    sf.read of the full file, float copy and transpose (the old path)
+- windowed: windowed.convert_file_windowed at 16 kHz mono (the engine path)
+Windowed peak RSS should stay flat while whole-file RSS grows linearly.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import soundfile as sf
+
+
+def write_input(path: str, minutes: float, sr: int, channels: int):
+    """Write noise in 10 s chunks so generating the input stays cheap"""
+    rng = np.random.default_rng(0)
+    frames = int(minutes * 60 * sr)
+    chunk = 10 * sr
+    with sf.SoundFile(path, 'w', samplerate=sr, channels=channels, subtype='PCM_16') as f:
+        for start in range(0, frames, chunk):
+            n = min(chunk, frames - start)
+            f.write((rng.standard_normal((n, channels)) * 0.1).astype(np.float32))
+
+
+def run_mode(mode: str, input_path: str, output_path: str) -> dict:
+    if mode == 'whole':
+        data, sr = sf.read(input_path)
+        waveform = np.ascontiguousarray(data.astype(np.float32).T)
+        sf.write(output_path, waveform.T, sr)
+    else:
+        from windowed import convert_file_windowed
+        convert_file_windowed(input_path, output_path, lambda w: w, target_sr=16000)
+    return {'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", default="1,5,15,30", help="Comma list of input durations in minutes")
+    parser.add_argument("--sr", type=int, default=48000)
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--mode", choices=['whole', 'windowed'], help=argparse.SUPPRESS)
+    parser.add_argument("--input", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.input, args.output)))
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for minutes in [float(m) for m in args.minutes.split(',') if m.strip()]:
+            input_path = os.path.join(tmp, 'input.wav')
+            write_input(input_path, minutes, args.sr, args.channels)
+            row = {'minutes': minutes, 'input_mb': os.path.getsize(input_path) / 1e6}
+            for mode in ('whole', 'windowed'):
+                cmd = [sys.executable, __file__, '--mode', mode, '--input', input_path,
+                       '--output', os.path.join(tmp, f'{mode}.wav')]
+                out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+                row[f'{mode}_peak_rss_mb'] = json.loads(out.strip().splitlines()[-1])['peak_rss_mb']
+            results.append(row)
+            print(f"  {minutes:g} min: whole={row['whole_peak_rss_mb']:.0f} MB, windowed={row['windowed_peak_rss_mb']:.0f} MB")
+
+    print(json.dumps({'sr': args.sr, 'channels': args.channels, 'results': results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark XTTS CPU inference modes against the fp32 baseline.
+
+Usage:
+  python scripts/bench_xtts_cpu.py --speaker-wav ref.wav [--modes fp32,int8,int8+bf16] [--threads 4]
+
+Reports, per mode:
+- rtf: synthesis seconds / generated audio seconds (lower is better)
+- quality delta vs fp32 on the same fixed sentences and seeds:
+  * ltas_db: mean absolute difference of the long-term average log-mel spectrum (dB)
+  * duration_ratio: generated duration relative to fp32
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+try:
+    import torch
+    import librosa
+    from TTS.api import TTS
+except Exception as e:
+    print(f"Please install torch, librosa and Coqui TTS: {e}")
+    raise
+
+from xtts_cpu import XTTSCPUConfig, XTTSRunner, configure_threads
+
+SENTENCES = [
+    "Welcome back to the show, today we are talking about distributed systems.",
+    "The quick brown fox jumps over the lazy dog.",
+    "Before we wrap up, let's hear a few questions from our listeners.",
+    "Numbers like three hundred and forty two are tricky to pronounce clearly.",
+]
+
+
+def ltas_db(y: np.ndarray, sr: int) -> np.ndarray:
+    """Long-term average log-mel spectrum in dB"""
+    mel = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=80)
+    return 10.0 * np.log10(np.mean(mel, axis=1) + 1e-10)
+
+
+def run_mode(model_name, mode, speaker_wav, language, seed):
+    config = XTTSCPUConfig(
+        mode='int8' if mode.startswith('int8') else 'fp32',
+        bf16=mode.endswith('+bf16'),
+    )
+    runner = XTTSRunner(TTS, device='cpu', config=config)
+    runner.get(model_name)
+    sr = runner.get(model_name).synthesizer.output_sample_rate
+
+    outputs, synth_seconds = [], 0.0
+    for i, sentence in enumerate(SENTENCES):
+        torch.manual_seed(seed + i)
+        start = time.perf_counter()
+        wav = runner.tts(model_name, text=sentence, speaker_wav=speaker_wav, language=language)
+        synth_seconds += time.perf_counter() - start
+        outputs.append(np.asarray(wav, dtype=np.float32))
+
+    audio_seconds = sum(len(o) for o in outputs) / sr
+    return {
+        'rtf': synth_seconds / max(audio_seconds, 1e-9),
+        'synth_seconds': synth_seconds,
+        'audio_seconds': audio_seconds,
+    }, outputs, sr
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--speaker-wav", required=True, help="Reference voice WAV")
+    parser.add_argument("--model", default=os.environ.get('XTTS_MODEL', 'tts_models/multilingual/multi-dataset/xtts_v2'))
+    parser.add_argument("--modes", default="fp32,int8,int8+bf16", help="Comma list of fp32, int8, int8+bf16, fp32+bf16")
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    configure_threads(args.threads, 1 if args.threads else None)
+
+    # fp32 always runs first: it is the baseline every other mode is compared against
+    modes = [m.strip() for m in args.modes.split(',') if m.strip()]
+    modes = ['fp32'] + [m for m in dict.fromkeys(modes) if m != 'fp32']
+
+    results, baseline, sr = {}, None, None
+    for mode in modes:
+        print(f"⏱️  Running {mode}...")
+        stats, outputs, sr = run_mode(args.model, mode, args.speaker_wav, args.language, args.seed)
+        if mode == 'fp32':
+            baseline = outputs
+        else:
+            ltas = [np.mean(np.abs(ltas_db(o, sr) - ltas_db(b, sr))) for o, b in zip(outputs, baseline)]
+            stats['ltas_db'] = float(np.mean(ltas))
+            stats['duration_ratio'] = sum(len(o) for o in outputs) / sum(len(b) for b in baseline)
+        results[mode] = stats
+
+    print(json.dumps({'threads': torch.get_num_threads(), 'results': results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
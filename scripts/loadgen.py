@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+End-to-end load generator for the voice service.
+
+Usage:
+  python scripts/loadgen.py [--server flask|asgi | --url http://host:port]
+                            [--concurrency 8] [--rate 20] [--duration 30]
+                            [--mix train=1,convert:rvc=6,convert:xtts=1,models=2]
+                            [--max-error-rate 0.01] [--max-p95-ms 2000] [--output report.json]
+
+Without --url the service is started locally (mock/passthrough mode unless HF
+deps are installed) with its RVC_ROOT in a temp dir that is removed afterwards. Request bodies are synthetic speech-like audio generated
+in NumPy: a harmonic source with a wandering pitch contour, shaped by moving
+vowel formants and a syllable-rate envelope, with fricative noise bursts and
+pauses.
+
+Operations are drawn from --mix by weight:
+- train:              POST /train with a fresh voice id (deleted at the end)
+- convert:<backend>:  POST /convert against one of --voices pre-trained voices
+- models:             GET /models
+With --rate, arrivals are Poisson at that many requests/s (open loop) and
+latency is measured from each request's scheduled arrival, so server-side
+queueing shows up in the percentiles instead of silently slowing the load.
+With --rate 0 each of the --concurrency workers sends back to back (closed loop).
+
+Reported as JSON: per-operation and overall throughput, p50/p95/p99/mean/max
+latency, error rate and status codes. The exit status is 1 when a
+--max-error-rate or --max-p95-ms budget is exceeded, so this can gate deploys.
+"""
+
+import argparse
+import http.client
+import io
+import json
+import os
+import queue
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import wave
+from pathlib import Path
+from urllib.parse import urlparse
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SERVERS = {
+    'flask': [sys.executable, str(ROOT / 'rvc_service_hf.py')],
+    'asgi': [sys.executable, str(ROOT / 'asgi_app.py')],
+}
+
+# (F1, F2, F3) in Hz for a few vowels
+VOWELS = np.array([
+    (730, 1090, 2440),  # a
+    (530, 1840, 2480),  # e
+    (270, 2290, 3010),  # i
+    (570, 840, 2410),   # o
+    (300, 870, 2240),   # u
+], dtype=np.float64)
+FORMANT_WIDTH = np.array([90.0, 110.0, 170.0])
+
+
+def synthetic_speech(seconds: float, sr: int = 16000, seed: int = 0) -> np.ndarray:
+    """Speech-like mono float32: voiced syllables with moving formants, fricatives and pauses"""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sr)
+    t = np.arange(n) / sr
+
+    # Pitch: a speaker-specific base with slow drift, phrase declination and jitter
+    base = rng.uniform(90.0, 240.0)
+    drift = np.interp(t, np.linspace(0, seconds, 8), rng.uniform(-0.15, 0.15, 8))
+    f0 = base * 2.0 ** (drift - 0.1 * (t % 2.5) / 2.5) * (1.0 + 0.01 * rng.standard_normal(n).cumsum() / np.sqrt(sr))
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+
+    # Syllables at ~4/s; formants glide between vowel targets
+    n_syll = max(2, int(seconds * 4))
+    bounds = np.linspace(0, seconds, n_syll + 1)
+    targets = VOWELS[rng.integers(0, len(VOWELS), n_syll)]
+    centers = (bounds[:-1] + bounds[1:]) / 2
+    formants = np.stack([np.interp(t, centers, targets[:, i]) for i in range(3)])  # [3, n]
+
+    # Additive synthesis: each harmonic weighted by the formant envelope at its frequency
+    harmonics = np.arange(1, int(sr / 2 / f0.min()))[:, None]
+    freqs = harmonics * f0[None, :]
+    envelope = sum(np.exp(-0.5 * ((freqs - formants[i]) / FORMANT_WIDTH[i]) ** 2) / (i + 1) for i in range(3))
+    envelope = (envelope + 0.02) * (freqs < sr / 2) / harmonics  # spectral tilt, no aliasing
+    voiced = (envelope * np.sin(harmonics * phase[None, :])).sum(axis=0)
+
+    # Syllable envelope, with every ~5th syllable a pause and ~1/4 fricative onsets
+    pos = np.clip(np.searchsorted(bounds, t, side='right') - 1, 0, n_syll - 1)
+    within = (t - bounds[pos]) / (bounds[1] - bounds[0])
+    syllable = np.sin(np.pi * within) ** 0.6
+    paused = rng.random(n_syll) < 0.2
+    fricative = rng.random(n_syll) < 0.25
+    noise = np.diff(rng.standard_normal(n + 1))  # high-passed noise
+    frication = noise * 0.15 * (fricative[pos] & (within < 0.25))
+    audio = (voiced * syllable * np.where(within < 0.25, ~fricative[pos], 1.0) + frication) * ~paused[pos]
+    audio += 0.002 * rng.standard_normal(n)
+    peak = np.max(np.abs(audio)) or 1.0
+    return (0.7 * audio / peak).astype(np.float32)
+
+
+def wav_bytes(audio: np.ndarray, sr: int = 16000) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sr)
+        w.writeframes((np.clip(audio, -1.0, 1.0) * 32767).astype('<i2').tobytes())
+    return buf.getvalue()
+
+
+def multipart(fields: dict, audio: bytes):
+    boundary = uuid.uuid4().hex
+    parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode()
+             for k, v in fields.items()]
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="audio"; filename="in.wav"\r\n'
+                 f'Content-Type: audio/wav\r\n\r\n'.encode() + audio + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def parse_mix(spec: str):
+    """'train=1,convert:rvc=6,models=2' -> [(op, weight)]"""
+    mix = []
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        op, _, weight = item.strip().partition('=')
+        kind = op.split(':')[0]
+        if kind not in ('train', 'convert', 'models'):
+            raise SystemExit(f"Unknown operation in --mix: {op}")
+        mix.append((op, float(weight or 1)))
+    if not mix:
+        raise SystemExit("--mix is empty")
+    return mix
+
+
+def wait_for_health(host: str, port: int, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f'Server on {host}:{port} did not become healthy')
+
+
+class Client:
+    """Keep-alive HTTP connection that reconnects after errors or Connection: close"""
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.host, self.port, self.timeout = host, port, timeout
+        self.conn = None
+
+    def request(self, method: str, path: str, body=None, headers=None):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            self.conn.request(method, path, body=body, headers=headers or {})
+            response = self.conn.getresponse()
+            data = response.read()
+            if response.getheader('Connection', '').lower() == 'close':
+                self.close()
+            return response.status, data
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class LoadGenerator:
+    def __init__(self, host: str, port: int, args):
+        self.host, self.port, self.args = host, port, args
+        self.mix = parse_mix(args.mix)
+        self.samples = [wav_bytes(synthetic_speech(args.seconds, seed=i)) for i in range(8)]
+        self.train_sample = wav_bytes(synthetic_speech(args.train_seconds, seed=100))
+        self.voices = []
+        self.created = []
+        self._lock = threading.Lock()
+        self.records = []  # (op, latency_s, status or None, finished_at)
+
+    def client(self) -> Client:
+        return Client(self.host, self.port, self.args.timeout)
+
+    def train(self, client: Client, voice_id: str):
+        body, ctype = multipart({'voice_id': voice_id, 'voice_name': f'Load {voice_id[-6:]}'}, self.train_sample)
+        status, data = client.request('POST', '/train', body, {'Content-Type': ctype})
+        if status == 200 and json.loads(data or b'{}').get('success'):
+            with self._lock:
+                self.created.append(voice_id)
+        return status
+
+    def run_op(self, client: Client, op: str, rng: random.Random) -> int:
+        kind, _, backend = op.partition(':')
+        if kind == 'models':
+            return client.request('GET', '/models')[0]
+        if kind == 'train':
+            return self.train(client, f"loadgen_{uuid.uuid4().hex[:12]}")
+        fields = {'model_id': rng.choice(self.voices), 'backend': backend or 'rvc'}
+        if backend == 'xtts':
+            fields['text'] = 'The quick brown fox jumps over the lazy dog.'
+        body, ctype = multipart(fields, rng.choice(self.samples))
+        return client.request('POST', '/convert', body, {'Content-Type': ctype})[0]
+
+    def setup(self):
+        """Train the voices that conversions target"""
+        client = self.client()
+        for i in range(self.args.voices):
+            voice_id = f"loadgen_{uuid.uuid4().hex[:8]}_{i}"
+            status = self.train(client, voice_id)
+            if status != 200:
+                raise RuntimeError(f"Setup training failed with HTTP {status}")
+            self.voices.append(voice_id)
+        client.close()
+
+    def teardown(self):
+        client = self.client()
+        for voice_id in self.created:
+            try:
+                client.request('DELETE', f'/models/{voice_id}')
+            except (OSError, http.client.HTTPException):
+                pass
+        client.close()
+
+    def _record(self, op, latency, status):
+        with self._lock:
+            self.records.append((op, latency, status, time.perf_counter()))
+
+    def _execute(self, client, op, rng, started):
+        try:
+            status = self.run_op(client, op, rng)
+        except (OSError, http.client.HTTPException, ValueError):
+            status = None
+        self._record(op, time.perf_counter() - started, status)
+
+    def run(self):
+        ops = [op for op, _ in self.mix]
+        weights = [w for _, w in self.mix]
+        stop_at = time.perf_counter() + self.args.duration
+        arrivals = queue.Queue(maxsize=0)
+
+        def closed_worker(seed):
+            rng, client = random.Random(seed), self.client()
+            while time.perf_counter() < stop_at:
+                self._execute(client, rng.choices(ops, weights)[0], rng, time.perf_counter())
+            client.close()
+
+        def open_worker(seed):
+            rng, client = random.Random(seed), self.client()
+            while True:
+                item = arrivals.get()
+                if item is None:
+                    break
+                op, scheduled = item
+                self._execute(client, op, rng, scheduled)
+            client.close()
+
+        worker = open_worker if self.args.rate > 0 else closed_worker
+        threads = [threading.Thread(target=worker, args=(self.args.seed + i,), daemon=True)
+                   for i in range(self.args.concurrency)]
+        self.started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        if self.args.rate > 0:
+            rng = random.Random(self.args.seed)
+            next_at = self.started
+            while next_at < stop_at:
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                arrivals.put((rng.choices(ops, weights)[0], next_at))
+                next_at += rng.expovariate(self.args.rate)
+            for _ in threads:
+                arrivals.put(None)
+
+        for thread in threads:
+            thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+
+def summarize(records, elapsed: float) -> dict:
+    latencies = np.array([r[1] for r in records]) * 1000.0
+    statuses = {}
+    for _, _, status, _ in records:
+        key = str(status) if status is not None else 'connection_error'
+        statuses[key] = statuses.get(key, 0) + 1
+    errors = sum(1 for r in records if r[2] is None or r[2] >= 400)
+    summary = {
+        'requests': len(records),
+        'errors': errors,
+        'error_rate': errors / len(records) if records else 0.0,
+        'throughput_rps': len(records) / elapsed if elapsed else 0.0,
+        'status_codes': statuses,
+    }
+    if len(latencies):
+        summary.update({
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p95_ms': float(np.percentile(latencies, 95)),
+            'p99_ms': float(np.percentile(latencies, 99)),
+            'mean_ms': float(latencies.mean()),
+            'max_ms': float(latencies.max()),
+        })
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the voice service")
+    parser.add_argument("--url", help="Existing service to target; omit to start one locally")
+    parser.add_argument("--server", choices=sorted(SERVERS), default="flask", help="Local server to start")
+    parser.add_argument("--port", type=int, default=5077, help="Port for the local server")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--rate", type=float, default=0.0, help="Arrival rate in requests/s (0 = closed loop)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load")
+    parser.add_argument("--mix", default="train=1,convert:rvc=6,convert:freevc=2,convert:xtts=1,models=2",
+                        help="Weighted operations: train, convert:<backend>, models")
+    parser.add_argument("--voices", type=int, default=4, help="Voices trained up front for conversions")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Conversion input length")
+    parser.add_argument("--train-seconds", type=float, default=10.0, help="Training sample length")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-error-rate", type=float, help="Fail if the overall error rate is above this")
+    parser.add_argument("--max-p95-ms", type=float, help="Fail if the overall p95 latency is above this")
+    parser.add_argument("--output", help="Also write the JSON report here")
+    args = parser.parse_args()
+
+    proc = state_dir = None
+    if args.url:
+        parsed = urlparse(args.url)
+        host, port = parsed.hostname, parsed.port or 80
+    else:
+        host, port = '127.0.0.1', args.port
+        # Keep models, weights and temp files out of the checkout
+        state_dir = tempfile.mkdtemp(prefix='loadgen_')
+        env = dict(os.environ, RVC_PORT=str(port), RVC_ROOT=state_dir)
+        proc = subprocess.Popen(SERVERS[args.server], cwd=str(ROOT), env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_health(host, port)
+        gen = LoadGenerator(host, port, args)
+        gen.setup()
+        print(f"  {len(gen.voices)} voices ready; running {args.duration:.0f}s at "
+              f"{'%.1f req/s' % args.rate if args.rate > 0 else 'closed loop'} x{args.concurrency}", file=sys.stderr)
+        try:
+            gen.run()
+        finally:
+            gen.teardown()
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+        if state_dir is not None:
+            shutil.rmtree(state_dir, ignore_errors=True)
+
+    operations = {}
+    for op, _ in gen.mix:
+        operations[op] = summarize([r for r in gen.records if r[0] == op], gen.elapsed)
+    overall = summarize(gen.records, gen.elapsed)
+    failures = []
+    if args.max_error_rate is not None and overall['error_rate'] > args.max_error_rate:
+        failures.append(f"error rate {overall['error_rate']:.3f} > {args.max_error_rate}")
+    if args.max_p95_ms is not None and overall.get('p95_ms', 0.0) > args.max_p95_ms:
+        failures.append(f"p95 {overall['p95_ms']:.0f} ms > {args.max_p95_ms:.0f} ms")
+
+    report = {
+        'target': args.url or f"local {args.server}",
+        'concurrency': args.concurrency,
+        'rate': args.rate or None,
+        'duration_s': gen.elapsed,
+        'mix': dict(gen.mix),
+        'overall': overall,
+        'operations': operations,
+        'failed_budgets': failures,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,80 +1,350 @@
 #!/usr/bin/env python3
 """
-Push a local model file or folder to a Hugging Face Hub repo.
+Incrementally sync a local model file or folder with a Hugging Face Hub repo.
 
 Usage:
   python scripts/push_to_hf.py --repo <owner/repo> --path <file_or_dir> --token <hf_token> [--commit-message "msg"] [--revision main]
+  python scripts/push_to_hf.py --repo <owner/repo> --path <dir> --pull
+  python scripts/push_to_hf.py ... --dry-run            # print the diff, transfer nothing
+  python scripts/push_to_hf.py ... --local-hub /tmp/hub # sync against a directory instead of the Hub
 
 Notes:
 - Creates the repo if it doesn't exist (under your account/org) when you have permission.
-- Uploads large files via LFS automatically.
+- Content hashes are kept in a local manifest (.hf_manifest.json in the folder),
+  so unchanged files are neither re-hashed nor re-uploaded. A single-file push
+  keeps its manifest and scratch files under --state-dir (default
+  ~/.cache/hf_sync, or HF_SYNC_STATE_DIR) rather than next to the file. The repo carries the
+  same manifest, which lets push and pull diff without listing or hashing remote files.
+- New/changed files go up in batched commits (--batch-size files each); large
+  files upload in parallel via LFS (--workers).
+- Pull downloads only files whose hash differs from the local copy, in parallel,
+  and verifies each download against the manifest.
+- Remote files missing locally (push) or local files missing remotely (pull)
+  are only deleted with --delete.
 - Ideal for pushing trained RVC weights (.pth) and metadata.
 """
 
 import argparse
+import hashlib
+import json
 import os
+import shutil
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 try:
-    from huggingface_hub import HfApi, create_repo, upload_folder, upload_file
-except Exception as e:
-    print("Please install huggingface_hub: pip install huggingface_hub")
-    raise
+    from huggingface_hub import HfApi, CommitOperationAdd, CommitOperationDelete
+    HF_HUB_AVAILABLE = True
+except ImportError:
+    HF_HUB_AVAILABLE = False
 
+    class CommitOperationAdd:
+        def __init__(self, path_in_repo: str, path_or_fileobj: str):
+            self.path_in_repo = path_in_repo
+            self.path_or_fileobj = path_or_fileobj
 
-def push_to_hf(repo_id: str, path: Path, token: str, commit_message: str = "Add model", revision: str = "main"):
-    api = HfApi(token=token)
+    class CommitOperationDelete:
+        def __init__(self, path_in_repo: str):
+            self.path_in_repo = path_in_repo
+
+MANIFEST_NAME = ".hf_manifest.json"
+HASH_CHUNK = 8 * 1024 * 1024
+DEFAULT_STATE_DIR = os.environ.get("HF_SYNC_STATE_DIR", os.path.join(Path.home(), ".cache", "hf_sync"))
+
+
+class LocalHub:
+    """Directory-backed stand-in for the subset of HfApi this script uses
+
+    Layout: <root>/<repo_id>/<revision>/<path_in_repo>. Commits are applied
+    file by file and counted, which is enough to test sync behaviour offline.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.commits = []
+
+    def _repo_dir(self, repo_id: str, revision: str) -> Path:
+        return self.root / repo_id / (revision or "main")
+
+    def create_repo(self, repo_id: str, exist_ok: bool = True, repo_type: str = "model", **kwargs):
+        self._repo_dir(repo_id, "main").mkdir(parents=True, exist_ok=exist_ok)
+
+    def create_commit(self, repo_id: str, operations, commit_message: str, revision: str = "main",
+                      repo_type: str = "model", num_threads: int = 5, **kwargs):
+        repo_dir = self._repo_dir(repo_id, revision)
+
+        def apply(op):
+            target = repo_dir / op.path_in_repo
+            if isinstance(op, CommitOperationDelete):
+                if target.exists():
+                    target.unlink()
+                return
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(op.path_or_fileobj, target)
+
+        with ThreadPoolExecutor(max_workers=num_threads) as pool:
+            list(pool.map(apply, operations))
+        self.commits.append({'message': commit_message, 'operations': len(operations)})
+
+    def hf_hub_download(self, repo_id: str, filename: str, revision: str = "main", repo_type: str = "model",
+                        local_dir: str = None, **kwargs) -> str:
+        source = self._repo_dir(repo_id, revision) / filename
+        if not source.exists():
+            raise FileNotFoundError(f"{filename} not found in {repo_id}@{revision}")
+        target = Path(local_dir) / filename
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(source, target)
+        return str(target)
+
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-    # Ensure repo exists (will no-op if it already exists)
-    create_repo(repo_id=repo_id, token=token, exist_ok=True, repo_type="model")
 
+def load_manifest(path: Path) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f).get('files', {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path: Path, files: dict):
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'w') as f:
+        json.dump({'version': 1, 'files': files}, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def state_dir_for(path: Path, state_root: str = None) -> Path:
+    """Where a sync of path keeps its manifest and scratch files
+
+    A folder keeps them inside itself; a single file gets its own directory
+    under the state root, keyed by its absolute path.
+    """
     if path.is_dir():
-        print(f"Uploading folder {path} to {repo_id}@{revision}...")
-        upload_folder(
-            repo_id=repo_id,
-            folder_path=str(path),
-            path_in_repo="/",
-            repo_type="model",
-            commit_message=commit_message,
-            revision=revision,
-            token=token,
-        )
+        return path
+    key = hashlib.sha256(str(path.resolve()).encode()).hexdigest()[:16]
+    return Path(state_root or DEFAULT_STATE_DIR) / key
+
+
+def scan_local(root: Path, only: list = None, workers: int = 8, state: Path = None) -> dict:
+    """Hash files under root, reusing cached hashes when size and mtime match"""
+    state = state or root
+    state.mkdir(parents=True, exist_ok=True)
+    cache_path = state / MANIFEST_NAME
+    cached = load_manifest(cache_path)
+    if only is not None:
+        names = only
     else:
-        print(f"Uploading file {path} to {repo_id}@{revision}...")
-        upload_file(
+        names = sorted(
+            p.relative_to(root).as_posix() for p in root.rglob('*')
+            if p.is_file() and p.name != MANIFEST_NAME and '.cache' not in p.relative_to(root).parts
+        )
+
+    files, to_hash = {}, []
+    for name in names:
+        stat = (root / name).stat()
+        entry = cached.get(name)
+        if entry and entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime:
+            files[name] = entry
+        else:
+            to_hash.append((name, stat))
+
+    def hash_one(item):
+        name, stat = item
+        return name, {'sha256': sha256_file(root / name), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        files.update(pool.map(hash_one, to_hash))
+
+    if to_hash:
+        print(f"🔎 Hashed {len(to_hash)} file(s), {len(files) - len(to_hash)} unchanged")
+    save_manifest(cache_path, {**cached, **files} if only is not None else files)
+    return files
+
+
+def fetch_remote_manifest(api, repo_id: str, revision: str, scratch: Path) -> dict:
+    try:
+        path = api.hf_hub_download(repo_id=repo_id, filename=MANIFEST_NAME, revision=revision,
+                                   repo_type="model", local_dir=str(scratch))
+    except Exception:
+        return {}  # new repo, or one that was never synced with a manifest
+    return load_manifest(Path(path))
+
+
+def diff(source: dict, target: dict):
+    """Files to add (new in source), change (hash differs) and remove (only in target)"""
+    added = sorted(n for n in source if n not in target)
+    changed = sorted(n for n in source if n in target and source[n]['sha256'] != target[n]['sha256'])
+    removed = sorted(n for n in target if n not in source)
+    return added, changed, removed
+
+
+def print_diff(direction: str, added, changed, removed, delete: bool, sizes: dict):
+    for name in added:
+        print(f"  + {name} ({sizes.get(name, 0) / 1e6:.1f} MB)")
+    for name in changed:
+        print(f"  ~ {name} ({sizes.get(name, 0) / 1e6:.1f} MB)")
+    for name in removed:
+        print(f"  - {name}" + ("" if delete else " (kept; use --delete)"))
+    total = sum(sizes.get(n, 0) for n in added + changed)
+    print(f"{direction}: {len(added)} new, {len(changed)} changed, {len(removed)} only on the other side, "
+          f"{total / 1e6:.1f} MB to transfer")
+
+
+def push_to_hf(repo_id: str, path: Path, token: str = None, commit_message: str = "Add model", revision: str = "main",
+               api=None, workers: int = 8, batch_size: int = 100, dry_run: bool = False, delete: bool = False,
+               state_root: str = None) -> dict:
+    api = api or HfApi(token=token)
+    root, only = (path, None) if path.is_dir() else (path.parent, [path.name])
+    state = state_dir_for(path, state_root)
+
+    local = scan_local(root, only=only, workers=workers, state=state)
+    scratch = state / '.cache' / 'hf_sync'
+    remote = fetch_remote_manifest(api, repo_id, revision, scratch)
+    # A single-file push never implies removing anything else from the repo
+    remote_scope = {n: remote[n] for n in only if n in remote} if only is not None else remote
+    added, changed, removed = diff(local, remote_scope)
+    print_diff("Push", added, changed, removed, delete, {n: e['size'] for n, e in local.items()})
+    if dry_run:
+        return {'added': added, 'changed': changed, 'removed': removed, 'commits': 0}
+
+    # Ensure repo exists (will no-op if it already exists)
+    api.create_repo(repo_id=repo_id, exist_ok=True, repo_type="model")
+
+    operations = [CommitOperationAdd(path_in_repo=n, path_or_fileobj=str(root / n)) for n in added + changed]
+    if delete:
+        operations += [CommitOperationDelete(path_in_repo=n) for n in removed]
+
+    # Each commit also rewrites the remote manifest, so an interrupted sync
+    # resumes from the last batch that landed
+    synced = dict(remote)
+    manifest_path = scratch / 'outgoing' / MANIFEST_NAME
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    commits = 0
+    for start in range(0, len(operations), batch_size):
+        batch = operations[start:start + batch_size]
+        for op in batch:
+            if isinstance(op, CommitOperationDelete):
+                synced.pop(op.path_in_repo, None)
+            else:
+                entry = local[op.path_in_repo]
+                synced[op.path_in_repo] = {'sha256': entry['sha256'], 'size': entry['size']}
+        save_manifest(manifest_path, synced)
+        batches = (len(operations) + batch_size - 1) // batch_size
+        message = commit_message if batches == 1 else f"{commit_message} ({commits + 1}/{batches})"
+        print(f"Uploading {len(batch)} file(s) to {repo_id}@{revision}...")
+        api.create_commit(
             repo_id=repo_id,
-            path_or_fileobj=str(path),
-            path_in_repo=path.name,
-            repo_type="model",
-            commit_message=commit_message,
+            operations=batch + [CommitOperationAdd(path_in_repo=MANIFEST_NAME, path_or_fileobj=str(manifest_path))],
+            commit_message=message,
             revision=revision,
-            token=token,
+            repo_type="model",
+            num_threads=workers,
         )
+        commits += 1
+
+    print("✅ Upload completed" if commits else "✅ Already up to date")
+    return {'added': added, 'changed': changed, 'removed': removed if delete else [], 'commits': commits}
+
+
+def pull_from_hf(repo_id: str, path: Path, token: str = None, revision: str = "main", api=None,
+                 workers: int = 8, dry_run: bool = False, delete: bool = False, only: list = None) -> dict:
+    api = api or HfApi(token=token)
+    path.mkdir(parents=True, exist_ok=True)
+
+    scratch = path / '.cache' / 'hf_sync'
+    remote = fetch_remote_manifest(api, repo_id, revision, scratch)
+    if not remote:
+        print(f"❌ {repo_id}@{revision} has no {MANIFEST_NAME}; push it with this script first")
+        return {'added': [], 'changed': [], 'removed': [], 'downloaded': 0}
+    if only is not None:
+        remote = {n: e for n, e in remote.items() if n in only}
 
-    print("✅ Upload completed")
+    local = scan_local(path, workers=workers)
+    added, changed, removed = diff(remote, local)
+    if only is not None:
+        removed = []
+    print_diff("Pull", added, changed, removed, delete, {n: e['size'] for n, e in remote.items()})
+    if dry_run:
+        return {'added': added, 'changed': changed, 'removed': removed, 'downloaded': 0}
+
+    incoming = scratch / 'incoming'
+
+    def download(name):
+        downloaded = Path(api.hf_hub_download(repo_id=repo_id, filename=name, revision=revision,
+                                              repo_type="model", local_dir=str(incoming)))
+        if sha256_file(downloaded) != remote[name]['sha256']:
+            downloaded.unlink()
+            raise ValueError(f"Checksum mismatch for {name}")
+        target = path / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(downloaded, target)
+        return name
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        done = list(pool.map(download, added + changed))
+    if delete:
+        for name in removed:
+            (path / name).unlink()
+
+    # Record the fresh hashes so the next sync skips these files
+    scan_local(path, workers=workers)
+    shutil.rmtree(incoming, ignore_errors=True)
+    print(f"✅ Downloaded {len(done)} file(s)")
+    return {'added': added, 'changed': changed, 'removed': removed if delete else [], 'downloaded': len(done)}
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--repo", required=True, help="Hugging Face repo id: owner/name")
-    parser.add_argument("--path", required=True, help="Path to file or directory to upload")
+    parser.add_argument("--path", required=True, help="Path to file or directory to sync")
     parser.add_argument("--token", required=False, help="HF token (or set HF_TOKEN env var)")
     parser.add_argument("--commit-message", default="Add model", help="Commit message")
     parser.add_argument("--revision", default="main", help="Branch or tag")
+    parser.add_argument("--pull", action="store_true", help="Download from the repo instead of uploading")
+    parser.add_argument("--files", help="Comma list of repo paths to pull (default: everything)")
+    parser.add_argument("--dry-run", action="store_true", help="Show what would change without transferring")
+    parser.add_argument("--delete", action="store_true", help="Also delete files missing on the source side")
+    parser.add_argument("--workers", type=int, default=8, help="Parallel hashing/transfer workers")
+    parser.add_argument("--batch-size", type=int, default=100, help="Max files per commit")
+    parser.add_argument("--local-hub", help="Directory standing in for the Hub (testing/offline)")
+    parser.add_argument("--state-dir", default=DEFAULT_STATE_DIR,
+                        help="Where single-file pushes keep their manifest and scratch files")
     args = parser.parse_args()
 
-    token = args.token or os.environ.get("HF_TOKEN")
-    if not token:
-        print("❌ Missing token. Provide --token or set env HF_TOKEN.")
-        sys.exit(1)
+    if args.local_hub:
+        api = LocalHub(args.local_hub)
+        token = None
+    else:
+        if not HF_HUB_AVAILABLE:
+            print("Please install huggingface_hub: pip install huggingface_hub")
+            sys.exit(1)
+        token = args.token or os.environ.get("HF_TOKEN")
+        if not token and not (args.pull or args.dry_run):
+            print("❌ Missing token. Provide --token or set env HF_TOKEN.")
+            sys.exit(1)
+        api = HfApi(token=token)
 
     path = Path(args.path)
+    if args.pull:
+        only = [f.strip() for f in args.files.split(',') if f.strip()] if args.files else None
+        pull_from_hf(args.repo, path, token, args.revision, api=api, workers=args.workers,
+                     dry_run=args.dry_run, delete=args.delete, only=only)
+        return
+
     if not path.exists():
         print(f"❌ Path not found: {path}")
         sys.exit(1)
 
-    push_to_hf(args.repo, path, token, args.commit_message, args.revision)
+    push_to_hf(args.repo, path, token, args.commit_message, args.revision, api=api, workers=args.workers,
+               batch_size=args.batch_size, dry_run=args.dry_run, delete=args.delete, state_root=args.state_dir)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Run a local sharded cluster and check routing and rebalancing end to end.
+
+Usage:
+  python scripts/shard_cluster.py [--nodes 3] [--base-port 5201] [--server flask|asgi|mixed]
+                                  [--voices 12] [--keep-running]
+
+Starts --nodes service processes on consecutive ports. Each node has its own
+RVC_ROOT, and all of them share a file:// artifact store in a temp dir, with
+SHARD_NODES listing every node and one SHARD_TOKEN. Mock/passthrough mode is
+used unless HF deps are installed. Then:
+1. trains --voices voices, sending each to a different node
+2. converts every voice through every node and checks that each request is
+   served by the voice's ring owner (forwarded or local)
+3. stops the last node, waits for the others to drop it from the ring,
+   and converts every voice again through the first node
+Prints a JSON report with per-node shares, forward counts and the
+rebalance summary. With --keep-running the cluster stays up until Ctrl-C,
+for manual testing.
+"""
+
+import argparse
+import io
+import json
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from pathlib import Path
+
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SERVERS = {
+    'flask': 'rvc_service_hf.py',
+    'asgi': 'asgi_app.py',
+}
+
+
+def tone_wav(seconds: float = 1.0, sr: int = 16000) -> bytes:
+    import numpy as np
+    t = np.arange(int(seconds * sr)) / sr
+    samples = (0.3 * np.sin(2 * np.pi * 150 * t) * 32767).astype('<i2')
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sr)
+        w.writeframes(samples.tobytes())
+    return buf.getvalue()
+
+
+def wait_until(check, timeout: float, what: str):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if check():
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Timed out waiting for {what}")
+
+
+def start_node(index: int, port: int, server: str, urls, tmp: str, token: str):
+    env = dict(
+        os.environ,
+        RVC_PORT=str(port),
+        RVC_ROOT=os.path.join(tmp, f'node{index}'),
+        SHARD_NODES=','.join(urls),
+        SHARD_SELF=urls[index],
+        SHARD_PROBE_SECONDS='1',
+        SHARD_TOKEN=token,
+        ARTIFACT_STORE_URL=f"file://{os.path.join(tmp, 'store')}",
+        PREPROCESS_WORKERS='0',
+    )
+    log = open(os.path.join(tmp, f'node{index}.log'), 'w')
+    return subprocess.Popen([sys.executable, str(ROOT / SERVERS[server])], cwd=str(ROOT), env=env,
+                            stdout=log, stderr=subprocess.STDOUT)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--base-port", type=int, default=5201)
+    parser.add_argument("--server", choices=sorted(SERVERS) + ['mixed'], default="flask",
+                        help="'mixed' alternates Flask and ASGI nodes")
+    parser.add_argument("--voices", type=int, default=12)
+    parser.add_argument("--keep-running", action="store_true")
+    args = parser.parse_args()
+    if args.nodes < 2:
+        raise SystemExit("--nodes must be at least 2")
+
+    urls = [f"http://127.0.0.1:{args.base_port + i}" for i in range(args.nodes)]
+    audio = tone_wav()
+    token = secrets.token_hex(16)
+    report = {'nodes': urls}
+    with tempfile.TemporaryDirectory() as tmp:
+        procs = []
+        for i in range(args.nodes):
+            server = args.server if args.server != 'mixed' else ('flask', 'asgi')[i % 2]
+            procs.append(start_node(i, args.base_port + i, server, urls, tmp, token))
+        try:
+            for url in urls:
+                wait_until(lambda: requests.get(f"{url}/health", timeout=2).ok, 60, f"{url} to start")
+            if args.keep_running:
+                print(f"Cluster up: {', '.join(urls)} (logs in {tmp}); Ctrl-C to stop", file=sys.stderr)
+                signal.sigwait({signal.SIGINT, signal.SIGTERM})
+                return
+
+            # 1. Train through every node in turn
+            owners = {}
+            for i in range(args.voices):
+                voice_id = f"shard_voice_{i}"
+                node = urls[i % len(urls)]
+                r = requests.post(f"{node}/train", data={'voice_id': voice_id, 'voice_name': voice_id},
+                                  files={'audio': ('v.wav', audio, 'audio/wav')}, timeout=120)
+                r.raise_for_status()
+                owners[voice_id] = r.headers.get('X-Shard-Owner', node)
+            report['voices_per_owner'] = {u: sum(1 for o in owners.values() if o == u) for u in urls}
+
+            # 2. Every node must hand each voice to its owner, whether the voice id is
+            #    only in the form (body buffered) or also in X-Voice-Id (routed unread)
+            mismatches = errors = 0
+            for v, (voice_id, owner) in enumerate(owners.items()):
+                for node in urls:
+                    hint = {'X-Voice-Id': voice_id} if v % 2 else {}
+                    r = requests.post(f"{node}/convert", data={'model_id': voice_id}, headers=hint,
+                                      files={'audio': ('v.wav', audio, 'audio/wav')}, timeout=120)
+                    errors += r.status_code != 200
+                    mismatches += r.headers.get('X-Shard-Owner', node) != owner
+            report['routing'] = {'requests': len(owners) * len(urls), 'errors': errors, 'owner_mismatches': mismatches}
+
+            # 3. Lose a node; the survivors take over its voices from the store
+            procs[-1].terminate()
+            procs[-1].wait(timeout=10)
+            lost = urls[-1]
+            wait_until(lambda: all(lost not in requests.get(f"{u}/shard", timeout=2).json()['active'] for u in urls[:-1]),
+                       30, f"{lost} to leave the ring")
+            wait_until(lambda: all(requests.get(f"{u}/shard", timeout=2).json()['last_rebalance'] for u in urls[:-1]),
+                       30, "rebalance")
+            after = 0
+            for voice_id in owners:
+                r = requests.post(f"{urls[0]}/convert", data={'model_id': voice_id},
+                                  files={'audio': ('v.wav', audio, 'audio/wav')}, timeout=120)
+                after += r.status_code == 200
+            rings = {u: requests.get(f"{u}/shard", timeout=2).json() for u in urls[:-1]}
+            report['after_node_loss'] = {
+                'lost': lost,
+                'voices_moved': sum(1 for o in owners.values() if o == lost),
+                'converted_ok': after,
+                'rebalance': {u: ring['last_rebalance'] for u, ring in rings.items()},
+            }
+            report['shards'] = {u: {'share': ring['share'], 'forwarded': ring['forwarded'],
+                                    'forward_errors': ring['forward_errors']} for u, ring in rings.items()}
+        finally:
+            for proc in procs:
+                if proc.poll() is None:
+                    proc.terminate()
+                    proc.wait(timeout=10)
+
+    print(json.dumps(report, indent=2))
+    ok = (report['routing']['errors'] == 0 and report['routing']['owner_mismatches'] == 0
+          and report['after_node_loss']['converted_ok'] == len(owners))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
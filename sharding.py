@@ -0,0 +1,443 @@
+# Consistent-Hash Voice Sharding
+# Assigns every voice id to one service node, so each node keeps only its
+# share of voices cached and resident instead of every node loading them all.
+#
+# Nodes sit on a 64-bit hash ring at SHARD_VNODES virtual points each; adding
+# or removing a node moves only ~1/N of the voices, spread evenly over the
+# other nodes. A request for a voice owned elsewhere is proxied to the owner
+# (SHARD_MODE=forward) or answered with a 307 pointing at it (redirect).
+# Proxied requests carry X-Shard-Forwarded and are always served where they
+# land, so nodes with briefly different ring views never bounce a request.
+# With SHARD_TOKEN set, peers also send it in X-Shard-Token and the header is
+# only honoured when the token matches; without one it is only honoured from
+# current members.
+#
+# Membership starts from SHARD_NODES and changes when a node announces itself
+# (POST /shard/join), asks to be removed (POST /shard/leave), or fails
+# SHARD_PROBE_FAILURES health probes in a row. Join/leave requests need the
+# SHARD_TOKEN when one is set; without one only SHARD_NODES may join or leave. On every change listeners get
+# the old and new ring; the service prefetches artifacts for voices it gained
+# and evicts the ones it lost. Voices move between nodes through the shared
+# ARTIFACT_STORE_URL, so a sharded deployment needs one.
+#
+# Env: SHARD_NODES (comma-separated base URLs, this node included),
+#      SHARD_SELF (this node's URL; default http://127.0.0.1:$RVC_PORT),
+#      SHARD_VNODES (default 128), SHARD_MODE (forward|redirect, default forward),
+#      SHARD_PROBE_SECONDS (default 5), SHARD_PROBE_FAILURES (default 2),
+#      SHARD_TIMEOUT (proxy timeout in seconds, default 600),
+#      SHARD_TOKEN (shared secret for peer traffic; unset allows only SHARD_NODES)
+
+import bisect
+import email.parser
+import email.policy
+import hashlib
+import hmac
+import http.client
+import json
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+FORWARDED_HEADER = 'X-Shard-Forwarded'
+OWNER_HEADER = 'X-Shard-Owner'
+TOKEN_HEADER = 'X-Shard-Token'
+# Not forwarded in either direction; http.client sets its own framing
+HOP_BY_HOP = {'connection', 'keep-alive', 'proxy-connection', 'transfer-encoding', 'te', 'trailer',
+              'upgrade', 'host', 'content-length', TOKEN_HEADER.lower()}
+
+# Routes whose voice id is in the path; 'similar' is a global search, not a voice
+_PATH_VOICE = re.compile(r'^/(?:models/(?P<model>[^/]+)(?:/(?:warm|pin))?|training-progress/(?P<voice>[^/]+))$')
+# Routes whose voice id is a form field of the upload
+BODY_VOICE_FIELDS = {'/train': 'voice_id', '/convert': 'model_id'}
+# /convert/raw names the voice in a header
+RAW_VOICE_HEADER = 'X-Model-Id'
+# Uploads that also name their voice here (or in a ?voice_id= / ?model_id= query
+# param) are routed without buffering the body to read the form field
+VOICE_HEADER = 'X-Voice-Id'
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+def normalize_node(url: str) -> str:
+    url = url.strip().rstrip('/')
+    return url if '://' in url else f"http://{url}"
+
+
+def path_voice_id(method: str, path: str) -> Optional[str]:
+    """Voice id named by a route's path, if any"""
+    if method == 'OPTIONS':
+        return None
+    match = _PATH_VOICE.match(path)
+    if not match:
+        return None
+    voice_id = unquote(match.group('model') or match.group('voice'))
+    return None if voice_id == 'similar' else voice_id
+
+
+def hinted_voice_id(path: str, headers, args) -> Optional[str]:
+    """Voice id a POST names outside its body, if any (headers/args: case-insensitive mappings)"""
+    if path == '/convert/raw':
+        return unquote(headers.get(RAW_VOICE_HEADER, '')) or None
+    field = BODY_VOICE_FIELDS.get(path)
+    if field is None:
+        return None
+    return unquote(headers.get(VOICE_HEADER, '')) or args.get(field) or None
+
+
+def form_field(body: bytes, content_type: str, name: str) -> Optional[str]:
+    """One text field of a buffered multipart or urlencoded form body"""
+    if content_type.startswith('application/x-www-form-urlencoded'):
+        values = parse_qs(body.decode('latin-1')).get(name)
+        return values[0] if values else None
+    if not content_type.startswith('multipart/form-data'):
+        return None
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        b'Content-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n' + body)
+    for part in message.iter_parts():
+        if part.get_param('name', header='content-disposition') == name and not part.get_filename():
+            return part.get_payload(decode=True).decode('utf-8', 'replace')
+    return None
+
+
+class HashRing:
+    """Immutable consistent-hash ring with virtual nodes"""
+
+    def __init__(self, nodes: Iterable[str], vnodes: int = 128):
+        self.nodes = sorted(set(nodes))
+        self.vnodes = vnodes
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes))
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._points:
+            return None
+        return self._owners[bisect.bisect(self._points, _hash(key)) % len(self._points)]
+
+    def shares(self) -> Dict[str, float]:
+        """Fraction of the hash space each node owns"""
+        shares = {node: 0.0 for node in self.nodes}
+        if not self._points:
+            return shares
+        space = float(1 << 64)
+        previous = self._points[-1] - (1 << 64)
+        for point, node in zip(self._points, self._owners):
+            shares[node] += (point - previous) / space
+            previous = point
+        return shares
+
+
+class ShardUnavailable(Exception):
+    """The owner could not be reached; the request was never delivered"""
+
+
+class ShardFailed(Exception):
+    """The owner may have received the request but no reply came back"""
+
+
+class ShardRouter:
+    """This node's view of the ring: ownership, proxying and membership"""
+
+    def __init__(self, self_url: str, nodes: Iterable[str], vnodes: int = 128, mode: str = 'forward',
+                 probe_seconds: float = 5.0, probe_failures: int = 2, timeout: float = 600.0,
+                 token: Optional[str] = None):
+        self.self_url = normalize_node(self_url)
+        self.members = {normalize_node(n) for n in nodes} | {self.self_url}
+        self.seeds = frozenset(self.members)
+        self.token = token or None
+        self.down = set()
+        self.vnodes = vnodes
+        self.mode = mode if mode in ('forward', 'redirect') else 'forward'
+        self.probe_seconds = probe_seconds
+        self.probe_failures = probe_failures
+        self.timeout = timeout
+        self.ring = HashRing(self.members, vnodes)
+        self.epoch = 0
+        self._lock = threading.RLock()
+        self._failures: Dict[str, int] = {}
+        self._listeners: List[Callable] = []
+        self._conns = threading.local()
+        self._stop = threading.Event()
+        self.forwarded = 0
+        self.redirected = 0
+        self.forward_errors = 0
+        self.last_change = None
+        self.last_rebalance = None
+
+    @classmethod
+    def from_env(cls) -> Optional['ShardRouter']:
+        """Router from SHARD_* env vars, or None when SHARD_NODES is unset (single node)"""
+        nodes = [n for n in os.getenv('SHARD_NODES', '').split(',') if n.strip()]
+        if not nodes:
+            return None
+        self_url = os.getenv('SHARD_SELF') or f"http://127.0.0.1:{os.getenv('RVC_PORT', '5000')}"
+        return cls(
+            self_url, nodes,
+            vnodes=int(os.getenv('SHARD_VNODES', '128')),
+            mode=os.getenv('SHARD_MODE', 'forward').lower(),
+            probe_seconds=float(os.getenv('SHARD_PROBE_SECONDS', '5')),
+            probe_failures=int(os.getenv('SHARD_PROBE_FAILURES', '2')),
+            timeout=float(os.getenv('SHARD_TIMEOUT', '600')),
+            token=os.getenv('SHARD_TOKEN'),
+        )
+
+    # Ownership
+
+    def owner(self, voice_id: str) -> Optional[str]:
+        return self.ring.owner(voice_id)
+
+    def is_local(self, voice_id: str) -> bool:
+        owner = self.owner(voice_id)
+        return owner is None or owner == self.self_url
+
+    # Peer authentication
+
+    def _token_ok(self, headers) -> bool:
+        return hmac.compare_digest(headers.get(TOKEN_HEADER, '').encode('utf-8'), self.token.encode('utf-8'))
+
+    def trusted(self, headers) -> bool:
+        """Whether a request carrying X-Shard-Forwarded really comes from a peer"""
+        sender = headers.get(FORWARDED_HEADER)
+        if not sender:
+            return False
+        if self.token:
+            return self._token_ok(headers)
+        with self._lock:
+            return normalize_node(sender) in self.members
+
+    def may_change(self, node: str, headers) -> bool:
+        """Whether a join/leave for node is allowed from this request"""
+        if self.token:
+            return self._token_ok(headers)
+        return normalize_node(node) in self.seeds
+
+    def _peer_headers(self) -> Dict[str, str]:
+        headers = {FORWARDED_HEADER: self.self_url}
+        if self.token:
+            headers[TOKEN_HEADER] = self.token
+        return headers
+
+    def route(self, voice_id: Optional[str], headers) -> Optional[str]:
+        """Owner to send this request to, or None to serve it here"""
+        if not voice_id or self.trusted(headers):
+            return None
+        owner = self.owner(voice_id)
+        return None if owner is None or owner == self.self_url else owner
+
+    def redirect_url(self, owner: str, path: str) -> str:
+        with self._lock:
+            self.redirected += 1
+        return owner + path
+
+    # Proxying
+
+    def _connection(self, owner: str, fresh: bool = False) -> http.client.HTTPConnection:
+        conns = getattr(self._conns, 'by_owner', None)
+        if conns is None:
+            conns = self._conns.by_owner = {}
+        conn = conns.get(owner)
+        if conn is None or fresh:
+            if conn is not None:
+                conn.close()
+            parsed = urlparse(owner)
+            cls = http.client.HTTPSConnection if parsed.scheme == 'https' else http.client.HTTPConnection
+            conn = conns[owner] = cls(parsed.hostname, parsed.port, timeout=self.timeout)
+        return conn
+
+    def _send(self, owner: str, method: str, path: str, headers, body: bytes):
+        out_headers = {k: v for k, v in headers.items() if k.lower() not in HOP_BY_HOP}
+        out_headers.update(self._peer_headers())
+        conn = self._connection(owner)
+        for attempt in range(2):
+            reused, sent = conn.sock is not None, False
+            try:
+                conn.request(method, path, body=body, headers=out_headers)
+                sent = True
+                response = conn.getresponse()
+                data = response.read()
+                if response.getheader('Connection', '').lower() == 'close':
+                    conn.close()
+                return response, data
+            except (BrokenPipeError, ConnectionResetError) as e:
+                # Includes RemoteDisconnected. On a pooled keep-alive socket this means the
+                # peer closed it while idle and never read the request: retry once, fresh
+                conn.close()
+                error = e
+                if reused and attempt == 0:
+                    conn = self._connection(owner, fresh=True)
+                    continue
+            except (OSError, http.client.HTTPException) as e:
+                # Timeouts land here and are never retried: the owner may still be working on it
+                conn.close()
+                error = e
+            break
+        if sent:
+            raise ShardFailed(f"{owner} did not answer: {error}")
+        self._record_probe(owner, False)
+        raise ShardUnavailable(f"{owner} unreachable: {error}")
+
+    def forward(self, owner: str, method: str, path: str, headers, body: bytes) -> Tuple[int, List[Tuple[str, str]], bytes]:
+        """Replay a request on its owner; returns (status, headers, body)
+
+        Raises ShardUnavailable when the owner never got the request (safe to serve
+        it here instead) and ShardFailed when it may have (serving it again is not).
+        """
+        try:
+            response, data = self._send(owner, method, path, headers, body)
+        except (ShardUnavailable, ShardFailed):
+            with self._lock:
+                self.forward_errors += 1
+            raise
+        with self._lock:
+            self.forwarded += 1
+        reply_headers = [(k, v) for k, v in response.getheaders() if k.lower() not in HOP_BY_HOP]
+        reply_headers.append((OWNER_HEADER, owner))
+        return response.status, reply_headers, data
+
+    # Membership
+
+    def on_change(self, listener: Callable[[HashRing, HashRing], Optional[dict]]):
+        """listener(old_ring, new_ring) runs on a background thread after every ring change"""
+        self._listeners.append(listener)
+
+    def _rebuild(self, reason: str):
+        with self._lock:
+            active = self.members - self.down
+            if set(self.ring.nodes) == active:
+                return
+            old, self.ring = self.ring, HashRing(active, self.vnodes)
+            self.epoch += 1
+            new, epoch = self.ring, self.epoch
+            self.last_change = {'epoch': epoch, 'reason': reason, 'at': time.time(), 'nodes': sorted(active)}
+        print(f"🔀 Shard ring epoch {epoch}: {reason} ({len(active)} active nodes)")
+        threading.Thread(target=self._notify, args=(old, new, epoch), daemon=True).start()
+
+    def _notify(self, old: HashRing, new: HashRing, epoch: int):
+        for listener in self._listeners:
+            try:
+                summary = listener(old, new)
+                if summary is not None:
+                    with self._lock:
+                        self.last_rebalance = {'epoch': epoch, 'at': time.time(), **summary}
+            except Exception as e:
+                print(f"⚠️  Shard rebalance failed: {e}")
+
+    def join(self, node: str) -> bool:
+        node = normalize_node(node)
+        with self._lock:
+            changed = node not in self.members or node in self.down
+            self.members.add(node)
+            self.down.discard(node)
+            self._failures.pop(node, None)
+        if changed:
+            self._rebuild(f"{node} joined")
+        return changed
+
+    def leave(self, node: str) -> bool:
+        node = normalize_node(node)
+        with self._lock:
+            changed = node in self.members
+            self.members.discard(node)
+            self.down.discard(node)
+            self._failures.pop(node, None)
+        if changed:
+            self._rebuild(f"{node} left")
+        return changed
+
+    def announce(self, action: str, node: Optional[str] = None):
+        """Tell every other member that node joined/left (best effort)"""
+        node = normalize_node(node or self.self_url)
+        body = json.dumps({'node': node}).encode()
+        headers = {'Content-Type': 'application/json'}
+        with self._lock:
+            peers = [m for m in self.members | {node} if m != self.self_url]
+        learned = set()
+        for peer in peers:
+            try:
+                response, data = self._send(peer, 'POST', f'/shard/{action}', headers, body)
+                if action == 'join' and node == self.self_url and response.status == 200:
+                    learned.update(json.loads(data).get('ring', {}).get('members', []))
+            except (ShardUnavailable, ShardFailed, ValueError):
+                pass
+        # A starting node learns about members that joined after its SHARD_NODES was written
+        for member in learned - self.members:
+            self.join(member)
+
+    def _record_probe(self, node: str, ok: bool):
+        with self._lock:
+            if node not in self.members or node == self.self_url:
+                return
+            if ok:
+                self._failures.pop(node, None)
+                changed = node in self.down
+                self.down.discard(node)
+                reason = f"{node} recovered"
+            else:
+                self._failures[node] = self._failures.get(node, 0) + 1
+                changed = self._failures[node] >= self.probe_failures and node not in self.down
+                if changed:
+                    self.down.add(node)
+                reason = f"{node} failed {self._failures[node]} probes"
+        if changed:
+            self._rebuild(reason)
+
+    def probe(self, node: str) -> bool:
+        parsed = urlparse(node)
+        cls = http.client.HTTPSConnection if parsed.scheme == 'https' else http.client.HTTPConnection
+        conn = cls(parsed.hostname, parsed.port, timeout=max(1.0, self.probe_seconds))
+        try:
+            conn.request('GET', '/health', headers=self._peer_headers())
+            ok = conn.getresponse().status == 200
+        except (OSError, http.client.HTTPException):
+            ok = False
+        finally:
+            conn.close()
+        self._record_probe(node, ok)
+        return ok
+
+    def start(self):
+        """Announce this node, then probe peers every SHARD_PROBE_SECONDS"""
+        def loop():
+            # Give the local server a moment to bind before peers route to it
+            self._stop.wait(min(1.0, self.probe_seconds))
+            self.announce('join')
+            while not self._stop.is_set():
+                with self._lock:
+                    peers = [m for m in self.members if m != self.self_url]
+                for peer in peers:
+                    self.probe(peer)
+                self._stop.wait(self.probe_seconds)
+
+        threading.Thread(target=loop, name='shard-probe', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            shares = self.ring.shares()
+            return {
+                'self': self.self_url,
+                'mode': self.mode,
+                'vnodes': self.vnodes,
+                'epoch': self.epoch,
+                'members': sorted(self.members),
+                'active': self.ring.nodes,
+                'down': sorted(self.down),
+                'in_ring': self.self_url in shares,
+                'share': shares.get(self.self_url, 0.0),
+                'shares': shares,
+                'forwarded': self.forwarded,
+                'redirected': self.redirected,
+                'forward_errors': self.forward_errors,
+                'last_change': self.last_change,
+                'last_rebalance': self.last_rebalance,
+            }
@@ -0,0 +1,267 @@
+# Speaker Similarity Index
+# Fixed-size speaker embeddings for every voice reference plus a cosine
+# top-k index over them, used to spot near-duplicate voices and to suggest an
+# existing voice instead of training a new one.
+#
+# Embeddings are unit-length vectors: MFCC statistics computed in NumPy by
+# default, or Resemblyzer's d-vector when SPEAKER_EMBEDDER=resemblyzer and the
+# package is installed. Vectors live in a memory-mapped float32 matrix that
+# grows by doubling; adds and deletes touch one row (deletes swap in the last
+# row) and a query is a single matrix-vector product. Each update also rewrites
+# the JSON id list, which is O(n), so bulk loads pass save=False and call save()
+# once at the end. If faiss is installed it serves the queries from an
+# inner-product index.
+#
+# Env: SPEAKER_EMBEDDER (mfcc|resemblyzer, default mfcc)
+
+import json
+import os
+import threading
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import numpy as np
+from scipy.fft import dct
+
+from resampling import resample
+
+try:
+    import faiss  # type: ignore
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+EMBED_SR = 16000
+N_FFT = 512
+HOP = 160
+N_MELS = 40
+N_MFCC = 20
+INITIAL_CAPACITY = 1024
+
+
+@lru_cache(maxsize=4)
+def mel_filterbank(sr: int = EMBED_SR, n_fft: int = N_FFT, n_mels: int = N_MELS) -> np.ndarray:
+    """Triangular mel filters, [n_mels, n_fft // 2 + 1]"""
+    def hz_to_mel(f):
+        return 2595.0 * np.log10(1.0 + f / 700.0)
+
+    def mel_to_hz(m):
+        return 700.0 * (10.0 ** (m / 2595.0) - 1.0)
+
+    mels = np.linspace(hz_to_mel(20.0), hz_to_mel(sr / 2.0), n_mels + 2)
+    bins = np.fft.rfftfreq(n_fft, 1.0 / sr)
+    edges = mel_to_hz(mels)
+    lower, center, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    rising = (bins - lower) / (center - lower)
+    falling = (upper - bins) / (upper - center)
+    filters = np.maximum(0.0, np.minimum(rising, falling)).astype(np.float32)
+    filters.setflags(write=False)
+    return filters
+
+
+def mfcc(audio: np.ndarray, sr: int) -> np.ndarray:
+    """MFCCs of the voiced frames of a mono signal, [frames, N_MFCC]"""
+    y = resample(np.asarray(audio, dtype=np.float32), sr, EMBED_SR)
+    if len(y) < N_FFT:
+        y = np.pad(y, (0, N_FFT - len(y)))
+    y = np.append(y[0], y[1:] - 0.97 * y[:-1])  # pre-emphasis
+    frames = np.lib.stride_tricks.sliding_window_view(y, N_FFT)[::HOP] * np.hanning(N_FFT).astype(np.float32)
+    power = np.abs(np.fft.rfft(frames, axis=1)) ** 2
+    log_mel = np.log(power @ mel_filterbank().T + 1e-10)
+
+    # Drop pauses: keep frames within 30 dB of the loudest one
+    energy_db = 10.0 * np.log10(power.sum(axis=1) + 1e-10)
+    voiced = energy_db > energy_db.max() - 30.0
+    if voiced.sum() >= 10:
+        log_mel = log_mel[voiced]
+    return dct(log_mel, type=2, axis=1, norm='ortho')[:, 1:N_MFCC + 1]
+
+
+def mfcc_embedding(audio: np.ndarray, sr: int) -> np.ndarray:
+    """Mean and spread of MFCCs and their deltas: a 4 * N_MFCC vector"""
+    coeffs = mfcc(audio, sr)
+    # Deltas ignore any constant channel offset in the cepstrum
+    deltas = np.diff(coeffs, axis=0) if len(coeffs) > 1 else np.zeros_like(coeffs)
+    return np.concatenate([coeffs.mean(axis=0), coeffs.std(axis=0), deltas.std(axis=0),
+                           np.abs(deltas).mean(axis=0)]).astype(np.float32)
+
+
+class SpeakerEmbedder:
+    """Turns reference audio into a unit-length speaker vector"""
+
+    def __init__(self, kind: str = 'mfcc'):
+        self.kind = kind
+        self._encoder = None
+        if kind == 'resemblyzer':
+            from resemblyzer import VoiceEncoder  # type: ignore
+            self._encoder = VoiceEncoder(device='cpu', verbose=False)
+        self.dim = 256 if self._encoder is not None else 4 * N_MFCC
+
+    @classmethod
+    def from_env(cls) -> 'SpeakerEmbedder':
+        kind = os.getenv('SPEAKER_EMBEDDER', 'mfcc').lower()
+        if kind == 'resemblyzer':
+            try:
+                return cls('resemblyzer')
+            except Exception as e:
+                print(f"⚠️  Resemblyzer unavailable ({e}); using MFCC speaker embeddings")
+        return cls('mfcc')
+
+    def embed(self, audio: np.ndarray, sr: int) -> np.ndarray:
+        audio = np.asarray(audio, dtype=np.float32)
+        if audio.ndim > 1:
+            audio = audio.mean(axis=1)
+        if self._encoder is not None:
+            vec = self._encoder.embed_utterance(resample(audio, sr, EMBED_SR))
+        else:
+            vec = mfcc_embedding(audio, sr)
+        vec = np.asarray(vec, dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm > 0 else vec
+
+
+class SpeakerIndex:
+    """Memory-mapped cosine index of voice embeddings, updated in place"""
+
+    def __init__(self, directory: str, embedder: SpeakerEmbedder):
+        self.directory = directory
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self.vectors_path = os.path.join(directory, 'vectors.f32')
+        self.meta_path = os.path.join(directory, 'index.json')
+        self._lock = threading.Lock()
+        self.ids: List[str] = []
+        self._rows = {}
+        self._faiss = None
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    @classmethod
+    def from_env(cls, directory: str) -> 'SpeakerIndex':
+        return cls(directory, SpeakerEmbedder.from_env())
+
+    def _load(self):
+        meta = {}
+        try:
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            pass
+        # Vectors from another embedder aren't comparable; start over and let the caller backfill
+        if meta.get('embedder') != self.embedder.kind or meta.get('dim') != self.dim:
+            meta = {}
+        self.ids = list(meta.get('ids', []))
+        capacity = max(int(meta.get('capacity', 0)), INITIAL_CAPACITY)
+        self._open(capacity)
+        self._rows = {voice_id: row for row, voice_id in enumerate(self.ids)}
+        self._rebuild_faiss()
+
+    def _open(self, capacity: int):
+        size = capacity * self.dim * 4
+        if not os.path.exists(self.vectors_path) or os.path.getsize(self.vectors_path) < size:
+            with open(self.vectors_path, 'ab') as f:
+                f.truncate(size)
+        self.capacity = capacity
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+
+    def save(self):
+        """Persist the id list after a batch of save=False updates"""
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        self.vectors.flush()
+        tmp = self.meta_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'embedder': self.embedder.kind, 'dim': self.dim, 'capacity': self.capacity, 'ids': self.ids}, f)
+        os.replace(tmp, self.meta_path)
+
+    def _rebuild_faiss(self):
+        if not FAISS_AVAILABLE:
+            return
+        self._faiss = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim))
+        if self.ids:
+            self._faiss.add_with_ids(np.ascontiguousarray(self.vectors[:len(self.ids)]),
+                                     np.arange(len(self.ids), dtype=np.int64))
+
+    def _set_row(self, row: int, vec: np.ndarray):
+        self.vectors[row] = vec
+        if self._faiss is not None:
+            self._faiss.remove_ids(np.array([row], dtype=np.int64))
+            self._faiss.add_with_ids(vec[None, :], np.array([row], dtype=np.int64))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, voice_id: str) -> bool:
+        return voice_id in self._rows
+
+    def add(self, voice_id: str, audio: np.ndarray, sr: int, save: bool = True) -> np.ndarray:
+        """Embed a reference and insert (or replace) its vector"""
+        return self.upsert(voice_id, self.embedder.embed(audio, sr), save=save)
+
+    def upsert(self, voice_id: str, vec: np.ndarray, save: bool = True) -> np.ndarray:
+        vec = np.asarray(vec, dtype=np.float32).reshape(self.dim)
+        with self._lock:
+            row = self._rows.get(voice_id)
+            if row is None:
+                row = len(self.ids)
+                if row >= self.capacity:
+                    self.vectors.flush()
+                    self._open(self.capacity * 2)
+                self.ids.append(voice_id)
+                self._rows[voice_id] = row
+            self._set_row(row, vec)
+            if save:
+                self._save()
+        return vec
+
+    def remove(self, voice_id: str, save: bool = True) -> bool:
+        with self._lock:
+            row = self._rows.pop(voice_id, None)
+            if row is None:
+                return False
+            last = len(self.ids) - 1
+            if row != last:
+                # Move the last vector into the hole so rows stay dense
+                moved = self.ids[last]
+                self.ids[row] = moved
+                self._rows[moved] = row
+                self._set_row(row, np.array(self.vectors[last]))
+            self.ids.pop()
+            if self._faiss is not None:
+                self._faiss.remove_ids(np.array([last], dtype=np.int64))
+            if save:
+                self._save()
+            return True
+
+    def vector(self, voice_id: str) -> Optional[np.ndarray]:
+        row = self._rows.get(voice_id)
+        return None if row is None else np.array(self.vectors[row])
+
+    def query(self, vec: np.ndarray, k: int = 5, exclude: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Top-k voices by cosine similarity to vec, best first"""
+        vec = np.asarray(vec, dtype=np.float32).reshape(self.dim)
+        with self._lock:
+            n = len(self.ids)
+            if n == 0:
+                return []
+            want = min(n, k + (1 if exclude else 0))
+            if self._faiss is not None:
+                scores, rows = self._faiss.search(vec[None, :], want)
+                pairs = [(self.ids[r], float(s)) for r, s in zip(rows[0], scores[0]) if r >= 0]
+            else:
+                scores = self.vectors[:n] @ vec
+                top = np.argpartition(-scores, want - 1)[:want] if want < n else np.arange(n)
+                top = top[np.argsort(-scores[top])]
+                pairs = [(self.ids[r], float(scores[r])) for r in top]
+        return [(voice_id, score) for voice_id, score in pairs if voice_id != exclude][:k]
+
+    def stats(self) -> dict:
+        return {
+            'voices': len(self.ids),
+            'capacity': self.capacity,
+            'dim': self.dim,
+            'embedder': self.embedder.kind,
+            'backend': 'faiss' if self._faiss is not None else 'numpy',
+        }
@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+sf = pytest.importorskip('soundfile')
+
+import preprocess_pool  # noqa: E402
+from preprocess_pool import PreprocessPool  # noqa: E402
+
+
+@pytest.fixture
+def tone(tmp_path):
+    samples = (0.25 * np.sin(2 * np.pi * 220 * np.arange(16000) / 16000)).astype(np.float32)
+    path = tmp_path / 'tone.wav'
+    sf.write(str(path), samples, 16000, subtype='FLOAT')
+    return str(path), samples
+
+
+@pytest.fixture
+def pool():
+    pool = PreprocessPool(1)
+    yield pool
+    pool.shutdown()
+
+
+def test_decode_matches_source(pool, tone):
+    path, samples = tone
+    with pool.decode(path) as decoded:
+        assert decoded.sample_rate == 16000
+        np.testing.assert_allclose(decoded.array, samples)
+
+
+def test_views_outlive_release(pool, tone):
+    path, samples = tone
+    decoded = pool.decode(path)
+    view = decoded.array[100:200]
+    decoded.release()
+    # Used to be unmapped here and segfault on access
+    np.testing.assert_allclose(view, samples[100:200])
+    assert preprocess_pool._deferred
+
+    del view
+    pool.decode(path).release()
+    assert not preprocess_pool._deferred
+
+
+def test_view_after_release_in_subprocess(tone):
+    # A crash would kill the test runner, so read after release in a child process
+    path, samples = tone
+    code = (
+        "import sys; sys.path.insert(0, %r)\n"
+        "from preprocess_pool import PreprocessPool\n"
+        "pool = PreprocessPool(1)\n"
+        "decoded = pool.decode(%r)\n"
+        "array = decoded.array\n"
+        "decoded.release()\n"
+        "print(float(array.sum()))\n"
+        "pool.shutdown()\n"
+    ) % (ROOT, path)
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert float(result.stdout.strip()) == pytest.approx(float(samples.sum()), abs=1e-3)
@@ -0,0 +1,142 @@
+# Windowed Conversion for Long Audio
+# Streams the input in blocks, runs the backend on overlapping windows,
+# overlap-adds the results with crossfades and writes the output incrementally,
+# so peak memory depends on the window size rather than the input length.
+
+import os
+from typing import Callable, Optional
+
+import numpy as np
+import soundfile as sf
+
+from resampling import StreamingResampler
+
+DEFAULT_WINDOW_SECONDS = 30.0
+DEFAULT_OVERLAP_SECONDS = 0.5
+READ_BLOCK_SECONDS = 5.0
+
+
+class OverlapAddWriter:
+    """Writes consecutive overlapping windows, crossfading each overlap region"""
+
+    def __init__(self, out_file, overlap: int):
+        self.out_file = out_file
+        self.overlap = overlap
+        self._tail = None
+        self.frames_written = 0
+
+    def _write(self, data):
+        if len(data):
+            self.out_file.write(data)
+            self.frames_written += len(data)
+
+    def add(self, window: np.ndarray):
+        window = np.asarray(window, dtype=np.float32)
+        head = window
+        if self._tail is not None:
+            n = min(len(self._tail), len(window))
+            ramp = np.linspace(0.0, 1.0, n, dtype=np.float32)
+            if window.ndim > 1:
+                ramp = ramp[:, np.newaxis]
+            self._write(self._tail[:n] * (1 - ramp) + window[:n] * ramp)
+            head = window[n:]
+        if len(head) > self.overlap:
+            self._write(head[:-self.overlap] if self.overlap else head)
+            self._tail = head[-self.overlap:] if self.overlap else None
+        else:
+            self._tail = head
+
+    def close(self):
+        if self._tail is not None:
+            self._write(self._tail)
+            self._tail = None
+
+
+def _env_seconds(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def window_settings():
+    """(window_seconds, overlap_seconds) from VC_WINDOW_SECONDS / VC_WINDOW_OVERLAP_SECONDS"""
+    return (_env_seconds('VC_WINDOW_SECONDS', DEFAULT_WINDOW_SECONDS),
+            _env_seconds('VC_WINDOW_OVERLAP_SECONDS', DEFAULT_OVERLAP_SECONDS))
+
+
+def convert_file_windowed(input_path: str, output_path: str, convert_fn: Callable[[np.ndarray], np.ndarray],
+                          target_sr: Optional[int] = None, mono: bool = True,
+                          window_seconds: float = DEFAULT_WINDOW_SECONDS,
+                          overlap_seconds: float = DEFAULT_OVERLAP_SECONDS,
+                          subtype: Optional[str] = None) -> dict:
+    """Convert input_path to output_path window by window with bounded memory
+
+    convert_fn receives float32 windows at target_sr (mono [frames] when mono
+    is set, else [frames, channels]) and must return audio of the same length
+    and rate. Windows overlap by overlap_seconds and are crossfaded.
+    """
+    info = sf.info(input_path)
+    block = max(1, int(READ_BLOCK_SECONDS * info.samplerate))
+    blocks = sf.blocks(input_path, blocksize=block, dtype='float32', always_2d=True)
+    return _convert_blocks(blocks, info.samplerate, info.channels, info.frames, output_path, convert_fn,
+                           target_sr, mono, window_seconds, overlap_seconds, subtype)
+
+
+def convert_array_windowed(audio: np.ndarray, sr: int, output_path: str,
+                           convert_fn: Callable[[np.ndarray], np.ndarray],
+                           target_sr: Optional[int] = None, mono: bool = True,
+                           window_seconds: float = DEFAULT_WINDOW_SECONDS,
+                           overlap_seconds: float = DEFAULT_OVERLAP_SECONDS,
+                           subtype: Optional[str] = None) -> dict:
+    """Same as convert_file_windowed for audio that is already decoded ([frames] or [frames, channels])"""
+    audio = np.asarray(audio, dtype=np.float32)
+    audio = audio[:, np.newaxis] if audio.ndim == 1 else audio
+    block = max(1, int(READ_BLOCK_SECONDS * sr))
+    blocks = (audio[i:i + block] for i in range(0, len(audio), block))
+    return _convert_blocks(blocks, sr, audio.shape[1], len(audio), output_path, convert_fn,
+                           target_sr, mono, window_seconds, overlap_seconds, subtype)
+
+
+def _convert_blocks(blocks, src_sr: int, src_channels: int, src_frames: int, output_path: str,
+                    convert_fn: Callable[[np.ndarray], np.ndarray], target_sr: Optional[int], mono: bool,
+                    window_seconds: float, overlap_seconds: float, subtype: Optional[str]) -> dict:
+    out_sr = target_sr or src_sr
+    channels = 1 if mono else src_channels
+    window = max(1, int(window_seconds * out_sr))
+    overlap = min(int(overlap_seconds * out_sr), window // 2)
+    hop = window - overlap
+
+    resampler = StreamingResampler(src_sr, out_sr)
+    pending = np.zeros((0,) if mono else (0, channels), dtype=np.float32)
+    windows = 0
+
+    with sf.SoundFile(output_path, 'w', samplerate=out_sr, channels=channels, subtype=subtype) as out_file:
+        writer = OverlapAddWriter(out_file, overlap)
+
+        def emit(final: bool):
+            nonlocal pending, windows
+            while len(pending) >= window or (final and len(pending) > (overlap if windows else 0)):
+                chunk = pending[:window]
+                converted = np.asarray(convert_fn(chunk), dtype=np.float32)[:len(chunk)]
+                writer.add(converted)
+                windows += 1
+                pending = pending[hop:] if len(chunk) == window else pending[len(pending):]
+
+        for data in blocks:
+            if mono:
+                data = data.mean(axis=1)
+            pending = np.concatenate([pending, resampler.process(data)], axis=0)
+            emit(final=False)
+
+        pending = np.concatenate([pending, resampler.flush().reshape((-1,) + pending.shape[1:])], axis=0)
+        emit(final=True)
+        writer.close()
+
+    return {
+        'windows': windows,
+        'input_seconds': src_frames / float(src_sr),
+        'output_seconds': writer.frames_written / float(out_sr),
+        'window_seconds': window / float(out_sr),
+        'overlap_seconds': overlap / float(out_sr),
+    }
@@ -0,0 +1,167 @@
+# XTTS CPU Inference Mode
+# Quantization and threading setup for running Coqui XTTS on CPU-only hosts.
+#
+# Configuration (environment):
+#   XTTS_CPU_MODE          fp32 (default) | int8
+#   XTTS_QUANTIZE_DECODER  1 to also quantize the HiFi-GAN decoder's linear layers
+#   XTTS_BF16              1 to run inference under bf16 autocast
+#   TORCH_INTRA_OP_THREADS intra-op thread count (default: torch's choice)
+#   TORCH_INTER_OP_THREADS inter-op thread count (default: torch's choice)
+
+import os
+import threading
+import contextlib
+from typing import Optional
+
+import torch
+
+CPU_MODES = ('fp32', 'int8')
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    if not value:
+        return None
+    try:
+        return max(1, int(value))
+    except ValueError:
+        return None
+
+
+class XTTSCPUConfig:
+    """Settings for CPU inference, usually read from the environment"""
+
+    def __init__(self, mode: str = 'fp32', quantize_decoder: bool = False, bf16: bool = False,
+                 intra_op_threads: Optional[int] = None, inter_op_threads: Optional[int] = None):
+        mode = (mode or 'fp32').lower()
+        if mode not in CPU_MODES:
+            raise ValueError(f"Unknown XTTS CPU mode: {mode}")
+        self.mode = mode
+        self.quantize_decoder = quantize_decoder
+        self.bf16 = bf16
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            mode=os.getenv('XTTS_CPU_MODE', 'fp32'),
+            quantize_decoder=_env_flag('XTTS_QUANTIZE_DECODER'),
+            bf16=_env_flag('XTTS_BF16'),
+            intra_op_threads=_env_int('TORCH_INTRA_OP_THREADS'),
+            inter_op_threads=_env_int('TORCH_INTER_OP_THREADS'),
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            'mode': self.mode,
+            'quantize_decoder': self.quantize_decoder,
+            'bf16': self.bf16,
+            'intra_op_threads': torch.get_num_threads(),
+            'inter_op_threads': torch.get_num_interop_threads(),
+        }
+
+
+def configure_threads(intra_op: Optional[int] = None, inter_op: Optional[int] = None):
+    """Set torch thread pools; inter-op can only be changed before first use"""
+    if intra_op:
+        torch.set_num_threads(intra_op)
+    if inter_op:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError as e:
+            print(f"⚠️  Could not set inter-op threads (already initialized): {e}")
+
+
+def _conv1d_to_linear(module: torch.nn.Module) -> int:
+    """Swap HF GPT-2 Conv1D layers for equivalent nn.Linear so they can be quantized"""
+    replaced = 0
+    for name, child in module.named_children():
+        if type(child).__name__ == 'Conv1D' and hasattr(child, 'nf'):
+            # Conv1D computes x @ W + b with W shaped [in, out]
+            in_features, out_features = child.weight.shape
+            linear = torch.nn.Linear(in_features, out_features, bias=child.bias is not None)
+            linear.weight.data = child.weight.data.t().contiguous()
+            if child.bias is not None:
+                linear.bias.data = child.bias.data.clone()
+            setattr(module, name, linear)
+            replaced += 1
+        else:
+            replaced += _conv1d_to_linear(child)
+    return replaced
+
+
+def quantize_linear_layers(module: torch.nn.Module) -> torch.nn.Module:
+    """Apply dynamic int8 quantization to every linear layer in a module"""
+    _conv1d_to_linear(module)
+    return torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def optimize_xtts(tts, config: XTTSCPUConfig):
+    """Quantize a loaded Coqui TTS XTTS model in place according to config"""
+    model = getattr(getattr(tts, 'synthesizer', None), 'tts_model', None)
+    if model is None:
+        print("ℹ️  XTTS model internals not found; skipping CPU optimization")
+        return tts
+
+    model.eval()
+    if config.mode == 'int8':
+        if hasattr(model, 'gpt'):
+            quantize_linear_layers(model.gpt)
+            print("   ⚙️  Quantized XTTS GPT linear layers to int8")
+        if config.quantize_decoder and hasattr(model, 'hifigan_decoder'):
+            quantize_linear_layers(model.hifigan_decoder)
+            print("   ⚙️  Quantized XTTS decoder linear layers to int8")
+    return tts
+
+
+def inference_context(config: XTTSCPUConfig):
+    """Context for a synthesis call: no autograd, optional bf16 autocast"""
+    stack = contextlib.ExitStack()
+    stack.enter_context(torch.inference_mode())
+    if config.bf16:
+        stack.enter_context(torch.autocast(device_type='cpu', dtype=torch.bfloat16))
+    return stack
+
+
+class XTTSRunner:
+    """Loads XTTS once per model name and runs synthesis with the CPU config"""
+
+    def __init__(self, tts_factory, device: str = 'cpu', config: Optional[XTTSCPUConfig] = None):
+        self.tts_factory = tts_factory
+        self.device = device
+        self.config = config or XTTSCPUConfig.from_env()
+        self._models = {}
+        self._lock = threading.Lock()
+        if device == 'cpu':
+            configure_threads(self.config.intra_op_threads, self.config.inter_op_threads)
+
+    def get(self, model_name: str):
+        with self._lock:
+            tts = self._models.get(model_name)
+            if tts is None:
+                tts = self.tts_factory(model_name)
+                if hasattr(tts, 'to'):
+                    tts = tts.to(self.device)
+                if self.device == 'cpu':
+                    optimize_xtts(tts, self.config)
+                self._models[model_name] = tts
+            return tts
+
+    def tts_to_file(self, model_name: str, **kwargs):
+        tts = self.get(model_name)
+        if self.device != 'cpu':
+            return tts.tts_to_file(**kwargs)
+        with inference_context(self.config):
+            return tts.tts_to_file(**kwargs)
+
+    def tts(self, model_name: str, **kwargs):
+        tts = self.get(model_name)
+        if self.device != 'cpu':
+            return tts.tts(**kwargs)
+        with inference_context(self.config):
+            return tts.tts(**kwargs)